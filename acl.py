@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016-2019 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Compiled access control lists. config.acl_build turns the human readable ACL
+into a list of (start, end) ranges; acl_compile merges those into sorted,
+non-overlapping ranges and keeps the range starts and ends in separate lists
+so that acl_check can answer membership with a single bisect instead of
+walking every range for every packet.
+
+A compiled ACL is still a plain tuple so it can be pickled to reporting
+clients along with the rest of the configuration:
+
+    (action, [(start, end), ...], [start, ...], [end, ...])
+'''
+
+from bisect import bisect_right
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016-2019 Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+# Per-stream ACL verdict caches held by the systems (see acl_cache). A cached
+# verdict may not be what a new ACL would say, so compiling any ACL empties them.
+ACL_CACHES = []
+
+# Hand out a new, registered verdict cache: {(stream_id, rf_src, dst_id, slot): True|False}
+def acl_cache():
+    cache = {}
+    ACL_CACHES.append(cache)
+    return cache
+
+# Merge overlapping and adjacent ranges, then split them into the lists used by acl_check
+# ORIGINAL:  (False, [(1, 5), (3120124, 3120124), (3, 10)])
+# COMPILED:  (False, [(1, 10), (3120124, 3120124)], [1, 3120124], [10, 3120124])
+def acl_compile(_action, _ranges):
+    for cache in ACL_CACHES:
+        cache.clear()
+
+    merged = []
+    for start, end in sorted(_ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    return (_action, merged, [entry[0] for entry in merged], [entry[1] for entry in merged])
+
+# Check a supplied ID against a compiled ACL. Returns action (True|False) based
+# on matching and the action specified. _id is the raw big-endian ID from the
+# packet (3 bytes for subscribers and TGIDs, 4 for peers) or an integer.
+def acl_check(_id, _acl):
+    if _id.__class__ is not int:
+        _id = int.from_bytes(_id, 'big')
+    i = bisect_right(_acl[2], _id) - 1
+    if i >= 0 and _id <= _acl[3][i]:
+        return _acl[0]
+    return not _acl[0]
+
+
+# Microbenchmark: compare the compiled ACL against the original linear scan
+# as the number of ranges grows. Run this file directly to use it.
+if __name__ == '__main__':
+    from random import randint, seed
+    from timeit import repeat
+
+    def acl_check_linear(_id, _acl):
+        id = int.from_bytes(_id, 'big')
+        for entry in _acl[1]:
+            if entry[0] <= id <= entry[1]:
+                return _acl[0]
+        return not _acl[0]
+
+    seed(3120101)
+    print('{:>8} {:>14} {:>14} {:>9}'.format('RANGES', 'LINEAR (us)', 'BISECT (us)', 'SPEEDUP'))
+    for size in (1, 10, 100, 1000, 10000):
+        ranges = []
+        for i in range(size):
+            start = randint(1, 16776415)
+            ranges.append((start, min(start + randint(0, 1000), 16776415)))
+        linear = (False, ranges)
+        compiled = acl_compile(False, ranges)
+        ids = [randint(1, 16776415).to_bytes(3, 'big') for i in range(1000)]
+
+        # Both engines must agree before their timings mean anything
+        for _id in ids:
+            assert acl_check_linear(_id, linear) == acl_check(_id, compiled)
+
+        number = max(1, 20000 // size)
+        t_linear = min(repeat(lambda: [acl_check_linear(_id, linear) for _id in ids], number=number, repeat=3)) / (number * len(ids))
+        t_bisect = min(repeat(lambda: [acl_check(_id, compiled) for _id in ids], number=number, repeat=3)) / (number * len(ids))
+        print('{:>8} {:>14.3f} {:>14.3f} {:>8.1f}x'.format(size, t_linear * 1e6, t_bisect * 1e6, t_linear / t_bisect))
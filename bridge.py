@@ -32,9 +32,9 @@ This program currently only works with group voice calls.
 
 # Python modules we need
 import sys
-from bitarray import bitarray
 from time import time
 import importlib.util
+from collections import OrderedDict
 
 # Twisted is pretty important, so I keep it separate
 from twisted.internet.protocol import Factory, Protocol
@@ -42,11 +42,15 @@ from twisted.protocols.basic import NetstringReceiver
 from twisted.internet import reactor, task
 
 # Things we import from the main hblink module
-from hblink import HBSYSTEM, OPENBRIDGE, systems, hblink_handler, reportFactory, REPORT_OPCODES, mk_aliases
+from hblink import HBSYSTEM, OPENBRIDGE, systems, hblink_handler, reportFactory, REPORT_OPCODES, mk_aliases, listen_system, shard_handlers
 from dmr_utils3.utils import bytes_3, int_id, get_alias
-from dmr_utils3 import decode, bptc, const
+from dmr_utils3 import decode, const
 import config
 import log
+import shard
+import sysbus
+from lccache import splice_lc, lc_stats
+from lcsplice import splice_full, splice_emb, term_burst
 from const import *
 
 # Stuff for socket reporting
@@ -58,6 +62,9 @@ logger = logging.getLogger(__name__)
 
 # Import UNIT time from rules.py
 from rules import UNIT_TIME, STATIC_UNIT
+from unitmap import unitMap
+from streamtable import obpStream, streamTable, stream_stats
+from slotstate import slot_status
 
 
 # Does anybody read this stuff? There's a PEP somewhere that says I should do this.
@@ -73,17 +80,9 @@ __email__      = 'n0mjs@me.com'
 # Dictionary for dynamically mapping unit (subscriber) to a system.
 # This is for pruning unit-to-uint calls to not broadcast once the
 # target system for a unit is identified
-# format 'unit_id': ('SYSTEM', time)
-UNIT_MAP = {} 
-
-# UNIX time for end of year 2060. This is used to keep subscribers in UNIT_MAP indefinitely to accomplish static routes for unit calls
-#time_2060 = 2871763199.0000000
-# 20 years in seconds. added to current at time of start to keep static units from being trimmed.
-time_20 = 630720000
-
-# Build a UNIT_MAP based on values in STATIC_MAP.
-for i in STATIC_UNIT:
-	UNIT_MAP[bytes_3(i[0])] = i[1], time() + time_20
+# format 'unit_id': ('SYSTEM', time). Units in STATIC_UNIT start out on
+# their system and are never aged out (see unitmap.py).
+UNIT_MAP = unitMap(STATIC_UNIT, UNIT_TIME)
 
 # Timed loop used for reporting HBP status
 #
@@ -94,6 +93,7 @@ def config_reports(_config, _factory):
             logger.debug('(REPORT) Periodic reporting loop started')
             _server.send_config()
             _server.send_bridge()
+            _server.send_lc_stats()
 
         logger.info('(REPORT) HBlink TCP reporting server configured')
 
@@ -124,6 +124,8 @@ def make_bridges(_rules):
                 _system['ON'][i]  = bytes_3(_system['ON'][i])
             for i, e in enumerate(_system['OFF']):
                 _system['OFF'][i] = bytes_3(_system['OFF'][i])
+            for i, e in enumerate(_system['RESET']):
+                _system['RESET'][i] = bytes_3(_system['RESET'][i])
             _system['TIMEOUT']    = _system['TIMEOUT']*60
             if _system['ACTIVE'] == True:
                 _system['TIMER']  = time() + _system['TIMEOUT']
@@ -132,47 +134,190 @@ def make_bridges(_rules):
     return _rules
 
 
-# Run this every minute for rule timer updates
-def rule_timer_loop():
-    global UNIT_MAP
-    logger.debug('(ROUTER) routerHBP Rule timer loop started')
-    _now = time()
+# Routing index: (system, slot, tgid) -> [(bridge, source entry, [active targets]), ...]
+# for every ACTIVE entry in BRIDGES, in BRIDGES order. group_received routes from this
+# instead of scanning every bridge for every burst. Kept out of BRIDGES, which gets
+# pickled for the reports. Whatever flips an entry's ACTIVE calls update_routes().
+ROUTES = {}
 
+# The same, per bridge: bridge -> {(system, slot, tgid): [(bridge, source entry, [active targets]), ...]}
+BRIDGE_ROUTES = {}
+
+# Bumped on every change to ROUTES, so route plans made before it know to start over
+ROUTES_VERSION = 0
+
+def bridge_routes(_bridge):
+    _routes = {}
+    for _source in BRIDGES[_bridge]:
+        if _source['ACTIVE']:
+            _targets = [_target for _target in BRIDGES[_bridge] if _target['SYSTEM'] != _source['SYSTEM'] and _target['ACTIVE']]
+            _routes.setdefault((_source['SYSTEM'], _source['TS'], _source['TGID']), []).append((_bridge, _source, _targets))
+    return _routes
+
+def routes_for(_key):
+    return [_route for _bridge in BRIDGES if _key in BRIDGE_ROUTES[_bridge] for _route in BRIDGE_ROUTES[_bridge][_key]]
+
+# Build the whole index, once BRIDGES is loaded
+def make_routes():
+    global ROUTES_VERSION
+    ROUTES_VERSION += 1
+    BRIDGE_ROUTES.clear()
+    ROUTES.clear()
     for _bridge in BRIDGES:
-        for _system in BRIDGES[_bridge]:
-            if _system['TO_TYPE'] == 'ON':
-                if _system['ACTIVE'] == True:
-                    if _system['TIMER'] < _now:
-                        _system['ACTIVE'] = False
-                        logger.info('(ROUTER) Conference Bridge TIMEOUT: DEACTIVATE System: %s, Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
-                    else:
-                        timeout_in = _system['TIMER'] - _now
-                        logger.info('(ROUTER) Conference Bridge ACTIVE (ON timer running): System: %s Bridge: %s, TS: %s, TGID: %s, Timeout in: %.2fs,', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']),  timeout_in)
-                elif _system['ACTIVE'] == False:
-                    logger.debug('(ROUTER) Conference Bridge INACTIVE (no change): System: %s Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
-            elif _system['TO_TYPE'] == 'OFF':
-                if _system['ACTIVE'] == False:
-                    if _system['TIMER'] < _now:
-                        _system['ACTIVE'] = True
-                        logger.info('(ROUTER) Conference Bridge TIMEOUT: ACTIVATE System: %s, Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
-                    else:
-                        timeout_in = _system['TIMER'] - _now
-                        logger.info('(ROUTER) Conference Bridge INACTIVE (OFF timer running): System: %s Bridge: %s, TS: %s, TGID: %s, Timeout in: %.2fs,', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']),  timeout_in)
-                elif _system['ACTIVE'] == True:
-                    logger.debug('(ROUTER) Conference Bridge ACTIVE (no change): System: %s Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
-            else:
-                logger.debug('(ROUTER) Conference Bridge NO ACTION: System: %s, Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
+        BRIDGE_ROUTES[_bridge] = bridge_routes(_bridge)
+        for _key, _routes in BRIDGE_ROUTES[_bridge].items():
+            ROUTES.setdefault(_key, []).extend(_routes)
+
+# Redo one bridge after ACTIVE changed in it. Only the keys it routes (or used to) change.
+def update_routes(_bridge):
+    global ROUTES_VERSION
+    ROUTES_VERSION += 1
+    _old = BRIDGE_ROUTES[_bridge]
+    BRIDGE_ROUTES[_bridge] = bridge_routes(_bridge)
+    for _key in _old.keys() | BRIDGE_ROUTES[_bridge].keys():
+        _routes = routes_for(_key)
+        if _routes:
+            ROUTES[_key] = _routes
+        else:
+            ROUTES.pop(_key, None)
 
-    _then = _now - 60 * UNIT_TIME
-    remove_list = []
-    #logger.info(UNIT_MAP)
-    for unit in UNIT_MAP:
-       if UNIT_MAP[unit][1] < (_then):
-           remove_list.append(unit)
 
-    for unit in remove_list:
-        del UNIT_MAP[unit]
+# In-band signalling index: (system, slot, tgid) -> [(bridge, index of the entry in
+# BRIDGES[bridge], entry, in ON, in OFF, in RESET), ...] for every entry a call end on
+# that TGID may act on: its own TGID, or one of its ON, OFF or RESET triggers. Only
+# ACTIVE and TIMER change at run time, so it is built once, from BRIDGES as loaded.
+TRIGGERS = {}
 
+def make_triggers():
+    TRIGGERS.clear()
+    for _bridge in BRIDGES:
+        for _index, _system in enumerate(BRIDGES[_bridge]):
+            _on, _off, _reset = set(_system['ON']), set(_system['OFF']), set(_system['RESET'])
+            for _tgid in {_system['TGID']} | _on | _off | _reset:
+                TRIGGERS.setdefault((_system['SYSTEM'], _system['TS'], _tgid), []).append((_bridge, _index, _system, _tgid in _on, _tgid in _off, _tgid in _reset))
+
+
+# A received stream's route plan: every target it goes to, with what each one needs
+# for every burst looked up once, at the start of the stream. It is good for as long
+# as the stream and ROUTES are the same. _head_lc is the stream's LC if it was decoded
+# from a voice header, None if it was made up from the HBP header. seq is the sequence
+# number of the stream's last burst, which its targets were sent with it unchanged.
+class routePlan:
+    __slots__ = ('stream_id', 'ids', 'routes_version', 'seq', 'steps')
+
+    def __init__(self, _data, _routes, _head_lc):
+        self.stream_id = _data[16:20]
+        self.ids = _data[5:15]
+        self.seq = _data[4]
+        self.routes_version = ROUTES_VERSION
+        self.steps = [routeStep(_bridge, _source, _target, _data, _head_lc) for _bridge, _source, _targets in _routes for _target in _targets]
+
+    def matches(self, _data):
+        return self.routes_version == ROUTES_VERSION and self.stream_id == _data[16:20] and self.ids == _data[5:15]
+
+# One target of a route plan. For a HomeBrew target, open() is called when a burst
+# has passed the contention checks and taken the target slot's TX, with the slot's
+# RX VERSION and TX LCs at that point: later bursts go straight out while both still
+# hold. When a contention check keeps a burst off the target instead, block() is
+# called with the time the check could first pass; until then, later bursts are kept
+# off without the checks for as long as the slot's RX and TX TGIDs and TX subscriber
+# are the same (the times the checks use only ever move later, which keeps them failing).
+# The egress header is built once; only the sequence and bits bytes change.
+# A passthrough step's LC would be rewritten to what the stream already carries (same
+# TGID, LC from the voice header), so its bursts go out with the payload untouched.
+# Steps with the same egress (TGID and slot bit rewrite, which tells OpenBridge targets
+# apart as well) and LC are sent the same packet.
+class routeStep:
+    __slots__ = ('bridge', 'source', 'target', 'status', 'config', 'version', 'blocked', 'passthrough', 'egress', 'h_lc', 't_lc', 'emb_lc', '_header', '_bits_mask', '_bits_flip')
+
+    def __init__(self, _bridge, _source, _target, _data, _head_lc):
+        self.bridge = _bridge
+        self.source = _source
+        self.target = _target
+        self.status = systems[_target['SYSTEM']].STATUS
+        self.config = CONFIG['SYSTEMS'][_target['SYSTEM']]
+        self.version = None
+        self.blocked = None
+        self.passthrough = _head_lc is not None and _head_lc == b''.join([_head_lc[0:3], _target['TGID'], _data[5:8]])
+        self._header = bytearray(_data[:20])
+        self._header[8:11] = _target['TGID']
+        if self.config['MODE'] == 'OPENBRIDGE':
+            self._bits_mask, self._bits_flip = 0x7F, 0x00
+        else:
+            self._bits_mask, self._bits_flip = 0xFF, (0x80 if _source['TS'] != _target['TS'] else 0x00)
+        self.egress = (_target['TGID'], self._bits_mask, self._bits_flip)
+
+    def open(self, _tslot):
+        self.version = _tslot.VERSION
+        self.blocked = None
+        self.h_lc = _tslot.TX_H_LC
+        self.t_lc = _tslot.TX_T_LC
+        self.emb_lc = _tslot.TX_EMB_LC
+
+    def block(self, _tslot, _until):
+        self.blocked = (_until, _tslot.RX_TGID, _tslot.TX_TGID, _tslot.TX_RFS)
+
+    def header(self, _seq, _bits):
+        self._header[4] = _seq
+        self._header[15] = (_bits & self._bits_mask) ^ self._bits_flip
+        return bytes(self._header)
+
+
+# reactor.callLater handles for bridge entries whose timeout is running, by (bridge, index
+# of the entry in BRIDGES[bridge]). They are kept out of BRIDGES, which gets pickled.
+RULE_TIMERS = {}
+
+# Start, move or stop an entry's timeout to match its TO_TYPE, ACTIVE and TIMER. Call it
+# whenever one of those may have changed. An "ON" timer runs while the entry is active,
+# an "OFF" timer while it is not.
+def arm_timer(_bridge, _index):
+    _system = BRIDGES[_bridge][_index]
+    _handle = RULE_TIMERS.get((_bridge, _index))
+    if (_system['TO_TYPE'] == 'ON' and _system['ACTIVE'] == True) or (_system['TO_TYPE'] == 'OFF' and _system['ACTIVE'] == False):
+        _delay = max(0, _system['TIMER'] - time())
+        if _handle:
+            _handle.reset(_delay)
+        else:
+            RULE_TIMERS[(_bridge, _index)] = reactor.callLater(_delay, rule_timeout, _bridge, _index)
+    elif _handle:
+        _handle.cancel()
+        del RULE_TIMERS[(_bridge, _index)]
+
+# Arm every entry's timer, once BRIDGES is loaded
+def arm_timers():
+    for _bridge in BRIDGES:
+        for _index in range(len(BRIDGES[_bridge])):
+            arm_timer(_bridge, _index)
+
+# An entry's timer ran out: "ON" deactivates it, "OFF" activates it
+def rule_timeout(_bridge, _index):
+    del RULE_TIMERS[(_bridge, _index)]
+    _system = BRIDGES[_bridge][_index]
+    # TIMER moved on without arm_timer hearing of it
+    if time() < _system['TIMER']:
+        arm_timer(_bridge, _index)
+        return
+    if _system['TO_TYPE'] == 'ON' and _system['ACTIVE'] == True:
+        _system['ACTIVE'] = False
+        update_routes(_bridge)
+        logger.info('(ROUTER) Conference Bridge TIMEOUT: DEACTIVATE System: %s, Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
+    elif _system['TO_TYPE'] == 'OFF' and _system['ACTIVE'] == False:
+        _system['ACTIVE'] = True
+        update_routes(_bridge)
+        logger.info('(ROUTER) Conference Bridge TIMEOUT: ACTIVATE System: %s, Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
+    else:
+        return
+    if CONFIG['REPORTS']['REPORT']:
+        report_server.send_clients(b'bridge updated')
+
+# Run this every minute to age out UNIT_MAP entries. Bridge timeouts each have their own
+# timer (arm_timer).
+def rule_timer_loop():
+    global UNIT_MAP
+    logger.debug('(ROUTER) routerHBP Rule timer loop started')
+    _now = time()
+
+    remove_list = UNIT_MAP.expire(_now)
     logger.debug('Removed unit(s) %s from UNIT_MAP', remove_list)
 
 
@@ -180,92 +325,205 @@ def rule_timer_loop():
         report_server.send_clients(b'bridge updated')
 
 
-# run this every 10 seconds to trim orphaned stream ids
+# Write UNIT_MAP to UNIT_MAP_FILE, from the one process that routes (the first worker,
+# or the router when the systems run in their own processes)
+def save_unit_map():
+    if not CONFIG['GLOBAL']['UNIT_MAP_FILE'] or shard.WORKER not in (None, 0) or sysbus.ROLE not in (None, 'ROUTER'):
+        return
+    try:
+        _saved = UNIT_MAP.save(CONFIG['GLOBAL']['PATH'] + CONFIG['GLOBAL']['UNIT_MAP_FILE'])
+        logger.debug('(ROUTER) Saved %s unit(s) to %s', _saved, CONFIG['GLOBAL']['UNIT_MAP_FILE'])
+    except OSError as _error:
+        logger.error('(ROUTER) Could not save UNIT_MAP to %s: %s', CONFIG['GLOBAL']['UNIT_MAP_FILE'], _error)
+
+
+# ACTIVE/TIMER of every bridge entry for a system, as published to the other workers
+# after in-band signalling, and applying that on the receiving end
+def bridge_state(_system):
+    return [(_bridge, i, _entry['ACTIVE'], _entry['TIMER']) for _bridge in BRIDGES for i, _entry in enumerate(BRIDGES[_bridge]) if _entry['SYSTEM'] == _system]
+
+def bridge_update(_state):
+    for _bridge, i, _active, _timer in _state:
+        if BRIDGES[_bridge][i]['ACTIVE'] != _active:
+            BRIDGES[_bridge][i]['ACTIVE'] = _active
+            update_routes(_bridge)
+        BRIDGES[_bridge][i]['TIMER'] = _timer
+        arm_timer(_bridge, i)
+
+# What a bridge worker does with messages from the other workers, on top of
+# hblink.shard_handlers (see shard.py)
+def bridge_shard_handlers(_report_server):
+    def unit(_rf_src, _entry):
+        UNIT_MAP[_rf_src] = _entry
+
+    _handlers = shard_handlers(_report_server)
+    _handlers.update({'UNIT': unit, 'BRIDGES': bridge_update})
+    return _handlers
+
+
+# Streams that can time out, least recently heard of first: ('RX' or 'TX', system, slot)
+# for HomeBrew slots, ('OBP', system, stream ID) for OpenBridge streams -> when it was.
+# Whatever sets an RX_TIME, TX_TIME or OpenBridge stream's LAST passes it to stream_seen(),
+# so the streams that have gone quiet are always the ones at the front.
+STREAMS = OrderedDict()
+
+def stream_seen(_key, _time):
+    STREAMS[_key] = _time
+    STREAMS.move_to_end(_key)
+
+# A received stream stopped without a terminator: send one, made from the terminator LC it
+# had there, to every target of its route plan the stream still holds, so the repeaters
+# on them let go of the slot now rather than when their own timers run out. _slot is the
+# stream's slot as received. Target status and reports are left to their own timeouts.
+def send_terminators(_plan, _slot):
+    _bits = (0x80 if _slot == 2 else 0x00) | HBPF_DATA_SYNC << 4 | HBPF_SLT_VTERM
+    # A burst after the last one the stream sent
+    _seq = (_plan.seq + 1) & 0xFF
+    for _step in _plan.steps:
+        if _step.config['MODE'] == 'OPENBRIDGE':
+            _tstream = _step.status.get(_plan.stream_id)
+            if _tstream is None or not _tstream.ACTIVE:
+                continue
+            _tmp_data = b''.join([_step.header(_seq, _bits), term_burst(_tstream.T_LC)])
+        else:
+            _tslot = _step.status[_step.target['TS']]
+            if _tslot.TX_STREAM_ID != _plan.stream_id or _tslot.TX_TGID != _step.target['TGID'] or not _tslot.TX_T_LC:
+                continue
+            _tmp_data = b''.join([_step.header(_seq, _bits), term_burst(_tslot.TX_T_LC), b'\x00\x00'])
+        systems[_step.target['SYSTEM']].send_system(_tmp_data)
+        logger.info('(ROUTER) Sent voice terminator for timed out STREAM ID: %s to System: %s TS: %s, TGID: %s', int_id(_plan.stream_id), _step.target['SYSTEM'], _step.target['TS'], int_id(_step.target['TGID']))
+
+# Log and report the end of an OBP system's stream that went without a terminator, taken
+# out of its STATUS by the trimmer or to make room for another
+def end_obp_stream(system, stream_id, _stream):
+    _sysconfig = CONFIG['SYSTEMS'][system]
+    if _stream.ACTIVE:
+        logger.info('(%s) *TIME OUT*   STREAM ID: %s SUB: %s PEER: %s TYPE: %s DST ID: %s TS 1 Duration: %.2f', \
+        system, int_id(stream_id), get_alias(int_id(_stream.RFS), subscriber_ids), get_alias(int_id(_sysconfig['NETWORK_ID']), peer_ids), _stream.TYPE, get_alias(int_id(_stream.DST), talkgroup_ids), _stream.LAST - _stream.START)
+    if CONFIG['REPORTS']['REPORT']:
+        if _stream.TYPE == 'GROUP':
+            systems[system]._report.send_bridgeEvent('GROUP VOICE,END,RX,{},{},{},{},{},{},{:.2f}'.format(system, int_id(stream_id), int_id(_sysconfig['NETWORK_ID']), int_id(_stream.RFS), 1, int_id(_stream.DST), _stream.LAST - _stream.START).encode(encoding='utf-8', errors='ignore'))
+        elif _stream.TYPE == 'UNIT':
+            systems[system]._report.send_bridgeEvent('UNIT VOICE,END,RX,{},{},{},{},{},{},{:.2f}'.format(system, int_id(stream_id), int_id(_sysconfig['NETWORK_ID']), int_id(_stream.RFS), 1, int_id(_stream.DST), _stream.LAST - _stream.START).encode(encoding='utf-8', errors='ignore'))
+
+# Run this every STREAM_EXPIRY seconds to time out streams not heard of for STREAM_LOST
+# seconds. Only the streams that have are looked at.
 def stream_trimmer_loop():
     logger.debug('(ROUTER) Trimming inactive stream IDs from system lists')
     _now = time()
 
-    for system in systems:
+    _expired = []
+    while STREAMS:
+        _key, _last = next(iter(STREAMS.items()))
+        if _last >= _now - STREAM_LOST:
+            break
+        del STREAMS[_key]
+        _expired.append(_key)
+    if not _expired:
+        return
+
+    # Time them out in the order a walk over every system, slot and stream would
+    _order = {system: i for i, system in enumerate(systems)}
+    def _walk_order(_key):
+        if _key[0] == 'OBP':
+            return (_order[_key[1]], systems[_key[1]].STATUS[_key[2]].START if _key[2] in systems[_key[1]].STATUS else 0)
+        return (_order[_key[1]], _key[2], _key[0])
+    _expired.sort(key=_walk_order)
+
+    # Terminators for the received streams go out before any OBP stream is dropped: a
+    # stream and the OBP streams it feeds are heard together and so time out together,
+    # and a target whose stream had already been dropped would not get one
+    for _kind, system, _id in _expired:
+        if _kind == 'RX':
+            _plan = systems[system]._plans.get(_id)
+            _slot = systems[system].STATUS[_id]
+            if _slot.RX_TYPE != HBPF_SLT_VTERM and _plan is not None and _plan.stream_id == _slot.RX_STREAM_ID:
+                send_terminators(_plan, _id)
+        elif _kind == 'OBP' and _id in systems[system].STATUS and systems[system].STATUS[_id].ACTIVE and _id in systems[system]._plans:
+            send_terminators(systems[system]._plans[_id], 1)
+
+    for _kind, system, _id in _expired:
         # HBP systems, master and peer
-        if CONFIG['SYSTEMS'][system]['MODE'] != 'OPENBRIDGE':
-            for slot in range(1,3):
-                _slot  = systems[system].STATUS[slot]
-
-                # RX slot check
-                if _slot['RX_TYPE'] != HBPF_SLT_VTERM and _slot['RX_TIME'] <  _now - 5:
-                    _slot['RX_TYPE'] = HBPF_SLT_VTERM
-                    logger.info('(%s) *TIME OUT*  RX STREAM ID: %s SUB: %s TGID %s, TS %s, Duration: %.2f', \
-                        system, int_id(_slot['RX_STREAM_ID']), int_id(_slot['RX_RFS']), int_id(_slot['RX_TGID']), slot, _slot['RX_TIME'] - _slot['RX_START'])
-                    if CONFIG['REPORTS']['REPORT']:
-                        systems[system]._report.send_bridgeEvent('GROUP VOICE,END,RX,{},{},{},{},{},{},{:.2f}'.format(system, int_id(_slot['RX_STREAM_ID']), int_id(_slot['RX_PEER']), int_id(_slot['RX_RFS']), slot, int_id(_slot['RX_TGID']), _slot['RX_TIME'] - _slot['RX_START']).encode(encoding='utf-8', errors='ignore'))
-
-                # TX slot check
-                if _slot['TX_TYPE'] != HBPF_SLT_VTERM and _slot['TX_TIME'] <  _now - 5:
-                    _slot['TX_TYPE'] = HBPF_SLT_VTERM
-                    logger.info('(%s) *TIME OUT*  TX STREAM ID: %s SUB: %s TGID %s, TS %s, Duration: %.2f', \
-                        system, int_id(_slot['TX_STREAM_ID']), int_id(_slot['TX_RFS']), int_id(_slot['TX_TGID']), slot, _slot['TX_TIME'] - _slot['TX_START'])
-                    if CONFIG['REPORTS']['REPORT']:
-                        systems[system]._report.send_bridgeEvent('GROUP VOICE,END,TX,{},{},{},{},{},{},{:.2f}'.format(system, int_id(_slot['TX_STREAM_ID']), int_id(_slot['TX_PEER']), int_id(_slot['TX_RFS']), slot, int_id(_slot['TX_TGID']), _slot['TX_TIME'] - _slot['TX_START']).encode(encoding='utf-8', errors='ignore'))
-
-        # OBP systems
-        # We can't delete items from a dicationry that's being iterated, so we have to make a temporarly list of entrys to remove later
-        if CONFIG['SYSTEMS'][system]['MODE'] == 'OPENBRIDGE':
-            remove_list = []
-            for stream_id in systems[system].STATUS:
-                if systems[system].STATUS[stream_id]['LAST'] < _now - 5:
-                    remove_list.append(stream_id)
-            for stream_id in remove_list:
-                if stream_id in systems[system].STATUS:
-                    _stream = systems[system].STATUS[stream_id]
-                    _sysconfig = CONFIG['SYSTEMS'][system]
-                    if systems[system].STATUS[stream_id]['ACTIVE']:
-                        logger.info('(%s) *TIME OUT*   STREAM ID: %s SUB: %s PEER: %s TYPE: %s DST ID: %s TS 1 Duration: %.2f', \
-                        system, int_id(stream_id), get_alias(int_id(_stream['RFS']), subscriber_ids), get_alias(int_id(_sysconfig['NETWORK_ID']), peer_ids), _stream['TYPE'], get_alias(int_id(_stream['DST']), talkgroup_ids), _stream['LAST'] - _stream['START'])
-                    if CONFIG['REPORTS']['REPORT']:
-                            if _stream['TYPE'] == 'GROUP':
-                                systems[system]._report.send_bridgeEvent('GROUP VOICE,END,RX,{},{},{},{},{},{},{:.2f}'.format(system, int_id(stream_id), int_id(_sysconfig['NETWORK_ID']), int_id(_stream['RFS']), 1, int_id(_stream['DST']), _stream['LAST'] - _stream['START']).encode(encoding='utf-8', errors='ignore'))
-                            elif _stream['TYPE'] == 'UNIT':
-                                systems[system]._report.send_bridgeEvent('UNIT VOICE,END,RX,{},{},{},{},{},{},{:.2f}'.format(system, int_id(stream_id), int_id(_sysconfig['NETWORK_ID']), int_id(_stream['RFS']), 1, int_id(_stream['DST']), _stream['LAST'] - _stream['START']).encode(encoding='utf-8', errors='ignore'))
-                    removed = systems[system].STATUS.pop(stream_id)
-                else:
-                    logger.error('(%s) Attemped to remove OpenBridge Stream ID %s not in the Stream ID list: %s', system, int_id(stream_id), [id for id in systems[system].STATUS])
+        if _kind == 'RX':
+            slot = _id
+            _slot  = systems[system].STATUS[slot]
+            if _slot.RX_TYPE != HBPF_SLT_VTERM:
+                _slot.RX_TYPE = HBPF_SLT_VTERM
+                logger.info('(%s) *TIME OUT*  RX STREAM ID: %s SUB: %s TGID %s, TS %s, Duration: %.2f', \
+                    system, int_id(_slot.RX_STREAM_ID), int_id(_slot.RX_RFS), int_id(_slot.RX_TGID), slot, _slot.RX_TIME - _slot.RX_START)
+                if CONFIG['REPORTS']['REPORT']:
+                    systems[system]._report.send_bridgeEvent('GROUP VOICE,END,RX,{},{},{},{},{},{},{:.2f}'.format(system, int_id(_slot.RX_STREAM_ID), int_id(_slot.RX_PEER), int_id(_slot.RX_RFS), slot, int_id(_slot.RX_TGID), _slot.RX_TIME - _slot.RX_START).encode(encoding='utf-8', errors='ignore'))
+
+        elif _kind == 'TX':
+            slot = _id
+            _slot  = systems[system].STATUS[slot]
+            if _slot.TX_TYPE != HBPF_SLT_VTERM:
+                _slot.TX_TYPE = HBPF_SLT_VTERM
+                logger.info('(%s) *TIME OUT*  TX STREAM ID: %s SUB: %s TGID %s, TS %s, Duration: %.2f', \
+                    system, int_id(_slot.TX_STREAM_ID), int_id(_slot.TX_RFS), int_id(_slot.TX_TGID), slot, _slot.TX_TIME - _slot.TX_START)
+                if CONFIG['REPORTS']['REPORT']:
+                    systems[system]._report.send_bridgeEvent('GROUP VOICE,END,TX,{},{},{},{},{},{},{:.2f}'.format(system, int_id(_slot.TX_STREAM_ID), int_id(_slot.TX_PEER), int_id(_slot.TX_RFS), slot, int_id(_slot.TX_TGID), _slot.TX_TIME - _slot.TX_START).encode(encoding='utf-8', errors='ignore'))
+
+        # OBP systems -- streams sent to them from HBP are dropped at their terminator already
+        elif _id in systems[system].STATUS:
+            end_obp_stream(system, _id, systems[system].STATUS.pop(_id))
+            systems[system]._plans.pop(_id, None)
 
 class routerOBP(OPENBRIDGE):
 
     def __init__(self, _name, _config, _report):
         OPENBRIDGE.__init__(self, _name, _config, _report)
         self.name = _name
-        self.STATUS = {}
+
+        # Route plans of the streams being received, by stream ID (see routePlan)
+        self._plans = {}
+
+        # Streams received and sent, by stream ID (see streamtable)
+        self._config['STREAM_STATS'] = stream_stats()
+        self.STATUS = streamTable(OBP_STREAM_TABLE_SIZE, self.stream_evicted, self._config['STREAM_STATS'])
         
         # list of self._targets for unit (subscriber, private) calls
         self._targets = []
 
-    def group_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data):
+    # A stream dropped from a full STATUS to make room: the trimmer won't see it again, so
+    # it ends here the way the trimmer would have ended it
+    def stream_evicted(self, _stream_id, _stream):
+        STREAMS.pop(('OBP', self._system, _stream_id), None)
+        _plan = self._plans.pop(_stream_id, None)
+        if _stream.ACTIVE and _plan is not None:
+            send_terminators(_plan, 1)
+        end_obp_stream(self._system, _stream_id, _stream)
+
+    def group_received(self, _frame):
+        _data       = _frame.data
+        _peer_id    = _frame.peer_id
+        _rf_src     = _frame.rf_src
+        _dst_id     = _frame.dst_id
+        _seq        = _frame.seq
+        _slot       = _frame.slot
+        _frame_type = _frame.frame_type
+        _dtype_vseq = _frame.dtype_vseq
+        _stream_id  = _frame.stream_id
         pkt_time = time()
-        dmrpkt = _data[20:53]
-        _bits = _data[15]
+        dmrpkt = _frame.payload
+        _bits = _frame.bits
         
         # Is this a new call stream?
         if (_stream_id not in self.STATUS):
             # This is a new call stream
-            self.STATUS[_stream_id] = {
-                'START':     pkt_time,
-                'CONTENTION':False,
-                'RFS':       _rf_src,
-                'TYPE':      'GROUP',
-                'DST':       _dst_id,
-                'ACTIVE':    True
-            }
+            self.STATUS[_stream_id] = obpStream(pkt_time, _rf_src, 'GROUP', _dst_id)
 
             # If we can, use the LC from the voice header as to keep all options intact
             if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD:
                 decoded = decode.voice_head_term(dmrpkt)
-                self.STATUS[_stream_id]['LC'] = decoded['LC']
+                self.STATUS[_stream_id].LC = decoded['LC']
+                self.STATUS[_stream_id].LC_HEAD = True
 
             # If we don't have a voice header then don't wait to decode the Embedded LC
             # just make a new one from the HBP header. This is good enough, and it saves lots of time
             else:
-                self.STATUS[_stream_id]['LC'] = LC_OPT + _dst_id + _rf_src
+                self.STATUS[_stream_id].LC = LC_OPT + _dst_id + _rf_src
+                self.STATUS[_stream_id].LC_HEAD = False
 
 
             logger.info('(%s) *GROUP CALL START* OBP STREAM ID: %s SUB: %s (%s) PEER: %s (%s) TGID %s (%s), TS %s', \
@@ -273,197 +531,201 @@ class routerOBP(OPENBRIDGE):
             if CONFIG['REPORTS']['REPORT']:
                 self._report.send_bridgeEvent('GROUP VOICE,START,RX,{},{},{},{},{},{}'.format(self._system, int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _slot, int_id(_dst_id)).encode(encoding='utf-8', errors='ignore'))
 
-        self.STATUS[_stream_id]['LAST'] = pkt_time
-
-
-        for _bridge in BRIDGES:
-            for _system in BRIDGES[_bridge]:
-
-                if (_system['SYSTEM'] == self._system and _system['TGID'] == _dst_id and _system['TS'] == _slot and _system['ACTIVE'] == True):
-
-                    for _target in BRIDGES[_bridge]:
-                        if (_target['SYSTEM'] != self._system) and (_target['ACTIVE']):
-                            _target_status = systems[_target['SYSTEM']].STATUS
-                            _target_system = self._CONFIG['SYSTEMS'][_target['SYSTEM']]
-                            if _target_system['MODE'] == 'OPENBRIDGE':
-                                # Is this a new call stream on the target?
-                                if (_stream_id not in _target_status):
-                                    # This is a new call stream on the target
-                                    _target_status[_stream_id] = {
-                                        'START':     pkt_time,
-                                        'CONTENTION':False,
-                                        'RFS':       _rf_src,
-                                        'TYPE':      'GROUP',
-                                        'DST':       _dst_id,
-                                        'ACTIVE':    True
-                                    }
-                                    # Generate LCs (full and EMB) for the TX stream
-                                    dst_lc = b''.join([self.STATUS[_stream_id]['LC'][0:3], _target['TGID'], _rf_src])
-                                    _target_status[_stream_id]['H_LC'] = bptc.encode_header_lc(dst_lc)
-                                    _target_status[_stream_id]['T_LC'] = bptc.encode_terminator_lc(dst_lc)
-                                    _target_status[_stream_id]['EMB_LC'] = bptc.encode_emblc(dst_lc)
-
-                                    logger.info('(%s) Conference Bridge: %s, Call Bridged to OBP System: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
-                                    if CONFIG['REPORTS']['REPORT']:
-                                        systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,START,TX,{},{},{},{},{},{}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID'])).encode(encoding='utf-8', errors='ignore'))
-
-                                # Record the time of this packet so we can later identify a stale stream
-                                _target_status[_stream_id]['LAST'] = pkt_time
-                                # Clear the TS bit -- all OpenBridge streams are effectively on TS1
-                                _tmp_bits = _bits & ~(1 << 7)
-
-                                # Assemble transmit HBP packet header
-                                _tmp_data = b''.join([_data[:8], _target['TGID'], _data[11:15], _tmp_bits.to_bytes(1, 'big'), _data[16:20]])
-
-                                # MUST TEST FOR NEW STREAM AND IF SO, RE-WRITE THE LC FOR THE TARGET
-                                # MUST RE-WRITE DESTINATION TGID IF DIFFERENT
-                                # if _dst_id != rule['DST_GROUP']:
-                                dmrbits = bitarray(endian='big')
-                                dmrbits.frombytes(dmrpkt)
-                                # Create a voice header packet (FULL LC)
-                                if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD:
-                                    dmrbits = _target_status[_stream_id]['H_LC'][0:98] + dmrbits[98:166] + _target_status[_stream_id]['H_LC'][98:197]
-                                # Create a voice terminator packet (FULL LC)
-                                elif _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VTERM:
-                                    dmrbits = _target_status[_stream_id]['T_LC'][0:98] + dmrbits[98:166] + _target_status[_stream_id]['T_LC'][98:197]
-                                    if CONFIG['REPORTS']['REPORT']:
-                                        call_duration = pkt_time - _target_status[_stream_id]['START']
-                                        _target_status[_stream_id]['ACTIVE'] = False
-                                        systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,END,TX,{},{},{},{},{},{},{:.2f}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID']), call_duration).encode(encoding='utf-8', errors='ignore'))              
-                                # Create a Burst B-E packet (Embedded LC)
-                                elif _dtype_vseq in [1,2,3,4]:
-                                    dmrbits = dmrbits[0:116] + _target_status[_stream_id]['EMB_LC'][_dtype_vseq] + dmrbits[148:264]
-                                dmrpkt = dmrbits.tobytes()
-                                _tmp_data = b''.join([_tmp_data, dmrpkt])
-
-                            else:
-                                # BEGIN CONTENTION HANDLING
-                                #
-                                # The rules for each of the 4 "ifs" below are listed here for readability. The Frame To Send is:
-                                #   From a different group than last RX from this HBSystem, but it has been less than Group Hangtime
-                                #   From a different group than last TX to this HBSystem, but it has been less than Group Hangtime
-                                #   From the same group as the last RX from this HBSystem, but from a different subscriber, and it has been less than stream timeout
-                                #   From the same group as the last TX to this HBSystem, but from a different subscriber, and it has been less than stream timeout
-                                # The "continue" at the end of each means the next iteration of the for loop that tests for matching rules
-                                #
-                                if ((_target['TGID'] != _target_status[_target['TS']]['RX_TGID']) and ((pkt_time - _target_status[_target['TS']]['RX_TIME']) < _target_system['GROUP_HANGTIME'])):
-                                    if self.STATUS[_stream_id]['CONTENTION'] == False:
-                                        self.STATUS[_stream_id]['CONTENTION'] = True
-                                        logger.info('(%s) Call not routed to TGID %s, target active or in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['RX_TGID']))
-                                    continue
-                                if ((_target['TGID'] != _target_status[_target['TS']]['TX_TGID']) and ((pkt_time - _target_status[_target['TS']]['TX_TIME']) < _target_system['GROUP_HANGTIME'])):
-                                    if self.STATUS[_stream_id]['CONTENTION'] == False:
-                                        self.STATUS[_stream_id]['CONTENTION'] = True
-                                        logger.info('(%s) Call not routed to TGID%s, target in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['TX_TGID']))
-                                    continue
-                                if (_target['TGID'] == _target_status[_target['TS']]['RX_TGID']) and ((pkt_time - _target_status[_target['TS']]['RX_TIME']) < STREAM_TO):
-                                    if self.STATUS[_stream_id]['CONTENTION'] == False:
-                                        self.STATUS[_stream_id]['CONTENTION'] = True
-                                        logger.info('(%s) Call not routed to TGID%s, matching call already active on target: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['RX_TGID']))
-                                    continue
-                                if (_target['TGID'] == _target_status[_target['TS']]['TX_TGID']) and (_rf_src != _target_status[_target['TS']]['TX_RFS']) and ((pkt_time - _target_status[_target['TS']]['TX_TIME']) < STREAM_TO):
-                                    if self.STATUS[_stream_id]['CONTENTION'] == False:
-                                        self.STATUS[_stream_id]['CONTENTION'] = True
-                                        logger.info('(%s) Call not routed for subscriber %s, call route in progress on target: HBSystem: %s, TS: %s, TGID: %s, SUB: %s', self._system, int_id(_rf_src), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['TX_TGID']), int_id(_target_status[_target['TS']]['TX_RFS']))
-                                    continue
-
-                                # Is this a new call stream?
-                                if (_target_status[_target['TS']]['TX_STREAM_ID'] != _stream_id):
-                                    # Record the DST TGID and Stream ID
-                                    _target_status[_target['TS']]['TX_START'] = pkt_time
-                                    _target_status[_target['TS']]['TX_TGID'] = _target['TGID']
-                                    _target_status[_target['TS']]['TX_STREAM_ID'] = _stream_id
-                                    _target_status[_target['TS']]['TX_RFS'] = _rf_src
-                                    _target_status[_target['TS']]['TX_PEER'] = _peer_id
-                                    # Generate LCs (full and EMB) for the TX stream
-                                    dst_lc = b''.join([self.STATUS[_stream_id]['LC'][0:3], _target['TGID'], _rf_src])
-                                    _target_status[_target['TS']]['TX_H_LC'] = bptc.encode_header_lc(dst_lc)
-                                    _target_status[_target['TS']]['TX_T_LC'] = bptc.encode_terminator_lc(dst_lc)
-                                    _target_status[_target['TS']]['TX_EMB_LC'] = bptc.encode_emblc(dst_lc)
-                                    logger.debug('(%s) Generating TX FULL and EMB LCs for HomeBrew destination: System: %s, TS: %s, TGID: %s', self._system, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
-                                    logger.info('(%s) Conference Bridge: %s, Call Bridged to HBP System: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
-                                    if CONFIG['REPORTS']['REPORT']:
-                                       systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,START,TX,{},{},{},{},{},{}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID'])).encode(encoding='utf-8', errors='ignore'))
-
-                                # Set other values for the contention handler to test next time there is a frame to forward
-                                _target_status[_target['TS']]['TX_TIME'] = pkt_time
-                                _target_status[_target['TS']]['TX_TYPE'] = _dtype_vseq
-
-                                # Handle any necessary re-writes for the destination
-                                if _system['TS'] != _target['TS']:
-                                    _tmp_bits = _bits ^ 1 << 7
-                                else:
-                                    _tmp_bits = _bits
-
-                                # Assemble transmit HBP packet header
-                                _tmp_data = b''.join([_data[:8], _target['TGID'], _data[11:15], _tmp_bits.to_bytes(1, 'big'), _data[16:20]])
-
-                                # MUST TEST FOR NEW STREAM AND IF SO, RE-WRITE THE LC FOR THE TARGET
-                                # MUST RE-WRITE DESTINATION TGID IF DIFFERENT
-                                # if _dst_id != rule['DST_GROUP']:
-                                dmrbits = bitarray(endian='big')
-                                dmrbits.frombytes(dmrpkt)
-                                # Create a voice header packet (FULL LC)
-                                if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD:
-                                    dmrbits = _target_status[_target['TS']]['TX_H_LC'][0:98] + dmrbits[98:166] + _target_status[_target['TS']]['TX_H_LC'][98:197]
-                                # Create a voice terminator packet (FULL LC)
-                                elif _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VTERM:
-                                    dmrbits = _target_status[_target['TS']]['TX_T_LC'][0:98] + dmrbits[98:166] + _target_status[_target['TS']]['TX_T_LC'][98:197]
-                                    if CONFIG['REPORTS']['REPORT']:
-                                        call_duration = pkt_time - _target_status[_target['TS']]['TX_START']
-                                        systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,END,TX,{},{},{},{},{},{},{:.2f}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID']), call_duration).encode(encoding='utf-8', errors='ignore'))
-                                # Create a Burst B-E packet (Embedded LC)
-                                elif _dtype_vseq in [1,2,3,4]:
-                                    dmrbits = dmrbits[0:116] + _target_status[_target['TS']]['TX_EMB_LC'][_dtype_vseq] + dmrbits[148:264]
-                                dmrpkt = dmrbits.tobytes()
-                                _tmp_data = b''.join([_tmp_data, dmrpkt, b'\x00\x00']) # Add two bytes of nothing since OBP doesn't include BER & RSSI bytes #_data[53:55]
-
-                            # Transmit the packet to the destination system
-                            systems[_target['SYSTEM']].send_system(_tmp_data)
-                            #logger.debug('(%s) Packet routed by bridge: %s to system: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
+        self.STATUS.seen(_stream_id, pkt_time)
+        stream_seen(('OBP', self._system, _stream_id), pkt_time)
+
+
+        # Follow the stream's route plan, making a new one for a new stream or new routes
+        _plan = self._plans.get(_stream_id)
+        if _plan is None or not _plan.matches(_data):
+            _plan = self._plans[_stream_id] = routePlan(_data, ROUTES.get((self._system, _slot, _dst_id), ()), self.STATUS[_stream_id].LC if self.STATUS[_stream_id].LC_HEAD else None)
+        _plan.seq = _seq
+        # Bursts with a full LC have it spliced whole, bursts B-E their embedded LC fragment
+        _splice = splice_full if _frame_type == HBPF_DATA_SYNC and _dtype_vseq in (HBPF_SLT_VHEAD, HBPF_SLT_VTERM) else splice_emb
+        _egress = {}
+        for _step in _plan.steps:
+            _bridge, _system, _target = _step.bridge, _step.source, _step.target
+            _target_status = _step.status
+            _target_system = _step.config
+            if _target_system['MODE'] == 'OPENBRIDGE':
+                # Is this a new call stream on the target?
+                if (_stream_id not in _target_status):
+                    # This is a new call stream on the target
+                    _target_status[_stream_id] = obpStream(pkt_time, _rf_src, 'GROUP', _dst_id)
+                    # Generate LCs (full and EMB) for the TX stream
+                    dst_lc = b''.join([self.STATUS[_stream_id].LC[0:3], _target['TGID'], _rf_src])
+                    _target_status[_stream_id].H_LC, _target_status[_stream_id].T_LC, _target_status[_stream_id].EMB_LC = splice_lc(dst_lc)
+
+                    logger.info('(%s) Conference Bridge: %s, Call Bridged to OBP System: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
+                    if CONFIG['REPORTS']['REPORT']:
+                        systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,START,TX,{},{},{},{},{},{}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID'])).encode(encoding='utf-8', errors='ignore'))
+
+                # Record the time of this packet so we can later identify a stale stream
+                _target_status.seen(_stream_id, pkt_time)
+                stream_seen(('OBP', _target['SYSTEM'], _stream_id), pkt_time)
+                # MUST TEST FOR NEW STREAM AND IF SO, RE-WRITE THE LC FOR THE TARGET
+                # MUST RE-WRITE DESTINATION TGID IF DIFFERENT
+                # if _dst_id != rule['DST_GROUP']:
+                # Passthrough targets get the payload as it came in, the others their own LC
+                _lc = None
+                # Create a voice header packet (FULL LC)
+                if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD:
+                    if not _step.passthrough:
+                        _lc = _target_status[_stream_id].H_LC
+                # Create a voice terminator packet (FULL LC)
+                elif _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VTERM:
+                    if not _step.passthrough:
+                        _lc = _target_status[_stream_id].T_LC
+                    if CONFIG['REPORTS']['REPORT']:
+                        call_duration = pkt_time - _target_status[_stream_id].START
+                        _target_status[_stream_id].ACTIVE = False
+                        systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,END,TX,{},{},{},{},{},{},{:.2f}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID']), call_duration).encode(encoding='utf-8', errors='ignore'))              
+                # Create a Burst B-E packet (Embedded LC)
+                elif _dtype_vseq in [1,2,3,4]:
+                    if not _step.passthrough:
+                        _lc = _target_status[_stream_id].EMB_LC[_dtype_vseq]
+
+                # Assemble transmit HBP packet header -- the TS bit is cleared, all OpenBridge streams are effectively on TS1
+                # Targets given the same header, LC and tail share one packet, built for the first of them
+                _tmp_data = _egress.get((_step.egress, _lc))
+                if _tmp_data is None:
+                    _tmp_data = _egress[(_step.egress, _lc)] = b''.join([_step.header(_seq, _bits), dmrpkt if _lc is None else _splice(dmrpkt, _lc)])
+
+            else:
+                # After a burst has gone through to this target, the rest skip the checks for
+                # as long as the slot's RX state is unchanged and the stream still holds its TX.
+                # After one has been kept off it, the rest are until the check that did it could
+                # pass, or the slot starts receiving or sending another TGID or subscriber.
+                _tslot = _target_status[_target['TS']]
+                if not (_step.version == _tslot.VERSION and _tslot.TX_STREAM_ID == _stream_id and _tslot.TX_TGID == _target['TGID'] and _tslot.TX_RFS == _rf_src):
+                    _blocked = _step.blocked
+                    if _blocked is not None and pkt_time < _blocked[0] and _blocked[1] == _tslot.RX_TGID and _blocked[2] == _tslot.TX_TGID and _blocked[3] == _tslot.TX_RFS:
+                        continue
+
+                    # BEGIN CONTENTION HANDLING
+                    #
+                    # The rules for each of the 4 "ifs" below are listed here for readability. The Frame To Send is:
+                    #   From a different group than last RX from this HBSystem, but it has been less than Group Hangtime
+                    #   From a different group than last TX to this HBSystem, but it has been less than Group Hangtime
+                    #   From the same group as the last RX from this HBSystem, but from a different subscriber, and it has been less than stream timeout
+                    #   From the same group as the last TX to this HBSystem, but from a different subscriber, and it has been less than stream timeout
+                    # The "continue" at the end of each means the next iteration of the for loop that tests for matching rules
+                    #
+                    if ((_target['TGID'] != _target_status[_target['TS']].RX_TGID) and ((pkt_time - _target_status[_target['TS']].RX_TIME) < _target_system['GROUP_HANGTIME'])):
+                        if self.STATUS[_stream_id].CONTENTION == False:
+                            self.STATUS[_stream_id].CONTENTION = True
+                            logger.info('(%s) Call not routed to TGID %s, target active or in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']].RX_TGID))
+                        _step.block(_tslot, _tslot.RX_TIME + _target_system['GROUP_HANGTIME'])
+                        continue
+                    if ((_target['TGID'] != _target_status[_target['TS']].TX_TGID) and ((pkt_time - _target_status[_target['TS']].TX_TIME) < _target_system['GROUP_HANGTIME'])):
+                        if self.STATUS[_stream_id].CONTENTION == False:
+                            self.STATUS[_stream_id].CONTENTION = True
+                            logger.info('(%s) Call not routed to TGID%s, target in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']].TX_TGID))
+                        _step.block(_tslot, _tslot.TX_TIME + _target_system['GROUP_HANGTIME'])
+                        continue
+                    if (_target['TGID'] == _target_status[_target['TS']].RX_TGID) and ((pkt_time - _target_status[_target['TS']].RX_TIME) < STREAM_TO):
+                        if self.STATUS[_stream_id].CONTENTION == False:
+                            self.STATUS[_stream_id].CONTENTION = True
+                            logger.info('(%s) Call not routed to TGID%s, matching call already active on target: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']].RX_TGID))
+                        _step.block(_tslot, _tslot.RX_TIME + STREAM_TO)
+                        continue
+                    if (_target['TGID'] == _target_status[_target['TS']].TX_TGID) and (_rf_src != _target_status[_target['TS']].TX_RFS) and ((pkt_time - _target_status[_target['TS']].TX_TIME) < STREAM_TO):
+                        if self.STATUS[_stream_id].CONTENTION == False:
+                            self.STATUS[_stream_id].CONTENTION = True
+                            logger.info('(%s) Call not routed for subscriber %s, call route in progress on target: HBSystem: %s, TS: %s, TGID: %s, SUB: %s', self._system, int_id(_rf_src), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']].TX_TGID), int_id(_target_status[_target['TS']].TX_RFS))
+                        _step.block(_tslot, _tslot.TX_TIME + STREAM_TO)
+                        continue
+
+                    # Is this a new call stream?
+                    if (_target_status[_target['TS']].TX_STREAM_ID != _stream_id):
+                        # Record the DST TGID and Stream ID
+                        _target_status[_target['TS']].TX_START = pkt_time
+                        _target_status[_target['TS']].TX_TGID = _target['TGID']
+                        _target_status[_target['TS']].TX_STREAM_ID = _stream_id
+                        _target_status[_target['TS']].TX_RFS = _rf_src
+                        _target_status[_target['TS']].TX_PEER = _peer_id
+                        # Generate LCs (full and EMB) for the TX stream
+                        dst_lc = b''.join([self.STATUS[_stream_id].LC[0:3], _target['TGID'], _rf_src])
+                        _target_status[_target['TS']].TX_H_LC, _target_status[_target['TS']].TX_T_LC, _target_status[_target['TS']].TX_EMB_LC = splice_lc(dst_lc)
+                        logger.debug('(%s) Generating TX FULL and EMB LCs for HomeBrew destination: System: %s, TS: %s, TGID: %s', self._system, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
+                        logger.info('(%s) Conference Bridge: %s, Call Bridged to HBP System: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
+                        if CONFIG['REPORTS']['REPORT']:
+                           systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,START,TX,{},{},{},{},{},{}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID'])).encode(encoding='utf-8', errors='ignore'))
+
+                    _step.open(_tslot)
+
+                # Set other values for the contention handler to test next time there is a frame to forward
+                _target_status[_target['TS']].TX_TIME = pkt_time
+                stream_seen(('TX', _target['SYSTEM'], _target['TS']), pkt_time)
+                _target_status[_target['TS']].TX_TYPE = _dtype_vseq
+
+                # MUST TEST FOR NEW STREAM AND IF SO, RE-WRITE THE LC FOR THE TARGET
+                # MUST RE-WRITE DESTINATION TGID IF DIFFERENT
+                # if _dst_id != rule['DST_GROUP']:
+                # Passthrough targets get the payload as it came in, the others their own LC
+                _lc = None
+                # Create a voice header packet (FULL LC)
+                if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD:
+                    if not _step.passthrough:
+                        _lc = _step.h_lc
+                # Create a voice terminator packet (FULL LC)
+                elif _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VTERM:
+                    if not _step.passthrough:
+                        _lc = _step.t_lc
+                    if CONFIG['REPORTS']['REPORT']:
+                        call_duration = pkt_time - _target_status[_target['TS']].TX_START
+                        systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,END,TX,{},{},{},{},{},{},{:.2f}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID']), call_duration).encode(encoding='utf-8', errors='ignore'))
+                # Create a Burst B-E packet (Embedded LC)
+                elif _dtype_vseq in [1,2,3,4]:
+                    if not _step.passthrough:
+                        _lc = _step.emb_lc[_dtype_vseq]
+
+                # Assemble transmit HBP packet header -- the TS bit is re-written if the target is on the other slot
+                # Targets given the same header, LC and tail share one packet, built for the first of them
+                _tmp_data = _egress.get((_step.egress, _lc))
+                if _tmp_data is None:
+                    _tmp_data = _egress[(_step.egress, _lc)] = b''.join([_step.header(_seq, _bits), dmrpkt if _lc is None else _splice(dmrpkt, _lc), b'\x00\x00']) # Add two bytes of nothing since OBP doesn't include BER & RSSI bytes #_data[53:55]
+
+            # Transmit the packet to the destination system
+            systems[_target['SYSTEM']].send_system(_tmp_data)
+            #logger.debug('(%s) Packet routed by bridge: %s to system: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
 
 
         # Final actions - Is this a voice terminator?
         if (_frame_type == HBPF_DATA_SYNC) and (_dtype_vseq == HBPF_SLT_VTERM):
-            call_duration = pkt_time - self.STATUS[_stream_id]['START']
+            call_duration = pkt_time - self.STATUS[_stream_id].START
             logger.info('(%s) *GROUP CALL END*   STREAM ID: %s SUB: %s (%s) PEER: %s (%s) TGID %s (%s), TS %s, Duration: %.2f', \
                     self._system, int_id(_stream_id), get_alias(_rf_src, subscriber_ids), int_id(_rf_src), get_alias(_peer_id, peer_ids), int_id(_peer_id), get_alias(_dst_id, talkgroup_ids), int_id(_dst_id), _slot, call_duration)
             if CONFIG['REPORTS']['REPORT']:
                self._report.send_bridgeEvent('GROUP VOICE,END,RX,{},{},{},{},{},{},{:.2f}'.format(self._system, int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _slot, int_id(_dst_id), call_duration).encode(encoding='utf-8', errors='ignore'))
-            self.STATUS[_stream_id]['ACTIVE'] = False
+            self.STATUS[_stream_id].ACTIVE = False
             logger.debug('(%s) OpenBridge sourced call stream end, remove terminated Stream ID: %s', self._system, int_id(_stream_id))
 
 
-    def unit_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data):
+    def unit_received(self, _frame):
         global UNIT_MAP
+        _data       = _frame.data
+        _peer_id    = _frame.peer_id
+        _rf_src     = _frame.rf_src
+        _dst_id     = _frame.dst_id
+        _seq        = _frame.seq
+        _slot       = _frame.slot
+        _frame_type = _frame.frame_type
+        _dtype_vseq = _frame.dtype_vseq
+        _stream_id  = _frame.stream_id
         pkt_time = time()
-        dmrpkt = _data[20:53]
-        _bits = _data[15]
-
-        # Check if subscriber is in STATIC_UNIT
-        for i in STATIC_UNIT:
-            # Subscriber is static. Add 20 years of time.
-            if i[0] == int_id(_rf_src):
-                map_time = pkt_time + time_20
-                logger.debug('Static Unit, update time.')
-            # Proceed as normal
-            else:
-                map_time = pkt_time        
+        dmrpkt = _frame.payload
+        _bits = _frame.bits
+
         # Make/update this unit in the UNIT_MAP cache
-        UNIT_MAP[_rf_src] = (self.name, map_time)
+        UNIT_MAP[_rf_src] = (self.name, pkt_time)
         
         
         # Is this a new call stream?
         if (_stream_id not in self.STATUS):
             # This is a new call stream
-            self.STATUS[_stream_id] = {
-                'START':     pkt_time,
-                'CONTENTION':False,
-                'RFS':       _rf_src,
-                'TYPE':      'UNIT',
-                'DST':       _dst_id,
-                'ACTIVE':    True
-            }
+            shard.publish('UNIT', _rf_src, UNIT_MAP[_rf_src])
+            self.STATUS[_stream_id] = obpStream(pkt_time, _rf_src, 'UNIT', _dst_id)
                 
             # Create a destination list for the call:                
             if _dst_id in UNIT_MAP:
@@ -484,7 +746,8 @@ class routerOBP(OPENBRIDGE):
                 self._report.send_bridgeEvent('UNIT VOICE,START,RX,{},{},{},{},{},{},{}'.format(self._system, int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _slot, int_id(_dst_id), self._targets).encode(encoding='utf-8', errors='ignore'))
 
         # Record the time of this packet so we can later identify a stale stream
-        self.STATUS[_stream_id]['LAST'] = pkt_time
+        self.STATUS.seen(_stream_id, pkt_time)
+        stream_seen(('OBP', self._system, _stream_id), pkt_time)
 
         for _target in self._targets:
             _target_status = systems[_target].STATUS
@@ -493,21 +756,15 @@ class routerOBP(OPENBRIDGE):
             if self._CONFIG['SYSTEMS'][_target]['MODE'] == 'OPENBRIDGE':
                 if (_stream_id not in _target_status):
                     # This is a new call stream on the target
-                    _target_status[_stream_id] = {
-                        'START':     pkt_time,
-                        'CONTENTION':False,
-                        'RFS':       _rf_src,
-                        'TYPE':      'UNIT',
-                        'DST':      _dst_id,
-                        'ACTIVE':   True
-                    }
+                    _target_status[_stream_id] = obpStream(pkt_time, _rf_src, 'UNIT', _dst_id)
 
                     logger.info('(%s) Unit call bridged to OBP System: %s TS: %s, TGID: %s', self._system, _target, _slot if _target_system['BOTH_SLOTS'] else 1, int_id(_dst_id))
                     if CONFIG['REPORTS']['REPORT']:
                         systems[_target]._report.send_bridgeEvent('UNIT VOICE,START,TX,{},{},{},{},{},{}'.format(_target, int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _slot, int_id(_dst_id)).encode(encoding='utf-8', errors='ignore'))
 
                 # Record the time of this packet so we can later identify a stale stream
-                _target_status[_stream_id]['LAST'] = pkt_time
+                _target_status.seen(_stream_id, pkt_time)
+                stream_seen(('OBP', _target, _stream_id), pkt_time)
                 # Clear the TS bit and follow propper OBP definition, unless "BOTH_SLOTS" is set. This only works for unit calls.
                 if _target_system['BOTH_SLOTS']:
                     _tmp_bits = _bits
@@ -519,7 +776,7 @@ class routerOBP(OPENBRIDGE):
                 _data = b''.join([_tmp_data, dmrpkt])
                 
                 if (_frame_type == HBPF_DATA_SYNC) and (_dtype_vseq == HBPF_SLT_VTERM):
-                    _target_status[_stream_id]['ACTIVE'] = False
+                    _target_status[_stream_id].ACTIVE = False
 
             else:
                 # BEGIN STANDARD CONTENTION HANDLING
@@ -532,44 +789,45 @@ class routerOBP(OPENBRIDGE):
                 # The "continue" at the end of each means the next iteration of the for loop that tests for matching rules
                 #
                 '''
-                if ((_dst_id != _target_status[_slot]['RX_TGID']) and ((pkt_time - _target_status[_slot]['RX_TIME']) < _target_system['GROUP_HANGTIME'])):
-                    if self.STATUS[_stream_id]['CONTENTION'] == False:
-                        self.STATUS[_stream_id]['CONTENTION'] = True
-                        logger.info('(%s) Call not routed to TGID %s, target active or in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot]['RX_TGID']))
+                if ((_dst_id != _target_status[_slot].RX_TGID) and ((pkt_time - _target_status[_slot].RX_TIME) < _target_system['GROUP_HANGTIME'])):
+                    if self.STATUS[_stream_id].CONTENTION == False:
+                        self.STATUS[_stream_id].CONTENTION = True
+                        logger.info('(%s) Call not routed to TGID %s, target active or in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot].RX_TGID))
                     continue
-                if ((_dst_id != _target_status[_slot]['TX_TGID']) and ((pkt_time - _target_status[_slot]['TX_TIME']) < _target_system['GROUP_HANGTIME'])):
-                    if self.STATUS[_stream_id]['CONTENTION'] == False:
-                        self.STATUS[_stream_id]['CONTENTION'] = True
-                        logger.info('(%s) Call not routed to TGID%s, target in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot]['TX_TGID']))
+                if ((_dst_id != _target_status[_slot].TX_TGID) and ((pkt_time - _target_status[_slot].TX_TIME) < _target_system['GROUP_HANGTIME'])):
+                    if self.STATUS[_stream_id].CONTENTION == False:
+                        self.STATUS[_stream_id].CONTENTION = True
+                        logger.info('(%s) Call not routed to TGID%s, target in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot].TX_TGID))
                     continue
                 '''
-                if (_dst_id == _target_status[_slot]['RX_TGID']) and ((pkt_time - _target_status[_slot]['RX_TIME']) < STREAM_TO):
-                    if self.STATUS[_stream_id]['CONTENTION'] == False:
-                        self.STATUS[_stream_id]['CONTENTION'] = True
-                        logger.info('(%s) Call not routed to TGID%s, matching call already active on target: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot]['RX_TGID']))
+                if (_dst_id == _target_status[_slot].RX_TGID) and ((pkt_time - _target_status[_slot].RX_TIME) < STREAM_TO):
+                    if self.STATUS[_stream_id].CONTENTION == False:
+                        self.STATUS[_stream_id].CONTENTION = True
+                        logger.info('(%s) Call not routed to TGID%s, matching call already active on target: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot].RX_TGID))
                     continue
-                if (_dst_id == _target_status[_slot]['TX_TGID']) and (_rf_src != _target_status[_slot]['TX_RFS']) and ((pkt_time - _target_status[_slot]['TX_TIME']) < STREAM_TO):
-                    if self.STATUS[_stream_id]['CONTENTION'] == False:
-                        self.STATUS[_stream_id]['CONTENTION'] = True
-                        logger.info('(%s) Call not routed for subscriber %s, call route in progress on target: HBSystem: %s, TS: %s, TGID: %s, SUB: %s', self._system, int_id(_rf_src), _target, _slot, int_id(_target_status[_slot]['TX_TGID']), int_id(_target_status[_slot]['TX_RFS']))
+                if (_dst_id == _target_status[_slot].TX_TGID) and (_rf_src != _target_status[_slot].TX_RFS) and ((pkt_time - _target_status[_slot].TX_TIME) < STREAM_TO):
+                    if self.STATUS[_stream_id].CONTENTION == False:
+                        self.STATUS[_stream_id].CONTENTION = True
+                        logger.info('(%s) Call not routed for subscriber %s, call route in progress on target: HBSystem: %s, TS: %s, TGID: %s, SUB: %s', self._system, int_id(_rf_src), _target, _slot, int_id(_target_status[_slot].TX_TGID), int_id(_target_status[_slot].TX_RFS))
                     continue
 
                 # Record target information if this is a new call stream?
                 if (_stream_id not in self.STATUS):
                     # Record the DST TGID and Stream ID
-                    _target_status[_slot]['TX_START'] = pkt_time
-                    _target_status[_slot]['TX_TGID'] = _dst_id
-                    _target_status[_slot]['TX_STREAM_ID'] = _stream_id
-                    _target_status[_slot]['TX_RFS'] = _rf_src
-                    _target_status[_slot]['TX_PEER'] = _peer_id
+                    _target_status[_slot].TX_START = pkt_time
+                    _target_status[_slot].TX_TGID = _dst_id
+                    _target_status[_slot].TX_STREAM_ID = _stream_id
+                    _target_status[_slot].TX_RFS = _rf_src
+                    _target_status[_slot].TX_PEER = _peer_id
                     
                     logger.info('(%s) Unit call bridged to HBP System: %s TS: %s, UNIT: %s', self._system, _target, _slot, int_id(_dst_id))
                     if CONFIG['REPORTS']['REPORT']:
                        systems[_target]._report.send_bridgeEvent('UNIT VOICE,START,TX,{},{},{},{},{},{}'.format(_target, int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _slot, int_id(_dst_id)).encode(encoding='utf-8', errors='ignore'))
 
                 # Set other values for the contention handler to test next time there is a frame to forward
-                _target_status[_slot]['TX_TIME'] = pkt_time
-                _target_status[_slot]['TX_TYPE'] = _dtype_vseq
+                _target_status[_slot].TX_TIME = pkt_time
+                stream_seen(('TX', _target, _slot), pkt_time)
+                _target_status[_slot].TX_TYPE = _dtype_vseq
 
             #send the call:
             systems[_target].send_system(_data)
@@ -583,22 +841,22 @@ class routerOBP(OPENBRIDGE):
         # Final actions - Is this a voice terminator?
         if (_frame_type == HBPF_DATA_SYNC) and (_dtype_vseq == HBPF_SLT_VTERM):
             self._targets = []
-            call_duration = pkt_time - self.STATUS[_stream_id]['START']
+            call_duration = pkt_time - self.STATUS[_stream_id].START
             logger.info('(%s) *UNIT CALL END*   STREAM ID: %s SUB: %s (%s) PEER: %s (%s) UNIT %s (%s), TS %s, Duration: %.2f', \
                     self._system, int_id(_stream_id), get_alias(_rf_src, subscriber_ids), int_id(_rf_src), get_alias(_peer_id, peer_ids), int_id(_peer_id), get_alias(_dst_id, talkgroup_ids), int_id(_dst_id), _slot, call_duration)
             if CONFIG['REPORTS']['REPORT']:
                self._report.send_bridgeEvent('UNIT VOICE,END,RX,{},{},{},{},{},{},{:.2f}'.format(self._system, int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _slot, int_id(_dst_id), call_duration).encode(encoding='utf-8', errors='ignore'))
 
 
-    def dmrd_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data):
-
+    def dmrd_frame_received(self, _frame):
+        _call_type = _frame.call_type
         if _call_type == 'group':
-            self.group_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data)
+            self.group_received(_frame)
         elif _call_type == 'unit':
-            self.unit_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data)
+            self.unit_received(_frame)
         elif _call_type == 'vcsbk':
             # Route CSBK packets to destination TG. Necessary for group data to work with GPS/Data decoder.
-            self.group_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data)
+            self.group_received(_frame)
             logger.debug('CSBK recieved, but HBlink does not process them currently. Packets routed to talkgroup.')
 
         else:
@@ -614,82 +872,42 @@ class routerHBP(HBSYSTEM):
         # list of self._targets for unit (subscriber, private) calls
         self._targets = []
 
+        # Route plans of the streams being received, by slot (see routePlan)
+        self._plans = {}
+
         # Status information for the system, TS1 & TS2
-        # 1 & 2 are "timeslot"
-        # In TX_EMB_LC, 2-5 are burst B-E
-        self.STATUS = {
-            1: {
-                'RX_START':     time(),
-                'TX_START':     time(),
-                'RX_SEQ':       0,
-                'RX_RFS':       b'\x00',
-                'TX_RFS':       b'\x00',
-                'RX_PEER':      b'\x00',
-                'TX_PEER':      b'\x00',
-                'RX_STREAM_ID': b'\x00',
-                'TX_STREAM_ID': b'\x00',
-                'RX_TGID':      b'\x00\x00\x00',
-                'TX_TGID':      b'\x00\x00\x00',
-                'RX_TIME':      time(),
-                'TX_TIME':      time(),
-                'RX_TYPE':      HBPF_SLT_VTERM,
-                'TX_TYPE':      HBPF_SLT_VTERM,
-                'RX_LC':        b'\x00',
-                'TX_H_LC':      b'\x00',
-                'TX_T_LC':      b'\x00',
-                'TX_EMB_LC': {
-                    1: b'\x00',
-                    2: b'\x00',
-                    3: b'\x00',
-                    4: b'\x00',
-                    }
-                },
-            2: {
-                'RX_START':     time(),
-                'TX_START':     time(),
-                'RX_SEQ':       0,
-                'RX_RFS':       b'\x00',
-                'TX_RFS':       b'\x00',
-                'RX_PEER':      b'\x00',
-                'TX_PEER':      b'\x00',
-                'RX_STREAM_ID': b'\x00',
-                'TX_STREAM_ID': b'\x00',
-                'RX_TGID':      b'\x00\x00\x00',
-                'TX_TGID':      b'\x00\x00\x00',
-                'RX_TIME':      time(),
-                'TX_TIME':      time(),
-                'RX_TYPE':      HBPF_SLT_VTERM,
-                'TX_TYPE':      HBPF_SLT_VTERM,
-                'RX_LC':        b'\x00',
-                'TX_H_LC':      b'\x00',
-                'TX_T_LC':      b'\x00',
-                'TX_EMB_LC': {
-                    1: b'\x00',
-                    2: b'\x00',
-                    3: b'\x00',
-                    4: b'\x00',
-                    }
-                }
-            }
-
-
-    def group_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data):
+        # 1 & 2 are "timeslot" (see slotstate)
+        self.STATUS = slot_status()
+
+
+    def group_received(self, _frame):
         global UNIT_MAP
+        _data       = _frame.data
+        _peer_id    = _frame.peer_id
+        _rf_src     = _frame.rf_src
+        _dst_id     = _frame.dst_id
+        _seq        = _frame.seq
+        _slot       = _frame.slot
+        _frame_type = _frame.frame_type
+        _dtype_vseq = _frame.dtype_vseq
+        _stream_id  = _frame.stream_id
         pkt_time = time()
-        dmrpkt = _data[20:53]
-        _bits = _data[15]
+        dmrpkt = _frame.payload
+        _bits = _frame.bits
         
         # Make/update an entry in the UNIT_MAP for this subscriber
         UNIT_MAP[_rf_src] = (self.name, pkt_time)
 
         # Is this a new call stream?
-        if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
-            if (self.STATUS[_slot]['RX_TYPE'] != HBPF_SLT_VTERM) and (pkt_time < (self.STATUS[_slot]['RX_TIME'] + STREAM_TO)) and (_rf_src != self.STATUS[_slot]['RX_RFS']):
+        if (_stream_id != self.STATUS[_slot].RX_STREAM_ID):
+            if (self.STATUS[_slot].RX_TYPE != HBPF_SLT_VTERM) and (pkt_time < (self.STATUS[_slot].RX_TIME + STREAM_TO)) and (_rf_src != self.STATUS[_slot].RX_RFS):
                 logger.warning('(%s) Packet received with STREAM ID: %s <FROM> SUB: %s PEER: %s <TO> TGID %s, SLOT %s collided with existing call', self._system, int_id(_stream_id), int_id(_rf_src), int_id(_peer_id), int_id(_dst_id), _slot)
                 return
 
-            # This is a new call stream
-            self.STATUS[_slot]['RX_START'] = pkt_time
+            # This is a new call stream, as far as this slot is concerned -- even one we had a plan for
+            self._plans.pop(_slot, None)
+            shard.publish('UNIT', _rf_src, UNIT_MAP[_rf_src])
+            self.STATUS[_slot].RX_START = pkt_time
             logger.info('(%s) *GROUP CALL START* STREAM ID: %s SUB: %s (%s) PEER: %s (%s) TGID %s (%s), TS %s', \
                     self._system, int_id(_stream_id), get_alias(_rf_src, subscriber_ids), int_id(_rf_src), get_alias(_peer_id, peer_ids), int_id(_peer_id), get_alias(_dst_id, talkgroup_ids), int_id(_dst_id), _slot)
             if CONFIG['REPORTS']['REPORT']:
@@ -698,163 +916,173 @@ class routerHBP(HBSYSTEM):
             # If we can, use the LC from the voice header as to keep all options intact
             if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD:
                 decoded = decode.voice_head_term(dmrpkt)
-                self.STATUS[_slot]['RX_LC'] = decoded['LC']
+                self.STATUS[_slot].RX_LC = decoded['LC']
+                self.STATUS[_slot].RX_LC_HEAD = True
 
             # If we don't have a voice header then don't wait to decode it from the Embedded LC
             # just make a new one from the HBP header. This is good enough, and it saves lots of time
             else:
-                self.STATUS[_slot]['RX_LC'] = LC_OPT + _dst_id + _rf_src
-
-        for _bridge in BRIDGES:
-            for _system in BRIDGES[_bridge]:
-
-                if (_system['SYSTEM'] == self._system and _system['TGID'] == _dst_id and _system['TS'] == _slot and _system['ACTIVE'] == True):
-
-                    for _target in BRIDGES[_bridge]:
-                        if _target['SYSTEM'] != self._system:
-                            if _target['ACTIVE']:
-                                _target_status = systems[_target['SYSTEM']].STATUS
-                                _target_system = self._CONFIG['SYSTEMS'][_target['SYSTEM']]
-
-                                if _target_system['MODE'] == 'OPENBRIDGE':
-                                    # Is this a new call stream on the target?
-                                    if (_stream_id not in _target_status):
-                                        # This is a new call stream on the target
-                                        _target_status[_stream_id] = {
-                                            'START':     pkt_time,
-                                            'CONTENTION':False,
-                                            'RFS':       _rf_src,
-                                            'TYPE':     'GROUP',
-                                            'DST':      _dst_id,
-                                            'ACTIVE':   True,
-                                        }
-                                        # Generate LCs (full and EMB) for the TX stream
-                                        dst_lc = b''.join([self.STATUS[_slot]['RX_LC'][0:3], _target['TGID'], _rf_src])
-                                        _target_status[_stream_id]['H_LC'] = bptc.encode_header_lc(dst_lc)
-                                        _target_status[_stream_id]['T_LC'] = bptc.encode_terminator_lc(dst_lc)
-                                        _target_status[_stream_id]['EMB_LC'] = bptc.encode_emblc(dst_lc)
-
-                                        logger.info('(%s) Conference Bridge: %s, Call Bridged to OBP System: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
-                                        if CONFIG['REPORTS']['REPORT']:
-                                            systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,START,TX,{},{},{},{},{},{}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID'])).encode(encoding='utf-8', errors='ignore'))
-
-                                    # Record the time of this packet so we can later identify a stale stream
-                                    _target_status[_stream_id]['LAST'] = pkt_time
-                                    # Clear the TS bit -- all OpenBridge streams are effectively on TS1
-                                    _tmp_bits = _bits & ~(1 << 7)
-
-                                    # Assemble transmit HBP packet header
-                                    _tmp_data = b''.join([_data[:8], _target['TGID'], _data[11:15], _tmp_bits.to_bytes(1, 'big'), _data[16:20]])
-
-                                    # MUST TEST FOR NEW STREAM AND IF SO, RE-WRITE THE LC FOR THE TARGET
-                                    # MUST RE-WRITE DESTINATION TGID IF DIFFERENT
-                                    # if _dst_id != rule['DST_GROUP']:
-                                    dmrbits = bitarray(endian='big')
-                                    dmrbits.frombytes(dmrpkt)
-                                    # Create a voice header packet (FULL LC)
-                                    if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD:
-                                        dmrbits = _target_status[_stream_id]['H_LC'][0:98] + dmrbits[98:166] + _target_status[_stream_id]['H_LC'][98:197]
-                                    # Create a voice terminator packet (FULL LC)
-                                    elif _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VTERM:
-                                        dmrbits = _target_status[_stream_id]['T_LC'][0:98] + dmrbits[98:166] + _target_status[_stream_id]['T_LC'][98:197]
-                                        if CONFIG['REPORTS']['REPORT']:
-                                            call_duration = pkt_time - _target_status[_stream_id]['START']
-                                            _target_status[_stream_id]['ACTIVE'] = False
-                                            systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,END,TX,{},{},{},{},{},{},{:.2f}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID']), call_duration).encode(encoding='utf-8', errors='ignore'))
-                                    # Create a Burst B-E packet (Embedded LC)
-                                    elif _dtype_vseq in [1,2,3,4]:
-                                        dmrbits = dmrbits[0:116] + _target_status[_stream_id]['EMB_LC'][_dtype_vseq] + dmrbits[148:264]
-                                    dmrpkt = dmrbits.tobytes()
-                                    _tmp_data = b''.join([_tmp_data, dmrpkt])
-
-                                else:
-                                    # BEGIN STANDARD CONTENTION HANDLING
-                                    #
-                                    # The rules for each of the 4 "ifs" below are listed here for readability. The Frame To Send is:
-                                    #   From a different group than last RX from this HBSystem, but it has been less than Group Hangtime
-                                    #   From a different group than last TX to this HBSystem, but it has been less than Group Hangtime
-                                    #   From the same group as the last RX from this HBSystem, but from a different subscriber, and it has been less than stream timeout
-                                    #   From the same group as the last TX to this HBSystem, but from a different subscriber, and it has been less than stream timeout
-                                    # The "continue" at the end of each means the next iteration of the for loop that tests for matching rules
-                                    #
-                                    if ((_target['TGID'] != _target_status[_target['TS']]['RX_TGID']) and ((pkt_time - _target_status[_target['TS']]['RX_TIME']) < _target_system['GROUP_HANGTIME'])):
-                                        if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                                            logger.info('(%s) Call not routed to TGID %s, target active or in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['RX_TGID']))
-                                        continue
-                                    if ((_target['TGID'] != _target_status[_target['TS']]['TX_TGID']) and ((pkt_time - _target_status[_target['TS']]['TX_TIME']) < _target_system['GROUP_HANGTIME'])):
-                                        if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                                            logger.info('(%s) Call not routed to TGID%s, target in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['TX_TGID']))
-                                        continue
-                                    if (_target['TGID'] == _target_status[_target['TS']]['RX_TGID']) and ((pkt_time - _target_status[_target['TS']]['RX_TIME']) < STREAM_TO):
-                                        if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                                            logger.info('(%s) Call not routed to TGID%s, matching call already active on target: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['RX_TGID']))
-                                        continue
-                                    if (_target['TGID'] == _target_status[_target['TS']]['TX_TGID']) and (_rf_src != _target_status[_target['TS']]['TX_RFS']) and ((pkt_time - _target_status[_target['TS']]['TX_TIME']) < STREAM_TO):
-                                        if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                                            logger.info('(%s) Call not routed for subscriber %s, call route in progress on target: HBSystem: %s, TS: %s, TGID: %s, SUB: %s', self._system, int_id(_rf_src), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['TX_TGID']), int_id(_target_status[_target['TS']]['TX_RFS']))
-                                        continue
-
-                                    # Is this a new call stream?
-                                    if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
-                                        # Record the DST TGID and Stream ID
-                                        _target_status[_target['TS']]['TX_START'] = pkt_time
-                                        _target_status[_target['TS']]['TX_TGID'] = _target['TGID']
-                                        _target_status[_target['TS']]['TX_STREAM_ID'] = _stream_id
-                                        _target_status[_target['TS']]['TX_RFS'] = _rf_src
-                                        _target_status[_target['TS']]['TX_PEER'] = _peer_id
-                                        # Generate LCs (full and EMB) for the TX stream
-                                        dst_lc = self.STATUS[_slot]['RX_LC'][0:3] + _target['TGID'] + _rf_src
-                                        _target_status[_target['TS']]['TX_H_LC'] = bptc.encode_header_lc(dst_lc)
-                                        _target_status[_target['TS']]['TX_T_LC'] = bptc.encode_terminator_lc(dst_lc)
-                                        _target_status[_target['TS']]['TX_EMB_LC'] = bptc.encode_emblc(dst_lc)
-                                        logger.debug('(%s) Generating TX FULL and EMB LCs for HomeBrew destination: System: %s, TS: %s, TGID: %s', self._system, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
-                                        logger.info('(%s) Conference Bridge: %s, Call Bridged to HBP System: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
-                                        if CONFIG['REPORTS']['REPORT']:
-                                            systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,START,TX,{},{},{},{},{},{}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID'])).encode(encoding='utf-8', errors='ignore'))
-
-                                    # Set other values for the contention handler to test next time there is a frame to forward
-                                    _target_status[_target['TS']]['TX_TIME'] = pkt_time
-                                    _target_status[_target['TS']]['TX_TYPE'] = _dtype_vseq
-
-                                    # Handle any necessary re-writes for the destination
-                                    if _system['TS'] != _target['TS']:
-                                        _tmp_bits = _bits ^ 1 << 7
-                                    else:
-                                        _tmp_bits = _bits
-
-                                    # Assemble transmit HBP packet header
-                                    _tmp_data = b''.join([_data[:8], _target['TGID'], _data[11:15], _tmp_bits.to_bytes(1, 'big'), _data[16:20]])
-
-                                    dmrbits = bitarray(endian='big')
-                                    dmrbits.frombytes(dmrpkt)
-                                    # Create a voice header packet (FULL LC)
-                                    if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD:
-                                        dmrbits = _target_status[_target['TS']]['TX_H_LC'][0:98] + dmrbits[98:166] + _target_status[_target['TS']]['TX_H_LC'][98:197]
-                                    # Create a voice terminator packet (FULL LC)
-                                    elif _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VTERM:
-                                        dmrbits = _target_status[_target['TS']]['TX_T_LC'][0:98] + dmrbits[98:166] + _target_status[_target['TS']]['TX_T_LC'][98:197]
-                                        if CONFIG['REPORTS']['REPORT']:
-                                            call_duration = pkt_time - _target_status[_target['TS']]['TX_START']
-                                            systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,END,TX,{},{},{},{},{},{},{:.2f}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID']), call_duration).encode(encoding='utf-8', errors='ignore'))
-                                    # Create a Burst B-E packet (Embedded LC)
-                                    elif _dtype_vseq in [1,2,3,4]:
-                                        dmrbits = dmrbits[0:116] + _target_status[_target['TS']]['TX_EMB_LC'][_dtype_vseq] + dmrbits[148:264]
-                                    dmrpkt = dmrbits.tobytes()
-                                    _tmp_data = b''.join([_tmp_data, dmrpkt, _data[53:55]])
-
-                                # Transmit the packet to the destination system
-                                systems[_target['SYSTEM']].send_system(_tmp_data)
-                                #logger.debug('(%s) Packet routed by bridge: %s to system: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
+                self.STATUS[_slot].RX_LC = LC_OPT + _dst_id + _rf_src
+                self.STATUS[_slot].RX_LC_HEAD = False
+
+        # Follow the stream's route plan, making a new one for a new stream or new routes
+        _plan = self._plans.get(_slot)
+        if _plan is None or not _plan.matches(_data):
+            _plan = self._plans[_slot] = routePlan(_data, ROUTES.get((self._system, _slot, _dst_id), ()), self.STATUS[_slot].RX_LC if self.STATUS[_slot].RX_LC_HEAD else None)
+        _plan.seq = _seq
+        # Bursts with a full LC have it spliced whole, bursts B-E their embedded LC fragment
+        _splice = splice_full if _frame_type == HBPF_DATA_SYNC and _dtype_vseq in (HBPF_SLT_VHEAD, HBPF_SLT_VTERM) else splice_emb
+        _egress = {}
+        for _step in _plan.steps:
+            _bridge, _system, _target = _step.bridge, _step.source, _step.target
+            _target_status = _step.status
+            _target_system = _step.config
+
+            if _target_system['MODE'] == 'OPENBRIDGE':
+                # Is this a new call stream on the target?
+                if (_stream_id not in _target_status):
+                    # This is a new call stream on the target
+                    _target_status[_stream_id] = obpStream(pkt_time, _rf_src, 'GROUP', _dst_id)
+                    # Generate LCs (full and EMB) for the TX stream
+                    dst_lc = b''.join([self.STATUS[_slot].RX_LC[0:3], _target['TGID'], _rf_src])
+                    _target_status[_stream_id].H_LC, _target_status[_stream_id].T_LC, _target_status[_stream_id].EMB_LC = splice_lc(dst_lc)
+
+                    logger.info('(%s) Conference Bridge: %s, Call Bridged to OBP System: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
+                    if CONFIG['REPORTS']['REPORT']:
+                        systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,START,TX,{},{},{},{},{},{}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID'])).encode(encoding='utf-8', errors='ignore'))
+
+                # Record the time of this packet so we can later identify a stale stream
+                _target_status.seen(_stream_id, pkt_time)
+                stream_seen(('OBP', _target['SYSTEM'], _stream_id), pkt_time)
+                # MUST TEST FOR NEW STREAM AND IF SO, RE-WRITE THE LC FOR THE TARGET
+                # MUST RE-WRITE DESTINATION TGID IF DIFFERENT
+                # if _dst_id != rule['DST_GROUP']:
+                # Passthrough targets get the payload as it came in, the others their own LC
+                _lc = None
+                # Create a voice header packet (FULL LC)
+                if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD:
+                    if not _step.passthrough:
+                        _lc = _target_status[_stream_id].H_LC
+                # Create a voice terminator packet (FULL LC)
+                elif _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VTERM:
+                    if not _step.passthrough:
+                        _lc = _target_status[_stream_id].T_LC
+                    if CONFIG['REPORTS']['REPORT']:
+                        call_duration = pkt_time - _target_status[_stream_id].START
+                        _target_status[_stream_id].ACTIVE = False
+                        systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,END,TX,{},{},{},{},{},{},{:.2f}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID']), call_duration).encode(encoding='utf-8', errors='ignore'))
+                # Create a Burst B-E packet (Embedded LC)
+                elif _dtype_vseq in [1,2,3,4]:
+                    if not _step.passthrough:
+                        _lc = _target_status[_stream_id].EMB_LC[_dtype_vseq]
+
+                # Assemble transmit HBP packet header -- the TS bit is cleared, all OpenBridge streams are effectively on TS1
+                # Targets given the same header, LC and tail share one packet, built for the first of them
+                _tmp_data = _egress.get((_step.egress, _lc))
+                if _tmp_data is None:
+                    _tmp_data = _egress[(_step.egress, _lc)] = b''.join([_step.header(_seq, _bits), dmrpkt if _lc is None else _splice(dmrpkt, _lc)])
+
+            else:
+                # After a burst has gone through to this target, the rest skip the checks for
+                # as long as the slot's RX state is unchanged and the stream still holds its TX.
+                # After one has been kept off it, the rest are until the check that did it could
+                # pass, or the slot starts receiving or sending another TGID or subscriber.
+                _tslot = _target_status[_target['TS']]
+                if not (_step.version == _tslot.VERSION and _tslot.TX_STREAM_ID == _stream_id and _tslot.TX_TGID == _target['TGID'] and _tslot.TX_RFS == _rf_src):
+                    _blocked = _step.blocked
+                    if _blocked is not None and pkt_time < _blocked[0] and _blocked[1] == _tslot.RX_TGID and _blocked[2] == _tslot.TX_TGID and _blocked[3] == _tslot.TX_RFS:
+                        continue
+
+                    # BEGIN STANDARD CONTENTION HANDLING
+                    #
+                    # The rules for each of the 4 "ifs" below are listed here for readability. The Frame To Send is:
+                    #   From a different group than last RX from this HBSystem, but it has been less than Group Hangtime
+                    #   From a different group than last TX to this HBSystem, but it has been less than Group Hangtime
+                    #   From the same group as the last RX from this HBSystem, but from a different subscriber, and it has been less than stream timeout
+                    #   From the same group as the last TX to this HBSystem, but from a different subscriber, and it has been less than stream timeout
+                    # The "continue" at the end of each means the next iteration of the for loop that tests for matching rules
+                    #
+                    if ((_target['TGID'] != _target_status[_target['TS']].RX_TGID) and ((pkt_time - _target_status[_target['TS']].RX_TIME) < _target_system['GROUP_HANGTIME'])):
+                        if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                            logger.info('(%s) Call not routed to TGID %s, target active or in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']].RX_TGID))
+                        _step.block(_tslot, _tslot.RX_TIME + _target_system['GROUP_HANGTIME'])
+                        continue
+                    if ((_target['TGID'] != _target_status[_target['TS']].TX_TGID) and ((pkt_time - _target_status[_target['TS']].TX_TIME) < _target_system['GROUP_HANGTIME'])):
+                        if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                            logger.info('(%s) Call not routed to TGID%s, target in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']].TX_TGID))
+                        _step.block(_tslot, _tslot.TX_TIME + _target_system['GROUP_HANGTIME'])
+                        continue
+                    if (_target['TGID'] == _target_status[_target['TS']].RX_TGID) and ((pkt_time - _target_status[_target['TS']].RX_TIME) < STREAM_TO):
+                        if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                            logger.info('(%s) Call not routed to TGID%s, matching call already active on target: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']].RX_TGID))
+                        _step.block(_tslot, _tslot.RX_TIME + STREAM_TO)
+                        continue
+                    if (_target['TGID'] == _target_status[_target['TS']].TX_TGID) and (_rf_src != _target_status[_target['TS']].TX_RFS) and ((pkt_time - _target_status[_target['TS']].TX_TIME) < STREAM_TO):
+                        if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                            logger.info('(%s) Call not routed for subscriber %s, call route in progress on target: HBSystem: %s, TS: %s, TGID: %s, SUB: %s', self._system, int_id(_rf_src), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']].TX_TGID), int_id(_target_status[_target['TS']].TX_RFS))
+                        _step.block(_tslot, _tslot.TX_TIME + STREAM_TO)
+                        continue
+
+                    # Is this a new call stream?
+                    if (_stream_id != self.STATUS[_slot].RX_STREAM_ID):
+                        # Record the DST TGID and Stream ID
+                        _target_status[_target['TS']].TX_START = pkt_time
+                        _target_status[_target['TS']].TX_TGID = _target['TGID']
+                        _target_status[_target['TS']].TX_STREAM_ID = _stream_id
+                        _target_status[_target['TS']].TX_RFS = _rf_src
+                        _target_status[_target['TS']].TX_PEER = _peer_id
+                        # Generate LCs (full and EMB) for the TX stream
+                        dst_lc = self.STATUS[_slot].RX_LC[0:3] + _target['TGID'] + _rf_src
+                        _target_status[_target['TS']].TX_H_LC, _target_status[_target['TS']].TX_T_LC, _target_status[_target['TS']].TX_EMB_LC = splice_lc(dst_lc)
+                        logger.debug('(%s) Generating TX FULL and EMB LCs for HomeBrew destination: System: %s, TS: %s, TGID: %s', self._system, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
+                        logger.info('(%s) Conference Bridge: %s, Call Bridged to HBP System: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
+                        if CONFIG['REPORTS']['REPORT']:
+                            systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,START,TX,{},{},{},{},{},{}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID'])).encode(encoding='utf-8', errors='ignore'))
+
+                    _step.open(_tslot)
+
+                # Set other values for the contention handler to test next time there is a frame to forward
+                _target_status[_target['TS']].TX_TIME = pkt_time
+                stream_seen(('TX', _target['SYSTEM'], _target['TS']), pkt_time)
+                _target_status[_target['TS']].TX_TYPE = _dtype_vseq
+
+                # Passthrough targets get the payload as it came in, the others their own LC
+                _lc = None
+                # Create a voice header packet (FULL LC)
+                if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD:
+                    if not _step.passthrough:
+                        _lc = _step.h_lc
+                # Create a voice terminator packet (FULL LC)
+                elif _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VTERM:
+                    if not _step.passthrough:
+                        _lc = _step.t_lc
+                    if CONFIG['REPORTS']['REPORT']:
+                        call_duration = pkt_time - _target_status[_target['TS']].TX_START
+                        systems[_target['SYSTEM']]._report.send_bridgeEvent('GROUP VOICE,END,TX,{},{},{},{},{},{},{:.2f}'.format(_target['SYSTEM'], int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _target['TS'], int_id(_target['TGID']), call_duration).encode(encoding='utf-8', errors='ignore'))
+                # Create a Burst B-E packet (Embedded LC)
+                elif _dtype_vseq in [1,2,3,4]:
+                    if not _step.passthrough:
+                        _lc = _step.emb_lc[_dtype_vseq]
+
+                # Assemble transmit HBP packet header -- the TS bit is re-written if the target is on the other slot
+                # Targets given the same header, LC and tail share one packet, built for the first of them
+                _tmp_data = _egress.get((_step.egress, _lc))
+                if _tmp_data is None:
+                    _tmp_data = _egress[(_step.egress, _lc)] = b''.join([_step.header(_seq, _bits), dmrpkt if _lc is None else _splice(dmrpkt, _lc), _data[53:55]])
+
+            # Transmit the packet to the destination system
+            systems[_target['SYSTEM']].send_system(_tmp_data)
+            #logger.debug('(%s) Packet routed by bridge: %s to system: %s TS: %s, TGID: %s', self._system, _bridge, _target['SYSTEM'], _target['TS'], int_id(_target['TGID']))
                                 
-                                if _target_system['MODE'] == 'OPENBRIDGE':
-                                    if (_frame_type == HBPF_DATA_SYNC) and (_dtype_vseq == HBPF_SLT_VTERM) and (self.STATUS[_slot]['RX_TYPE'] != HBPF_SLT_VTERM):
-                                        if (_stream_id in _target_status):
-                                            _target_status.pop(_stream_id)
+            if _target_system['MODE'] == 'OPENBRIDGE':
+                if (_frame_type == HBPF_DATA_SYNC) and (_dtype_vseq == HBPF_SLT_VTERM) and (self.STATUS[_slot].RX_TYPE != HBPF_SLT_VTERM):
+                    if (_stream_id in _target_status):
+                        _target_status.pop(_stream_id)
 
 
         # Final actions - Is this a voice terminator?
-        if (_frame_type == HBPF_DATA_SYNC) and (_dtype_vseq == HBPF_SLT_VTERM) and (self.STATUS[_slot]['RX_TYPE'] != HBPF_SLT_VTERM):
-            call_duration = pkt_time - self.STATUS[_slot]['RX_START']
+        if (_frame_type == HBPF_DATA_SYNC) and (_dtype_vseq == HBPF_SLT_VTERM) and (self.STATUS[_slot].RX_TYPE != HBPF_SLT_VTERM):
+            call_duration = pkt_time - self.STATUS[_slot].RX_START
             logger.info('(%s) *GROUP CALL END*   STREAM ID: %s SUB: %s (%s) PEER: %s (%s) TGID %s (%s), TS %s, Duration: %.2f', \
                     self._system, int_id(_stream_id), get_alias(_rf_src, subscriber_ids), int_id(_rf_src), get_alias(_peer_id, peer_ids), int_id(_peer_id), get_alias(_dst_id, talkgroup_ids), int_id(_dst_id), _slot, call_duration)
             if CONFIG['REPORTS']['REPORT']:
@@ -864,93 +1092,101 @@ class routerHBP(HBSYSTEM):
             # Begin in-band signalling for call end. This has nothign to do with routing traffic directly.
             #
 
-            # Iterate the rules dictionary
-
-            for _bridge in BRIDGES:
-                for _system in BRIDGES[_bridge]:
-                    if _system['SYSTEM'] == self._system:
-
-                        # TGID matches a rule source, reset its timer
-                        if _slot == _system['TS'] and _dst_id == _system['TGID'] and ((_system['TO_TYPE'] == 'ON' and (_system['ACTIVE'] == True)) or (_system['TO_TYPE'] == 'OFF' and _system['ACTIVE'] == False)):
+            # Only the entries this system, slot and TGID trigger
+            for _bridge, _index, _system, _on, _off, _reset in TRIGGERS.get((self._system, _slot, _dst_id), ()):
+                _was = (_system['ACTIVE'], _system['TIMER'])
+
+                # TGID matches a rule source, reset its timer
+                if _dst_id == _system['TGID'] and ((_system['TO_TYPE'] == 'ON' and (_system['ACTIVE'] == True)) or (_system['TO_TYPE'] == 'OFF' and _system['ACTIVE'] == False)):
+                    _system['TIMER'] = pkt_time + _system['TIMEOUT']
+                    logger.info('(%s) Transmission match for Bridge: %s. Reset timeout to %s', self._system, _bridge, _system['TIMER'])
+
+                # TGID matches an ACTIVATION trigger
+                if _on or _reset:
+                    # Set the matching rule as ACTIVE
+                    if _on:
+                        if _system['ACTIVE'] == False:
+                            _system['ACTIVE'] = True
+                            update_routes(_bridge)
                             _system['TIMER'] = pkt_time + _system['TIMEOUT']
-                            logger.info('(%s) Transmission match for Bridge: %s. Reset timeout to %s', self._system, _bridge, _system['TIMER'])
-
-                        # TGID matches an ACTIVATION trigger
-                        if (_dst_id in _system['ON'] or _dst_id in _system['RESET']) and _slot == _system['TS']:
-                            # Set the matching rule as ACTIVE
-                            if _dst_id in _system['ON']:
-                                if _system['ACTIVE'] == False:
-                                    _system['ACTIVE'] = True
-                                    _system['TIMER'] = pkt_time + _system['TIMEOUT']
-                                    logger.info('(%s) Bridge: %s, connection changed to state: %s', self._system, _bridge, _system['ACTIVE'])
-                                    # Cancel the timer if we've enabled an "OFF" type timeout
-                                    if _system['TO_TYPE'] == 'OFF':
-                                        _system['TIMER'] = pkt_time
-                                        logger.info('(%s) Bridge: %s set to "OFF" with an on timer rule: timeout timer cancelled', self._system, _bridge)
-                            # Reset the timer for the rule
-                            if _system['ACTIVE'] == True and _system['TO_TYPE'] == 'ON':
-                                _system['TIMER'] = pkt_time + _system['TIMEOUT']
-                                logger.info('(%s) Bridge: %s, timeout timer reset to: %s', self._system, _bridge, _system['TIMER'] - pkt_time)
-
-                        # TGID matches an DE-ACTIVATION trigger
-                        if (_dst_id in _system['OFF']  or _dst_id in _system['RESET']) and _slot == _system['TS']:
-                            # Set the matching rule as ACTIVE
-                            if _dst_id in _system['OFF']:
-                                if _system['ACTIVE'] == True:
-                                    _system['ACTIVE'] = False
-                                    logger.info('(%s) Bridge: %s, connection changed to state: %s', self._system, _bridge, _system['ACTIVE'])
-                                    # Cancel the timer if we've enabled an "ON" type timeout
-                                    if _system['TO_TYPE'] == 'ON':
-                                        _system['TIMER'] = pkt_time
-                                        logger.info('(%s) Bridge: %s set to ON with and "OFF" timer rule: timeout timer cancelled', self._system, _bridge)
-                            # Reset the timer for the rule
-                            if _system['ACTIVE'] == False and _system['TO_TYPE'] == 'OFF':
-                                _system['TIMER'] = pkt_time + _system['TIMEOUT']
-                                logger.info('(%s) Bridge: %s, timeout timer reset to: %s', self._system, _bridge, _system['TIMER'] - pkt_time)
+                            logger.info('(%s) Bridge: %s, connection changed to state: %s', self._system, _bridge, _system['ACTIVE'])
+                            # Cancel the timer if we've enabled an "OFF" type timeout
+                            if _system['TO_TYPE'] == 'OFF':
+                                _system['TIMER'] = pkt_time
+                                logger.info('(%s) Bridge: %s set to "OFF" with an on timer rule: timeout timer cancelled', self._system, _bridge)
+                    # Reset the timer for the rule
+                    if _system['ACTIVE'] == True and _system['TO_TYPE'] == 'ON':
+                        _system['TIMER'] = pkt_time + _system['TIMEOUT']
+                        logger.info('(%s) Bridge: %s, timeout timer reset to: %s', self._system, _bridge, _system['TIMER'] - pkt_time)
+
+                # TGID matches an DE-ACTIVATION trigger
+                if _off or _reset:
+                    # Set the matching rule as ACTIVE
+                    if _off:
+                        if _system['ACTIVE'] == True:
+                            _system['ACTIVE'] = False
+                            update_routes(_bridge)
+                            logger.info('(%s) Bridge: %s, connection changed to state: %s', self._system, _bridge, _system['ACTIVE'])
                             # Cancel the timer if we've enabled an "ON" type timeout
-                            if _system['ACTIVE'] == True and _system['TO_TYPE'] == 'ON' and _dst_group in _system['OFF']:
+                            if _system['TO_TYPE'] == 'ON':
                                 _system['TIMER'] = pkt_time
                                 logger.info('(%s) Bridge: %s set to ON with and "OFF" timer rule: timeout timer cancelled', self._system, _bridge)
+                    # Reset the timer for the rule
+                    if _system['ACTIVE'] == False and _system['TO_TYPE'] == 'OFF':
+                        _system['TIMER'] = pkt_time + _system['TIMEOUT']
+                        logger.info('(%s) Bridge: %s, timeout timer reset to: %s', self._system, _bridge, _system['TIMER'] - pkt_time)
+                    # Cancel the timer if we've enabled an "ON" type timeout
+                    if _system['ACTIVE'] == True and _system['TO_TYPE'] == 'ON' and _off:
+                        _system['TIMER'] = pkt_time
+                        logger.info('(%s) Bridge: %s set to ON with and "OFF" timer rule: timeout timer cancelled', self._system, _bridge)
+
+                # Start, move or stop the entry's timer if any of that changed it
+                if (_system['ACTIVE'], _system['TIMER']) != _was:
+                    arm_timer(_bridge, _index)
+
+            # Let the other workers know where this system's bridges stand now
+            if shard.WORKER is not None:
+                shard.publish('BRIDGES', bridge_state(self._system))
 
         #
         # END IN-BAND SIGNALLING
         #
         # Mark status variables for use later
-        self.STATUS[_slot]['RX_PEER']      = _peer_id
-        self.STATUS[_slot]['RX_SEQ']       = _seq
-        self.STATUS[_slot]['RX_RFS']       = _rf_src
-        self.STATUS[_slot]['RX_TYPE']      = _dtype_vseq
-        self.STATUS[_slot]['RX_TGID']      = _dst_id
-        self.STATUS[_slot]['RX_TIME']      = pkt_time
-        self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
-
-
-    def unit_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data):
+        self.STATUS[_slot].RX_PEER      = _peer_id
+        self.STATUS[_slot].RX_SEQ       = _seq
+        self.STATUS[_slot].RX_RFS       = _rf_src
+        self.STATUS[_slot].RX_TYPE      = _dtype_vseq
+        self.STATUS[_slot].RX_TGID      = _dst_id
+        self.STATUS[_slot].RX_TIME      = pkt_time
+        stream_seen(('RX', self._system, _slot), pkt_time)
+        self.STATUS[_slot].RX_STREAM_ID = _stream_id
+        self.STATUS[_slot].VERSION     += 1
+
+
+    def unit_received(self, _frame):
         global UNIT_MAP
+        _data       = _frame.data
+        _peer_id    = _frame.peer_id
+        _rf_src     = _frame.rf_src
+        _dst_id     = _frame.dst_id
+        _seq        = _frame.seq
+        _slot       = _frame.slot
+        _frame_type = _frame.frame_type
+        _dtype_vseq = _frame.dtype_vseq
+        _stream_id  = _frame.stream_id
         pkt_time = time()
-        dmrpkt = _data[20:53]
-        _bits = _data[15]
-
-        # Check if subscriber is in STATIC_UNIT
-        for i in STATIC_UNIT:
-            # Subscriber is static. Add 20 years of time.
-            if i[0] == int_id(_rf_src):
-                map_time = pkt_time + time_20
-                logger.debug('Static Unit, update time.')
-            # Proceed as normal
-            else:
-                map_time = pkt_time
- 
+        dmrpkt = _frame.payload
+        _bits = _frame.bits
 
         # Make/update this unit in the UNIT_MAP cache
-        UNIT_MAP[_rf_src] = (self.name, map_time)
+        UNIT_MAP[_rf_src] = (self.name, pkt_time)
         
         
         # Is this a new call stream?
-        if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
+        if (_stream_id != self.STATUS[_slot].RX_STREAM_ID):
             
             # Collision in progress, bail out!
-            if (self.STATUS[_slot]['RX_TYPE'] != HBPF_SLT_VTERM) and (pkt_time < (self.STATUS[_slot]['RX_TIME'] + STREAM_TO)) and (_rf_src != self.STATUS[_slot]['RX_RFS']):
+            if (self.STATUS[_slot].RX_TYPE != HBPF_SLT_VTERM) and (pkt_time < (self.STATUS[_slot].RX_TIME + STREAM_TO)) and (_rf_src != self.STATUS[_slot].RX_RFS):
                 logger.warning('(%s) Packet received with STREAM ID: %s <FROM> SUB: %s PEER: %s <TO> UNIT %s, SLOT %s collided with existing call', self._system, int_id(_stream_id), int_id(_rf_src), int_id(_peer_id), int_id(_dst_id), _slot)
                 return
                 
@@ -966,7 +1202,8 @@ class routerHBP(HBSYSTEM):
                 self._targets.remove(self._system)
             
             # This is a new call stream, so log & report
-            self.STATUS[_slot]['RX_START'] = pkt_time
+            shard.publish('UNIT', _rf_src, UNIT_MAP[_rf_src])
+            self.STATUS[_slot].RX_START = pkt_time
             logger.info('(%s) *UNIT CALL START* STREAM ID: %s SUB: %s (%s) PEER: %s (%s) UNIT: %s (%s), TS: %s, FORWARD: %s', \
                     self._system, int_id(_stream_id), get_alias(_rf_src, subscriber_ids), int_id(_rf_src), get_alias(_peer_id, peer_ids), int_id(_peer_id), get_alias(_dst_id, talkgroup_ids), int_id(_dst_id), _slot, self._targets)
             if CONFIG['REPORTS']['REPORT']:
@@ -980,21 +1217,15 @@ class routerHBP(HBSYSTEM):
             if self._CONFIG['SYSTEMS'][_target]['MODE'] == 'OPENBRIDGE':
                 if (_stream_id not in _target_status):
                     # This is a new call stream on the target
-                    _target_status[_stream_id] = {
-                        'START':     pkt_time,
-                        'CONTENTION':False,
-                        'RFS':       _rf_src,
-                        'TYPE':      'UNIT',
-                        'DST':      _dst_id,
-                        'ACTIVE':   True
-                    }
+                    _target_status[_stream_id] = obpStream(pkt_time, _rf_src, 'UNIT', _dst_id)
 
                     logger.info('(%s) Unit call bridged to OBP System: %s TS: %s, UNIT: %s', self._system, _target, _slot if _target_system['BOTH_SLOTS'] else 1, int_id(_dst_id))
                     if CONFIG['REPORTS']['REPORT']:
                         systems[_target]._report.send_bridgeEvent('UNIT VOICE,START,TX,{},{},{},{},{},{}'.format(_target, int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _slot, int_id(_dst_id)).encode(encoding='utf-8', errors='ignore'))
 
                 # Record the time of this packet so we can later identify a stale stream
-                _target_status[_stream_id]['LAST'] = pkt_time
+                _target_status.seen(_stream_id, pkt_time)
+                stream_seen(('OBP', _target, _stream_id), pkt_time)
                 # Clear the TS bit and follow propper OBP definition, unless "BOTH_SLOTS" is set. This only works for unit calls.
                 if _target_system['BOTH_SLOTS']:
                     _tmp_bits = _bits
@@ -1006,7 +1237,7 @@ class routerHBP(HBSYSTEM):
                 _data = b''.join([_tmp_data, dmrpkt])
                 
                 if (_frame_type == HBPF_DATA_SYNC) and (_dtype_vseq == HBPF_SLT_VTERM):
-                    _target_status[_stream_id]['ACTIVE'] = False
+                    _target_status[_stream_id].ACTIVE = False
 
             else:
                 # BEGIN STANDARD CONTENTION HANDLING
@@ -1019,75 +1250,79 @@ class routerHBP(HBSYSTEM):
                 # The "continue" at the end of each means the next iteration of the for loop that tests for matching rules
                 #
                 '''
-                if ((_dst_id != _target_status[_slot]['RX_TGID']) and ((pkt_time - _target_status[_slot]['RX_TIME']) < _target_system['GROUP_HANGTIME'])):
-                    if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                        logger.info('(%s) Call not routed to destination %s, target active or in group hangtime: HBSystem: %s, TS: %s, DEST: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot]['RX_TGID']))
+                if ((_dst_id != _target_status[_slot].RX_TGID) and ((pkt_time - _target_status[_slot].RX_TIME) < _target_system['GROUP_HANGTIME'])):
+                    if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                        logger.info('(%s) Call not routed to destination %s, target active or in group hangtime: HBSystem: %s, TS: %s, DEST: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot].RX_TGID))
                     continue
-                if ((_dst_id != _target_status[_slot]['TX_TGID']) and ((pkt_time - _target_status[_slot]['TX_TIME']) < _target_system['GROUP_HANGTIME'])):
-                    if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                        logger.info('(%s) Call not routed to destination %s, target in group hangtime: HBSystem: %s, TS: %s, DEST: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot]['TX_TGID']))
+                if ((_dst_id != _target_status[_slot].TX_TGID) and ((pkt_time - _target_status[_slot].TX_TIME) < _target_system['GROUP_HANGTIME'])):
+                    if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                        logger.info('(%s) Call not routed to destination %s, target in group hangtime: HBSystem: %s, TS: %s, DEST: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot].TX_TGID))
                     continue
                 '''
-                if (_dst_id == _target_status[_slot]['RX_TGID']) and ((pkt_time - _target_status[_slot]['RX_TIME']) < STREAM_TO):
-                    if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                        logger.info('(%s) Call not routed to destination %s, matching call already active on target: HBSystem: %s, TS: %s, DEST: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot]['RX_TGID']))
+                if (_dst_id == _target_status[_slot].RX_TGID) and ((pkt_time - _target_status[_slot].RX_TIME) < STREAM_TO):
+                    if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                        logger.info('(%s) Call not routed to destination %s, matching call already active on target: HBSystem: %s, TS: %s, DEST: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot].RX_TGID))
                     continue
-                if (_dst_id == _target_status[_slot]['TX_TGID']) and (_rf_src != _target_status[_slot]['TX_RFS']) and ((pkt_time - _target_status[_slot]['TX_TIME']) < STREAM_TO):
-                    if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                        logger.info('(%s) Call not routed for subscriber %s, call route in progress on target: HBSystem: %s, TS: %s, DEST: %s, SUB: %s', self._system, int_id(_rf_src), _target, _slot, int_id(_target_status[_slot]['TX_TGID']), int_id(_target_status[_slot]['TX_RFS']))
+                if (_dst_id == _target_status[_slot].TX_TGID) and (_rf_src != _target_status[_slot].TX_RFS) and ((pkt_time - _target_status[_slot].TX_TIME) < STREAM_TO):
+                    if _frame_type == HBPF_DATA_SYNC and _dtype_vseq == HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                        logger.info('(%s) Call not routed for subscriber %s, call route in progress on target: HBSystem: %s, TS: %s, DEST: %s, SUB: %s', self._system, int_id(_rf_src), _target, _slot, int_id(_target_status[_slot].TX_TGID), int_id(_target_status[_slot].TX_RFS))
                     continue
 
                 # Record target information if this is a new call stream?
-                if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
+                if (_stream_id != self.STATUS[_slot].RX_STREAM_ID):
                     # Record the DST TGID and Stream ID
-                    _target_status[_slot]['TX_START'] = pkt_time
-                    _target_status[_slot]['TX_TGID'] = _dst_id
-                    _target_status[_slot]['TX_STREAM_ID'] = _stream_id
-                    _target_status[_slot]['TX_RFS'] = _rf_src
-                    _target_status[_slot]['TX_PEER'] = _peer_id
+                    _target_status[_slot].TX_START = pkt_time
+                    _target_status[_slot].TX_TGID = _dst_id
+                    _target_status[_slot].TX_STREAM_ID = _stream_id
+                    _target_status[_slot].TX_RFS = _rf_src
+                    _target_status[_slot].TX_PEER = _peer_id
                     
                     logger.info('(%s) Unit call bridged to HBP System: %s TS: %s, UNIT: %s', self._system, _target, _slot, int_id(_dst_id))
                     if CONFIG['REPORTS']['REPORT']:
                        systems[_target]._report.send_bridgeEvent('UNIT VOICE,START,TX,{},{},{},{},{},{}'.format(_target, int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _slot, int_id(_dst_id)).encode(encoding='utf-8', errors='ignore'))
 
                 # Set other values for the contention handler to test next time there is a frame to forward
-                _target_status[_slot]['TX_TIME'] = pkt_time
-                _target_status[_slot]['TX_TYPE'] = _dtype_vseq
+                _target_status[_slot].TX_TIME = pkt_time
+                stream_seen(('TX', _target, _slot), pkt_time)
+                _target_status[_slot].TX_TYPE = _dtype_vseq
 
             #send the call:
             systems[_target].send_system(_data)
                         
         
         # Final actions - Is this a voice terminator?
-        if (_frame_type == HBPF_DATA_SYNC) and (_dtype_vseq == HBPF_SLT_VTERM) and (self.STATUS[_slot]['RX_TYPE'] != HBPF_SLT_VTERM):
+        if (_frame_type == HBPF_DATA_SYNC) and (_dtype_vseq == HBPF_SLT_VTERM) and (self.STATUS[_slot].RX_TYPE != HBPF_SLT_VTERM):
             self._targets = []
-            call_duration = pkt_time - self.STATUS[_slot]['RX_START']
+            call_duration = pkt_time - self.STATUS[_slot].RX_START
             logger.info('(%s) *UNIT CALL END*   STREAM ID: %s SUB: %s (%s) PEER: %s (%s) UNIT %s (%s), TS %s, Duration: %.2f', \
                     self._system, int_id(_stream_id), get_alias(_rf_src, subscriber_ids), int_id(_rf_src), get_alias(_peer_id, peer_ids), int_id(_peer_id), get_alias(_dst_id, talkgroup_ids), int_id(_dst_id), _slot, call_duration)
             if CONFIG['REPORTS']['REPORT']:
                self._report.send_bridgeEvent('UNIT VOICE,END,RX,{},{},{},{},{},{},{:.2f}'.format(self._system, int_id(_stream_id), int_id(_peer_id), int_id(_rf_src), _slot, int_id(_dst_id), call_duration).encode(encoding='utf-8', errors='ignore'))
 
         # Mark status variables for use later
-        self.STATUS[_slot]['RX_PEER']      = _peer_id
-        self.STATUS[_slot]['RX_SEQ']       = _seq
-        self.STATUS[_slot]['RX_RFS']       = _rf_src
-        self.STATUS[_slot]['RX_TYPE']      = _dtype_vseq
-        self.STATUS[_slot]['RX_TGID']      = _dst_id
-        self.STATUS[_slot]['RX_TIME']      = pkt_time
-        self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
-
-
-    def dmrd_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data):
+        self.STATUS[_slot].RX_PEER      = _peer_id
+        self.STATUS[_slot].RX_SEQ       = _seq
+        self.STATUS[_slot].RX_RFS       = _rf_src
+        self.STATUS[_slot].RX_TYPE      = _dtype_vseq
+        self.STATUS[_slot].RX_TGID      = _dst_id
+        self.STATUS[_slot].RX_TIME      = pkt_time
+        stream_seen(('RX', self._system, _slot), pkt_time)
+        self.STATUS[_slot].RX_STREAM_ID = _stream_id
+        self.STATUS[_slot].VERSION     += 1
+
+
+    def dmrd_frame_received(self, _frame):
+        _call_type = _frame.call_type
         if _call_type == 'group':
-            self.group_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data)
+            self.group_received(_frame)
         elif _call_type == 'unit':
             if self._system not in UNIT:
                 logger.error('(%s) *UNIT CALL NOT FORWARDED* UNIT calling is disabled for this system (INGRESS)', self._system)
             else:
-                self.unit_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data)
+                self.unit_received(_frame)
         elif _call_type == 'vcsbk':
             # Route CSBK packets to destination TG. Necessary for group data to work with GPS/Data decoder.
-            self.group_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data)
+            self.group_received(_frame)
             logger.debug('CSBK recieved, but HBlink does not process them currently. Packets routed to talkgroup.')
         else:
             logger.error('Unknown call type recieved -- not processed')
@@ -1101,6 +1336,10 @@ class bridgeReportFactory(reportFactory):
         serialized = pickle.dumps(BRIDGES, protocol=2) #.decode("utf-8", errors='ignore')
         self.send_clients(REPORT_OPCODES['BRIDGE_SND']+serialized)
 
+    def send_lc_stats(self):
+        serialized = pickle.dumps(lc_stats(), protocol=2)
+        self.send_clients(REPORT_OPCODES['LC_STATS']+serialized)
+
     def send_bridgeEvent(self, _data):
         if isinstance(_data, str):
             _data = _data.decode('utf-8', error='ignore')
@@ -1149,7 +1388,9 @@ if __name__ == '__main__':
     # Set up the signal handler
     def sig_handler(_signal, _frame):
         logger.info('(GLOBAL) SHUTDOWN: CONFBRIDGE IS TERMINATING WITH SIGNAL %s', str(_signal))
-        hblink_handler(_signal, _frame)
+        # In process-per-system mode the system processes de-register their own systems
+        if sysbus.ROLE != 'ROUTER':
+            hblink_handler(_signal, _frame)
         logger.info('(GLOBAL) SHUTDOWN: ALL SYSTEM HANDLERS EXECUTED - STOPPING REACTOR')
         reactor.stop()
 
@@ -1171,12 +1412,41 @@ if __name__ == '__main__':
 
     # Build the routing rules file
     BRIDGES = make_bridges(rules_module.BRIDGES)
+    make_routes()
+    make_triggers()
     
     # Get rule parameter for private calls
     UNIT = rules_module.UNIT
 
-    # INITIALIZE THE REPORTING LOOP
-    if CONFIG['REPORTS']['REPORT']:
+    # Pick up where units were last heard before the last shut down
+    if CONFIG['GLOBAL']['UNIT_MAP_FILE']:
+        try:
+            _loaded = UNIT_MAP.load(CONFIG['GLOBAL']['PATH'] + CONFIG['GLOBAL']['UNIT_MAP_FILE'], CONFIG['SYSTEMS'], time())
+            logger.info('(ROUTER) %s unit(s) loaded from %s', _loaded, CONFIG['GLOBAL']['UNIT_MAP_FILE'])
+        except (OSError, ValueError) as _error:
+            logger.warning('(ROUTER) Could not load UNIT_MAP from %s, starting without it: %s', CONFIG['GLOBAL']['UNIT_MAP_FILE'], _error)
+
+    # Sharding and process-per-system mode each split the systems up their own way
+    if CONFIG['GLOBAL']['WORKERS'] > 1 and CONFIG['GLOBAL']['SYSTEM_PROCESSES'] > 0:
+        sys.exit('(GLOBAL) TERMINATING: WORKERS and SYSTEM_PROCESSES can not be used together')
+
+    # Start the other workers, if any, before anything listens
+    if CONFIG['GLOBAL']['WORKERS'] > 1:
+        shard.start_workers(CONFIG['GLOBAL']['WORKERS'])
+
+    # Process-per-system mode (see sysbus.py): a system process runs its systems and
+    # nothing else, this one carries on as the router
+    if CONFIG['GLOBAL']['SYSTEM_PROCESSES'] > 0:
+        sysbus.start_processes(CONFIG, CONFIG['GLOBAL']['SYSTEM_PROCESSES'])
+        if sysbus.ROLE != 'ROUTER':
+            sysbus.start_systems(CONFIG)
+            reactor.run()
+            sys.exit(0)
+
+    # INITIALIZE THE REPORTING LOOP -- when sharded, worker 0 reports for all of them
+    if CONFIG['REPORTS']['REPORT'] and shard.WORKER:
+        report_server = shard.relayReport()
+    elif CONFIG['REPORTS']['REPORT']:
         report_server = config_reports(CONFIG, bridgeReportFactory)
     else:
         report_server = None
@@ -1190,21 +1460,35 @@ if __name__ == '__main__':
                 systems[system] = routerOBP(system, CONFIG, report_server)
             else:
                 systems[system] = routerHBP(system, CONFIG, report_server)
-            reactor.listenUDP(CONFIG['SYSTEMS'][system]['PORT'], systems[system], interface=CONFIG['SYSTEMS'][system]['IP'])
+            if sysbus.ROLE is None:
+                listen_system(CONFIG, system, systems[system])
             logger.debug('(GLOBAL) %s instance created: %s, %s', CONFIG['SYSTEMS'][system]['MODE'], system, systems[system])
 
+    if shard.WORKER is not None:
+        shard.start_channel(bridge_shard_handlers(report_server))
+    if sysbus.ROLE == 'ROUTER':
+        sysbus.start_router(systems)
+
     def loopingErrHandle(failure):
         logger.error('(GLOBAL) STOPPING REACTOR TO AVOID MEMORY LEAK: Unhandled error in timed loop.\n %s', failure)
         reactor.stop()
 
-    # Initialize the rule timer -- this if for user activated stuff
+    # Start the bridge timeouts and the UNIT_MAP timer -- this if for user activated stuff
+    arm_timers()
     rule_timer_task = task.LoopingCall(rule_timer_loop)
     rule_timer = rule_timer_task.start(60)
     rule_timer.addErrback(loopingErrHandle)
 
+    # Keep UNIT_MAP on disk for the next start, and write it once more on the way out
+    if CONFIG['GLOBAL']['UNIT_MAP_FILE']:
+        unit_map_save_task = task.LoopingCall(save_unit_map)
+        unit_map_save = unit_map_save_task.start(CONFIG['GLOBAL']['UNIT_MAP_SAVE'], now=False)
+        unit_map_save.addErrback(loopingErrHandle)
+        reactor.addSystemEventTrigger('before', 'shutdown', save_unit_map)
+
     # Initialize the stream trimmer
     stream_trimmer_task = task.LoopingCall(stream_trimmer_loop)
-    stream_trimmer = stream_trimmer_task.start(5)
+    stream_trimmer = stream_trimmer_task.start(CONFIG['GLOBAL']['STREAM_EXPIRY'])
     stream_trimmer.addErrback(loopingErrHandle)
 
     reactor.run()
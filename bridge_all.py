@@ -52,6 +52,7 @@ from dmr_utils3 import decode, bptc, const
 import config
 import log
 import const
+from slotstate import slot_status
 
 # The module needs logging logging, but handlers, etc. are controlled by the parent
 import logging
@@ -77,37 +78,8 @@ class bridgeallSYSTEM(HBSYSTEM):
         self._laststrid = ''
 
         # Status information for the system, TS1 & TS2
-        # 1 & 2 are "timeslot"
-        self.STATUS = {
-            1: {
-                'RX_START':     time(),
-                'RX_LOSS':      0,
-                'RX_SEQ':       0,
-                'RX_RFS':       b'\x00',
-                'TX_RFS':       b'\x00',
-                'RX_STREAM_ID': b'\x00',
-                'TX_STREAM_ID': b'\x00',
-                'RX_TGID':      b'\x00\x00\x00',
-                'TX_TGID':      b'\x00\x00\x00',
-                'RX_TIME':      time(),
-                'TX_TIME':      time(),
-                'RX_TYPE':      const.HBPF_SLT_VTERM,
-                },
-            2: {
-                'RX_START':     time(),
-                'RX:LOSS':      0,
-                'RX_SEQ':       0,
-                'RX_RFS':       b'\x00',
-                'TX_RFS':       b'\x00',
-                'RX_STREAM_ID': b'\x00',
-                'TX_STREAM_ID': b'\x00',
-                'RX_TGID':      b'\x00\x00\x00',
-                'TX_TGID':      b'\x00\x00\x00',
-                'RX_TIME':      time(),
-                'TX_TIME':      time(),
-                'RX_TYPE':      const.HBPF_SLT_VTERM,
-                }
-            }
+        # 1 & 2 are "timeslot" (see slotstate)
+        self.STATUS = slot_status()
 
     def dmrd_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data):
         pkt_time = time()
@@ -117,25 +89,25 @@ class bridgeallSYSTEM(HBSYSTEM):
         if _call_type == 'group':
 
             # Is this is a new call stream?
-            new_stream = (_stream_id != self.STATUS[_slot]['RX_STREAM_ID'])
+            new_stream = (_stream_id != self.STATUS[_slot].RX_STREAM_ID)
 
             if new_stream:
-                self.STATUS[_slot]['RX_START'] = pkt_time
-                self.STATUS[_slot]['RX_LOSS'] = 0
-                self.STATUS[_slot]['RX_SEQ'] = _seq
+                self.STATUS[_slot].RX_START = pkt_time
+                self.STATUS[_slot].RX_LOSS = 0
+                self.STATUS[_slot].RX_SEQ = _seq
                 logger.info('(%s) *CALL START* STREAM ID: %s SUB: %s (%s) PEER: %s (%s) TGID %s (%s), TS %s', \
                         self._system, int_id(_stream_id), get_alias(_rf_src, subscriber_ids), int_id(_rf_src), get_alias(_peer_id, peer_ids), int_id(_peer_id), get_alias(_dst_id, talkgroup_ids), int_id(_dst_id), _slot)
             else:
                 # This could be much better, it will have errors during roll-over
-                if _seq > (self.STATUS[_slot]['RX_SEQ'] + 1):
-                    #print(_seq, self.STATUS[_slot]['RX_SEQ'])
-                    self.STATUS[_slot]['RX_LOSS'] += _seq - (self.STATUS[_slot]['RX_SEQ'] + 1)
+                if _seq > (self.STATUS[_slot].RX_SEQ + 1):
+                    #print(_seq, self.STATUS[_slot].RX_SEQ)
+                    self.STATUS[_slot].RX_LOSS += _seq - (self.STATUS[_slot].RX_SEQ + 1)
 
             # Final actions - Is this a voice terminator?
-            if (_frame_type == const.HBPF_DATA_SYNC) and (_dtype_vseq == const.HBPF_SLT_VTERM) and (self.STATUS[_slot]['RX_TYPE'] != const.HBPF_SLT_VTERM):
-                call_duration = pkt_time - self.STATUS[_slot]['RX_START']
+            if (_frame_type == const.HBPF_DATA_SYNC) and (_dtype_vseq == const.HBPF_SLT_VTERM) and (self.STATUS[_slot].RX_TYPE != const.HBPF_SLT_VTERM):
+                call_duration = pkt_time - self.STATUS[_slot].RX_START
                 logger.info('(%s) *CALL END*   STREAM ID: %s SUB: %s (%s) PEER: %s (%s) TGID %s (%s), TS %s, Loss: %s, Duration: %s', \
-                        self._system, int_id(_stream_id), get_alias(_rf_src, subscriber_ids), int_id(_rf_src), get_alias(_peer_id, peer_ids), int_id(_peer_id), get_alias(_dst_id, talkgroup_ids), int_id(_dst_id), _slot, self.STATUS[_slot]['RX_LOSS'], call_duration)
+                        self._system, int_id(_stream_id), get_alias(_rf_src, subscriber_ids), int_id(_rf_src), get_alias(_peer_id, peer_ids), int_id(_peer_id), get_alias(_dst_id, talkgroup_ids), int_id(_dst_id), _slot, self.STATUS[_slot].RX_LOSS, call_duration)
 
 
             for _target in self._CONFIG['SYSTEMS']: 
@@ -153,80 +125,80 @@ class bridgeallSYSTEM(HBSYSTEM):
                     #   From the same group as the last TX to this HBSystem, but from a different subscriber, and it has been less than stream timeout
                     # The "continue" at the end of each means the next iteration of the for loop that tests for matching rules
                     #
-                    if ((_dst_id != _target_status[_slot]['RX_TGID']) and ((pkt_time - _target_status[_slot]['RX_TIME']) < _target_system['GROUP_HANGTIME'])):
-                        if _frame_type == const.HBPF_DATA_SYNC and _dtype_vseq == const.HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                            logger.info('(%s) Call not routed to TGID %s, target active or in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot]['RX_TGID']))
+                    if ((_dst_id != _target_status[_slot].RX_TGID) and ((pkt_time - _target_status[_slot].RX_TIME) < _target_system['GROUP_HANGTIME'])):
+                        if _frame_type == const.HBPF_DATA_SYNC and _dtype_vseq == const.HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                            logger.info('(%s) Call not routed to TGID %s, target active or in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot].RX_TGID))
                         continue
-                    if ((_dst_id != _target_status[_slot]['TX_TGID']) and ((pkt_time - _target_status[_slot]['TX_TIME']) < _target_system['GROUP_HANGTIME'])):
-                        if _frame_type == const.HBPF_DATA_SYNC and _dtype_vseq == const.HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                            logger.info('(%s) Call not routed to TGID%s, target in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot]['TX_TGID']))
+                    if ((_dst_id != _target_status[_slot].TX_TGID) and ((pkt_time - _target_status[_slot].TX_TIME) < _target_system['GROUP_HANGTIME'])):
+                        if _frame_type == const.HBPF_DATA_SYNC and _dtype_vseq == const.HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                            logger.info('(%s) Call not routed to TGID%s, target in group hangtime: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot].TX_TGID))
                         continue
-                    if (_dst_id == _target_status[_slot]['RX_TGID']) and ((pkt_time - _target_status[_slot]['RX_TIME']) < const.STREAM_TO):
-                        if _frame_type == const.HBPF_DATA_SYNC and _dtype_vseq == const.HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                            logger.info('(%s) Call not routed to TGID%s, matching call already active on target: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot]['RX_TGID']))
+                    if (_dst_id == _target_status[_slot].RX_TGID) and ((pkt_time - _target_status[_slot].RX_TIME) < const.STREAM_TO):
+                        if _frame_type == const.HBPF_DATA_SYNC and _dtype_vseq == const.HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                            logger.info('(%s) Call not routed to TGID%s, matching call already active on target: HBSystem: %s, TS: %s, TGID: %s', self._system, int_id(_dst_id), _target, _slot, int_id(_target_status[_slot].RX_TGID))
                         continue
-                    if (_dst_id == _target_status[_slot]['TX_TGID']) and (_rf_src != _target_status[_slot]['TX_RFS']) and ((pkt_time - _target_status[_slot]['TX_TIME']) < const.STREAM_TO):
-                        if _frame_type == const.HBPF_DATA_SYNC and _dtype_vseq == const.HBPF_SLT_VHEAD and self.STATUS[_slot]['RX_STREAM_ID'] != _stream_id:
-                            logger.info('(%s) Call not routed for subscriber %s, call route in progress on target: HBSystem: %s, TS: %s, TGID: %s, SUB: %s', self._system, int_id(_rf_src), _target, _slot, int_id(_target_status[_slot]['TX_TGID']), int_id(_target_status[_slot]['TX_RFS']))
+                    if (_dst_id == _target_status[_slot].TX_TGID) and (_rf_src != _target_status[_slot].TX_RFS) and ((pkt_time - _target_status[_slot].TX_TIME) < const.STREAM_TO):
+                        if _frame_type == const.HBPF_DATA_SYNC and _dtype_vseq == const.HBPF_SLT_VHEAD and self.STATUS[_slot].RX_STREAM_ID != _stream_id:
+                            logger.info('(%s) Call not routed for subscriber %s, call route in progress on target: HBSystem: %s, TS: %s, TGID: %s, SUB: %s', self._system, int_id(_rf_src), _target, _slot, int_id(_target_status[_slot].TX_TGID), int_id(_target_status[_slot].TX_RFS))
                         continue
 
 
                     # ACL Processing
                     if self._CONFIG['GLOBAL']['USE_ACL']:
                         if not acl_check(_rf_src, self._CONFIG['GLOBAL']['SUB_ACL']):
-                            if _stream_id != _target_status[_slot]['TX_STREAM_ID']:
+                            if _stream_id != _target_status[_slot].TX_STREAM_ID:
                                 logger.info('(%s) CALL DROPPED ON EGRESS WITH STREAM ID %s FROM SUBSCRIBER %s BY GLOBAL ACL', _target, int_id(_stream_id), int_id(_rf_src))
-                                _target_status[_slot]['TX_STREAM_ID'] = _stream_id
+                                _target_status[_slot].TX_STREAM_ID = _stream_id
                             continue
                         if _slot == 1 and not acl_check(_dst_id, self._CONFIG['GLOBAL']['TG1_ACL']):
-                            if _stream_id != _target_status[_slot]['TX_STREAM_ID']:
+                            if _stream_id != _target_status[_slot].TX_STREAM_ID:
                                 logger.info('(%s) CALL DROPPED ON EGRESS WITH STREAM ID %s ON TGID %s BY GLOBAL TS1 ACL', _target, int_id(_stream_id), int_id(_dst_id))
-                                _target_status[_slot]['TX_STREAM_ID'] = _stream_id
+                                _target_status[_slot].TX_STREAM_ID = _stream_id
                             continue
                         if _slot == 2 and not acl_check(_dst_id, self._CONFIG['GLOBAL']['TG2_ACL']):
-                            if _stream_id != _target_status[_slot]['TX_STREAM_ID']:
+                            if _stream_id != _target_status[_slot].TX_STREAM_ID:
                                 logger.info('(%s) CALL DROPPED ON EGRESS WITH STREAM ID %s ON TGID %s BY GLOBAL TS2 ACL', _target, int_id(_stream_id), int_id(_dst_id))
-                                _target_status[_slot]['TX_STREAM_ID'] = _stream_id
+                                _target_status[_slot].TX_STREAM_ID = _stream_id
                             continue
                     if _target_system['USE_ACL']:
                         if not acl_check(_rf_src, _target_system['SUB_ACL']):
-                            if _stream_id != _target_status[_slot]['TX_STREAM_ID']:
+                            if _stream_id != _target_status[_slot].TX_STREAM_ID:
                                 logger.info('(%s) CALL DROPPED ON EGRESS WITH STREAM ID %s FROM SUBSCRIBER %s BY SYSTEM ACL', _target, int_id(_stream_id), int_id(_rf_src))
-                                _target_status[_slot]['TX_STREAM_ID'] = _stream_id
+                                _target_status[_slot].TX_STREAM_ID = _stream_id
                             continue
                         if _slot == 1 and not acl_check(_dst_id, _target_system['TG1_ACL']):
-                            if _stream_id != _target_status[_slot]['TX_STREAM_ID']:
+                            if _stream_id != _target_status[_slot].TX_STREAM_ID:
                                 logger.info('(%s) CALL DROPPED ON EGRESS WITH STREAM ID %s ON TGID %s BY SYSTEM TS1 ACL', _target, int_id(_stream_id), int_id(_dst_id))
-                                _target_status[_slot]['TX_STREAM_ID'] = _stream_id
+                                _target_status[_slot].TX_STREAM_ID = _stream_id
                             continue
                         if _slot == 2 and not acl_check(_dst_id, _target_system['TG2_ACL']):
-                            if _stream_id != _target_status[_slot]['TX_STREAM_ID']:
+                            if _stream_id != _target_status[_slot].TX_STREAM_ID:
                                 logger.info('(%s) CALL DROPPED ON EGRESS WITH STREAM ID %s ON TGID %s BY SYSTEM TS2 ACL', _target, int_id(_stream_id), int_id(_dst_id))
-                                _target_status[_slot]['TX_STREAM_ID'] = _stream_id
+                                _target_status[_slot].TX_STREAM_ID = _stream_id
                             continue
 
                     # Record this stuff for later
                     # Is this a new call stream?
                     if new_stream:
                          # Record the DST TGID and Stream ID
-                         _target_status[_slot]['TX_START'] = pkt_time
-                         _target_status[_slot]['TX_TGID'] = _dst_id
-                         _target_status[_slot]['TX_RFS'] = _rf_src
-                         _target_status[_slot]['TX_PEER'] = _peer_id
-                         _target_status[_slot]['TX_STREAM_ID'] = _stream_id
+                         _target_status[_slot].TX_START = pkt_time
+                         _target_status[_slot].TX_TGID = _dst_id
+                         _target_status[_slot].TX_RFS = _rf_src
+                         _target_status[_slot].TX_PEER = _peer_id
+                         _target_status[_slot].TX_STREAM_ID = _stream_id
 
-                    _target_status[_slot]['TX_TIME'] = pkt_time
+                    _target_status[_slot].TX_TIME = pkt_time
 
                     systems[_target].send_system(_data)
                     #logger.debug('(%s) Packet routed to system: %s', self._system, _target)
 
             # Mark status variables for use later
-            self.STATUS[_slot]['RX_RFS']       = _rf_src
-            self.STATUS[_slot]['RX_SEQ']       = _seq
-            self.STATUS[_slot]['RX_TYPE']      = _dtype_vseq
-            self.STATUS[_slot]['RX_TGID']      = _dst_id
-            self.STATUS[_slot]['RX_TIME']      = pkt_time
-            self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
+            self.STATUS[_slot].RX_RFS       = _rf_src
+            self.STATUS[_slot].RX_SEQ       = _seq
+            self.STATUS[_slot].RX_TYPE      = _dtype_vseq
+            self.STATUS[_slot].RX_TGID      = _dst_id
+            self.STATUS[_slot].RX_TIME      = pkt_time
+            self.STATUS[_slot].RX_STREAM_ID = _stream_id
 
 
 #************************************************
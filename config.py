@@ -30,6 +30,8 @@ import configparser
 import sys
 import const
 
+from acl import acl_compile
+
 from socket import gethostbyname
 
 # Does anybody read this stuff? There's a PEP somewhere that says I should do this.
@@ -62,10 +64,11 @@ def process_acls(_config):
 
 # Create an access control list that is programatically useable from human readable:
 # ORIGINAL:  'DENY:1-5,3120101,3120124'
-# PROCESSED: (False, set([(1, 5), (3120124, 3120124), (3120101, 3120101)]))
+# PROCESSED: (False, [(1, 5), (3120101, 3120101), (3120124, 3120124)], [1, 3120101, 3120124], [5, 3120101, 3120124])
+# The ranges are merged and sorted by acl_compile so acl_check can bisect them
 def acl_build(_acl, _max):
     if not _acl:
-        return(True, set((const.ID_MIN, _max)))
+        return acl_compile(True, [(const.ID_MIN, _max)])
 
     acl = [] #set()
     sections = _acl.split(':')
@@ -94,7 +97,7 @@ def acl_build(_acl, _max):
             else:
                  sys.exit('ACL CREATION ERROR, VALUE OUT OF RANGE ({} - {}) IN SINGLE ID ENTRY: {}'.format(const.ID_MIN, _max, entry))
 
-    return (action, acl)
+    return acl_compile(action, acl)
 
 def build_config(_config_file):
     config = configparser.ConfigParser()
@@ -121,7 +124,14 @@ def build_config(_config_file):
                     'REG_ACL': config.get(section, 'REG_ACL'),
                     'SUB_ACL': config.get(section, 'SUB_ACL'),
                     'TG1_ACL': config.get(section, 'TGID_TS1_ACL'),
-                    'TG2_ACL': config.get(section, 'TGID_TS2_ACL')
+                    'TG2_ACL': config.get(section, 'TGID_TS2_ACL'),
+                    'SENDMMSG': config.getboolean(section, 'SENDMMSG', fallback=False),
+                    'RECV_BATCH': config.getint(section, 'RECV_BATCH', fallback=0),
+                    'WORKERS': config.getint(section, 'WORKERS', fallback=1),
+                    'SYSTEM_PROCESSES': config.getint(section, 'SYSTEM_PROCESSES', fallback=0),
+                    'UNIT_MAP_FILE': config.get(section, 'UNIT_MAP_FILE', fallback=''),
+                    'UNIT_MAP_SAVE': config.getint(section, 'UNIT_MAP_SAVE', fallback=300),
+                    'STREAM_EXPIRY': config.getfloat(section, 'STREAM_EXPIRY', fallback=1.0)
                 })
 
             elif section == 'REPORTS':
@@ -317,7 +327,7 @@ if __name__ == '__main__':
     import os
     import argparse
     from pprint import pprint
-    from dmr_utils3.utils import int_id
+    from acl import acl_check
     
     # Change the current directory to the location of the application
     os.chdir(os.path.dirname(os.path.realpath(sys.argv[0])))
@@ -334,12 +344,5 @@ if __name__ == '__main__':
     
     CONFIG = build_config(cli_args.CONFIG_FILE)
     pprint(CONFIG)
-    
-    def acl_check(_id, _acl):
-        id = int_id(_id)
-        for entry in _acl[1]:
-            if entry[0] <= id <= entry[1]:
-                return _acl[0]
-        return not _acl[0]
-        
+
     print(acl_check(b'\x00\x01\x37', CONFIG['GLOBAL']['TG1_ACL']))
@@ -39,6 +39,18 @@ ID_MAX = 16776415
 # Timers
 STREAM_TO = .360
 
+# Seconds without a packet before a stream that never sent a terminator is timed out
+STREAM_LOST = 5
+
+# Number of streams each OpenBridge system keeps track of before it drops the least recently heard
+OBP_STREAM_TABLE_SIZE = 4096
+
+# Number of per-stream ACL verdicts each system remembers
+ACL_CACHE_SIZE = 1024
+
+# Number of encoded LC sets (header, terminator, embedded) kept for bridged streams
+LC_CACHE_SIZE = 512
+
 # Options from the LC - used for late entry
 LC_OPT = b'\x00\x00\x20'
 
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016-2019 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+A parsed HomeBrew/OpenBridge DMRD frame. The header bits (byte 15) are
+decoded once through a 256-entry table instead of a branch cascade, and the
+frame is handed to applications as one object instead of ten arguments.
+
+DMRD packet layout:
+    0:4   'DMRD'           4     sequence         5:8   RF source
+    8:11  destination      11:15 peer ID          15    header bits
+    16:20 stream ID        20:53 DMR payload      53:55 BER & RSSI (HBP only)
+'''
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016-2019 Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+# Decode a header byte the long way -- only used to build HEADER_BITS
+def header_bits(_bits):
+    _slot = 2 if (_bits & 0x80) else 1
+    if _bits & 0x40:
+        _call_type = 'unit'
+    elif (_bits & 0x23) == 0x23:
+        _call_type = 'vcsbk'
+    else:
+        _call_type = 'group'
+    _frame_type = (_bits & 0x30) >> 4
+    _dtype_vseq = (_bits & 0xF) # data, 1=voice header, 2=voice terminator; voice, 0=burst A ... 5=burst F
+    return (_slot, _call_type, _frame_type, _dtype_vseq)
+
+# (slot, call type, frame type, dtype/vseq) for every possible value of byte 15
+HEADER_BITS = tuple(header_bits(_bits) for _bits in range(256))
+
+
+# The fields every ingress handler reads (ACLs, repeat, routing) are sliced when the
+# frame is built; the rest are only sliced if somebody asks for them.
+class dmrdFrame:
+    __slots__ = ('data', 'slot', 'call_type', 'frame_type', 'dtype_vseq', 'rf_src', 'dst_id', 'stream_id')
+
+    def __init__(self, _data):
+        self.data = _data
+        self.slot, self.call_type, self.frame_type, self.dtype_vseq = HEADER_BITS[_data[15]]
+        self.rf_src = _data[5:8]
+        self.dst_id = _data[8:11]
+        self.stream_id = _data[16:20]
+
+    @property
+    def seq(self):
+        return self.data[4]
+
+    @property
+    def peer_id(self):
+        return self.data[11:15]
+
+    @property
+    def bits(self):
+        return self.data[15]
+
+    @property
+    def payload(self):
+        return self.data[20:53]
+
+
+# Benchmark the ingress decode + dispatch paths: the old branch cascade handing ten
+# positional arguments to dmrd_received (which re-slices the payload and header bits),
+# the same thing decoded through HEADER_BITS, and a dmrdFrame handed to
+# dmrd_frame_received. Run this file directly to use it.
+if __name__ == '__main__':
+    from random import randint, seed
+    from timeit import repeat
+
+    class router:
+        def dmrd_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data):
+            if _call_type == 'group':
+                return self.group_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data)
+
+        def group_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, _data):
+            dmrpkt = _data[20:53]
+            _bits = _data[15]
+            return (_peer_id, _rf_src, _dst_id, _seq, _slot, _frame_type, _dtype_vseq, _stream_id, dmrpkt, _bits)
+
+        def dmrd_frame_received(self, _frame):
+            if _frame.call_type == 'group':
+                return self.group_frame_received(_frame)
+
+        def group_frame_received(self, _frame):
+            return (_frame.peer_id, _frame.rf_src, _frame.dst_id, _frame.seq, _frame.slot, _frame.frame_type, _frame.dtype_vseq, _frame.stream_id, _frame.payload, _frame.bits)
+
+    def decode_cascade(_data):
+        _peer_id = _data[11:15]
+        _seq = _data[4]
+        _rf_src = _data[5:8]
+        _dst_id = _data[8:11]
+        _bits = _data[15]
+        _slot = 2 if (_bits & 0x80) else 1
+        if _bits & 0x40:
+            _call_type = 'unit'
+        elif (_bits & 0x23) == 0x23:
+            _call_type = 'vcsbk'
+        else:
+            _call_type = 'group'
+        _frame_type = (_bits & 0x30) >> 4
+        _dtype_vseq = (_bits & 0xF)
+        _stream_id = _data[16:20]
+        return _router.dmrd_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data)
+
+    def decode_table(_data):
+        _slot, _call_type, _frame_type, _dtype_vseq = HEADER_BITS[_data[15]]
+        return _router.dmrd_received(_data[11:15], _data[5:8], _data[8:11], _data[4], _slot, _call_type, _frame_type, _dtype_vseq, _data[16:20], _data)
+
+    def decode_frame(_data):
+        return _router.dmrd_frame_received(dmrdFrame(_data))
+
+    seed(3120101)
+    _router = router()
+    packets = [b'DMRD' + bytes(randint(0, 255) for i in range(11)) + bytes([randint(0, 255) & ~0x40]) + bytes(randint(0, 255) for i in range(39)) for i in range(1000)]
+
+    # The table must agree with the cascade for every header byte, and every path must hand the router the same fields
+    for _bits in range(256):
+        _frame = dmrdFrame(packets[0][:15] + bytes([_bits]) + packets[0][16:])
+        assert header_bits(_bits) == (_frame.slot, _frame.call_type, _frame.frame_type, _frame.dtype_vseq)
+    for _data in packets:
+        assert decode_cascade(_data) == decode_table(_data) == decode_frame(_data)
+
+    number = 200
+    for name, path in (('CASCADE + dmrd_received', decode_cascade), ('TABLE + dmrd_received', decode_table), ('dmrdFrame + dmrd_frame_received', decode_frame)):
+        t_path = min(repeat(lambda: [path(_data) for _data in packets], number=number, repeat=5)) / (number * len(packets))
+        print('{:>34}: {:.3f} us/packet'.format(name, t_path * 1e6))
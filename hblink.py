@@ -34,7 +34,6 @@ from random import randint
 from hashlib import sha256, sha1
 from hmac import new as hmac_new, compare_digest
 from time import time
-from collections import deque
 
 # Twisted is pretty important, so I keep it separate
 from twisted.internet.protocol import DatagramProtocol, Factory, Protocol
@@ -44,6 +43,11 @@ from twisted.internet import reactor, task
 # Other files we pull from -- this is mostly for readability and segmentation
 import log
 import config
+from acl import acl_check, acl_cache
+from dmrd import dmrdFrame, HEADER_BITS
+from fanout import fanout
+from udpbatch import batch_protocol, batchPort, rx_stats
+import shard
 from const import *
 from dmr_utils3.utils import int_id, bytes_4, try_download, mk_id_dict
 
@@ -87,18 +91,23 @@ def config_reports(_config, _factory):
 # Shut ourselves down gracefully by disconnecting from the masters and peers.
 def hblink_handler(_signal, _frame):
     for system in systems:
+        if not shard.is_home(systems[system]._config['MODE']):
+            continue
         logger.info('(GLOBAL) SHUTDOWN: DE-REGISTER SYSTEM: %s', system)
         systems[system].dereg()
 
-# Check a supplied ID against the ACL provided. Returns action (True|False) based
-# on matching and the action specified.
-def acl_check(_id, _acl):
-    id = int_id(_id)
-    for entry in _acl[1]:
-        if entry[0] <= id <= entry[1]:
-            return _acl[0]
-    return not _acl[0]
-
+# The ACL verdict for a packet, run by acl_verdict for the first packet of a stream and
+# remembered in the system's _acl_cache for the rest. It is kept by everything the ACLs
+# look at, so a packet can't reuse another's stream ID to get in. OPENBRIDGE and HBSYSTEM
+# both have this as their acl_cached method.
+def acl_cached(self, _rf_src, _dst_id, _slot, _stream_id):
+    _key = (_stream_id, _rf_src, _dst_id, _slot)
+    _acl_ok = self._acl_cache.get(_key)
+    if _acl_ok is None:
+        if len(self._acl_cache) >= ACL_CACHE_SIZE:
+            del self._acl_cache[next(iter(self._acl_cache))]
+        _acl_ok = self._acl_cache[_key] = self.acl_verdict(_rf_src, _dst_id, _slot, _stream_id)
+    return _acl_ok
 
 #************************************************
 #    OPENBRIDGE CLASS
@@ -111,11 +120,35 @@ class OPENBRIDGE(DatagramProtocol):
         self._system = _name
         self._report = _report
         self._config = self._CONFIG['SYSTEMS'][self._system]
-        self._laststrid = deque([], 20)
+        self._acl_cache = acl_cache()
+
+    def startProtocol(self):
+        if self._CONFIG['GLOBAL']['SENDMMSG']:
+            batch_protocol(self, self._system)
 
     def dereg(self):
         logger.info('(%s) is mode OPENBRIDGE. No De-Registration required, continuing shutdown', self._system)
 
+    acl_cached = acl_cached
+
+    # Run the global and system ACLs for a packet (see acl_cached)
+    def acl_verdict(self, _rf_src, _dst_id, _slot, _stream_id):
+        if self._CONFIG['GLOBAL']['USE_ACL']:
+            if not acl_check(_rf_src, self._CONFIG['GLOBAL']['SUB_ACL']):
+                logger.info('(%s) CALL DROPPED WITH STREAM ID %s FROM SUBSCRIBER %s BY GLOBAL ACL', self._system, int_id(_stream_id), int_id(_rf_src))
+                return False
+            if _slot == 1 and not acl_check(_dst_id, self._CONFIG['GLOBAL']['TG1_ACL']):
+                logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY GLOBAL TS1 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
+                return False
+        if self._config['USE_ACL']:
+            if not acl_check(_rf_src, self._config['SUB_ACL']):
+                logger.info('(%s) CALL DROPPED WITH STREAM ID %s FROM SUBSCRIBER %s BY SYSTEM ACL', self._system, int_id(_stream_id), int_id(_rf_src))
+                return False
+            if not acl_check(_dst_id, self._config['TG1_ACL']):
+                logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY SYSTEM ACL', self._system, int_id(_stream_id), int_id(_dst_id))
+                return False
+        return True
+
     def send_system(self, _packet):
         if _packet[:4] == DMRD:
             #_packet = _packet[:11] + self._config['NETWORK_ID'] + _packet[15:]
@@ -132,6 +165,10 @@ class OPENBRIDGE(DatagramProtocol):
         pass
         #print(int_id(_peer_id), int_id(_rf_src), int_id(_dst_id), int_id(_seq), _slot, _call_type, _frame_type, repr(_dtype_vseq), int_id(_stream_id))
 
+    # Applications that would rather receive a parsed dmrd.dmrdFrame than the ten
+    # arguments of dmrd_received opt in by defining dmrd_frame_received(self, _frame)
+    dmrd_frame_received = None
+
     def datagramReceived(self, _packet, _sockaddr):
         # Keep This Line Commented Unless HEAVILY Debugging!
         #logger.debug('(%s) RX packet from %s -- %s', self._system, _sockaddr, ahex(_packet))
@@ -146,17 +183,8 @@ class OPENBRIDGE(DatagramProtocol):
                 _seq = _data[4]
                 _rf_src = _data[5:8]
                 _dst_id = _data[8:11]
-                _bits = _data[15]
-                _slot = 2 if (_bits & 0x80) else 1
-                #_call_type = 'unit' if (_bits & 0x40) else 'group'
-                if _bits & 0x40:
-                    _call_type = 'unit'
-                elif (_bits & 0x23) == 0x23:
-                    _call_type = 'vcsbk'
-                else:
-                    _call_type = 'group'
-                _frame_type = (_bits & 0x30) >> 4
-                _dtype_vseq = (_bits & 0xF) # data, 1=voice header, 2=voice terminator; voice, 0=burst A ... 5=burst F
+                # data, 1=voice header, 2=voice terminator; voice, 0=burst A ... 5=burst F
+                _slot, _call_type, _frame_type, _dtype_vseq = HEADER_BITS[_data[15]]
                 _stream_id = _data[16:20]
                 #logger.debug('(%s) DMRD - Seqence: %s, RF Source: %s, Destination ID: %s', self._system, int_id(_seq), int_id(_rf_src), int_id(_dst_id))
 
@@ -165,32 +193,15 @@ class OPENBRIDGE(DatagramProtocol):
                     logger.error('(%s) OpenBridge packet discarded because it was not received on slot 1. SID: %s, TGID %s', self._system, int_id(_rf_src), int_id(_dst_id))
                     return
 
-                # ACL Processing
-                if self._CONFIG['GLOBAL']['USE_ACL']:
-                    if not acl_check(_rf_src, self._CONFIG['GLOBAL']['SUB_ACL']):
-                        if _stream_id not in self._laststrid:
-                            logger.info('(%s) CALL DROPPED WITH STREAM ID %s FROM SUBSCRIBER %s BY GLOBAL ACL', self._system, int_id(_stream_id), int_id(_rf_src))
-                            self._laststrid.append(_stream_id)
-                        return
-                    if _slot == 1 and not acl_check(_dst_id, self._CONFIG['GLOBAL']['TG1_ACL']):
-                        if _stream_id not in self._laststrid:
-                            logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY GLOBAL TS1 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
-                            self._laststrid.append(_stream_id)
-                        return
-                if self._config['USE_ACL']:
-                    if not acl_check(_rf_src, self._config['SUB_ACL']):
-                        if _stream_id not in self._laststrid:
-                            logger.info('(%s) CALL DROPPED WITH STREAM ID %s FROM SUBSCRIBER %s BY SYSTEM ACL', self._system, int_id(_stream_id), int_id(_rf_src))
-                            self._laststrid.append(_stream_id)
-                        return
-                    if not acl_check(_dst_id, self._config['TG1_ACL']):
-                        if _stream_id not in self._laststrid:
-                            logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY SYSTEM ACL', self._system, int_id(_stream_id), int_id(_dst_id))
-                            self._laststrid.append(_stream_id)
-                        return
+                # ACL Processing -- only the first packet of a stream runs the ACLs, the rest use the cached verdict
+                if not self.acl_cached(_rf_src, _dst_id, _slot, _stream_id):
+                    return
 
                 # Userland actions -- typically this is the function you subclass for an application
-                self.dmrd_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data)
+                if self.dmrd_frame_received:
+                    self.dmrd_frame_received(dmrdFrame(_data))
+                else:
+                    self.dmrd_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data)
             else:
                 logger.info('(%s) OpenBridge HMAC failed, packet discarded - OPCODE: %s DATA: %s HMAC LENGTH: %s HMAC: %s', self._system, _packet[:4], repr(_packet[:53]), len(_packet[53:]), repr(_packet[53:])) 
 
@@ -206,15 +217,22 @@ class HBSYSTEM(DatagramProtocol):
         self._system = _name
         self._report = _report
         self._config = self._CONFIG['SYSTEMS'][self._system]
-        self._laststrid = {1: b'', 2: b''}
+        self._acl_cache = acl_cache()
 
         # Define shortcuts and generic function names based on the type of system we are
         if self._config['MODE'] == 'MASTER':
             self._peers = self._CONFIG['SYSTEMS'][self._system]['PEERS']
+            # Connected peers only, indexed by socket address, and the same peers as a list
+            # of (peer_id, sockaddr) for sending. Maintained by peer_connected/peer_disconnected.
+            self._peer_socks = {}
+            self._peer_list = []
+            # Peers in self._peers that are logged in to another worker (see shard.py)
+            self._remote_peers = set()
             self.send_system = self.send_peers
             self.maintenance_loop = self.master_maintenance_loop
             self.datagramReceived = self.master_datagramReceived
             self.dereg = self.master_dereg
+            self._commands = self.master_commands()
 
         elif self._config['MODE'] == 'PEER':
             self._stats = self._config['STATS']
@@ -222,6 +240,7 @@ class HBSYSTEM(DatagramProtocol):
             self.maintenance_loop = self.peer_maintenance_loop
             self.datagramReceived = self.peer_datagramReceived
             self.dereg = self.peer_dereg
+            self._commands = self.peer_commands()
 
         elif self._config['MODE'] == 'XLXPEER':
             self._stats = self._config['XLXSTATS']
@@ -229,11 +248,37 @@ class HBSYSTEM(DatagramProtocol):
             self.maintenance_loop = self.peer_maintenance_loop
             self.datagramReceived = self.peer_datagramReceived
             self.dereg = self.peer_dereg
+            self._commands = self.peer_commands()
+
+    # Opcode dispatch tables, keyed on the first four bytes of the packet. They are built from
+    # bound methods, so a subclass can replace the handler for one opcode without copying
+    # the whole receiver. RPTCL and MSTNAK are sorted out by the RPTC and MSTN handlers.
+    def master_commands(self):
+        return {
+            DMRD: self.master_dmrd,
+            RPTL: self.master_rptl,
+            RPTK: self.master_rptk,
+            RPTC: self.master_rptc,
+            RPTP: self.master_rptp,
+            RPTO: self.master_rpto,
+            DMRA: self.master_dmra,
+        }
+
+    def peer_commands(self):
+        return {
+            DMRD: self.peer_dmrd,
+            MSTN: self.peer_mstn,
+            RPTA: self.peer_rpta,
+            MSTP: self.peer_mstp,
+            MSTC: self.peer_mstc,
+        }
 
     def startProtocol(self):
         # Set up periodic loop for tracking pings from peers. Run every 'PING_TIME' seconds
         self._system_maintenance = task.LoopingCall(self.maintenance_loop)
         self._system_maintenance_loop = self._system_maintenance.start(self._CONFIG['GLOBAL']['PING_TIME'])
+        if self._CONFIG['GLOBAL']['SENDMMSG']:
+            batch_protocol(self, self._system)
 
     # Aliased in __init__ to maintenance_loop if system is a master
     def master_maintenance_loop(self):
@@ -241,12 +286,16 @@ class HBSYSTEM(DatagramProtocol):
         remove_list = []
         for peer in self._peers:
             _this_peer = self._peers[peer]
+            # Peers logged in to another worker are pinging that worker, not us
+            if peer in self._remote_peers:
+                continue
             # Check to see if any of the peers have been quiet (no ping) longer than allowed
             if _this_peer['LAST_PING']+(self._CONFIG['GLOBAL']['PING_TIME']*self._CONFIG['GLOBAL']['MAX_MISSED']) < time():
                 remove_list.append(peer)
         for peer in remove_list:
             logger.info('(%s) Peer %s (%s) has timed out and is being removed', self._system, self._peers[peer]['CALLSIGN'], self._peers[peer]['RADIO_ID'])
             # Remove any timed out peers from the configuration
+            self.peer_disconnected(peer)
             del self._CONFIG['SYSTEMS'][self._system]['PEERS'][peer]
 
     # Aliased in __init__ to maintenance_loop if system is a peer
@@ -270,10 +319,53 @@ class HBSYSTEM(DatagramProtocol):
             self._stats['PINGS_SENT'] += 1
             self._stats['PING_OUTSTANDING'] = True
 
+    # Rebuild the list of peers to send to: ours, plus those logged in to other workers
+    def mk_peer_list(self):
+        self._peer_list = [(_peer, _addr) for _addr, _peer in self._peer_socks.items()]
+        self._peer_list.extend((_peer, self._peers[_peer]['SOCKADDR']) for _peer in self._remote_peers)
+
+    # Add a peer that has finished logging in (CONNECTION == 'YES') to the connected peer index
+    def peer_connected(self, _peer_id):
+        self._peer_socks[self._peers[_peer_id]['SOCKADDR']] = _peer_id
+        self.mk_peer_list()
+        shard.publish('PEER_UP', self._system, _peer_id, self._peers[_peer_id])
+
+    # Drop a peer from the connected peer index -- call before it is removed from self._peers
+    def peer_disconnected(self, _peer_id):
+        if _peer_id in self._remote_peers:
+            self._remote_peers.discard(_peer_id)
+            self.mk_peer_list()
+        elif _peer_id in self._peers:
+            _sockaddr = self._peers[_peer_id]['SOCKADDR']
+            if self._peer_socks.get(_sockaddr) == _peer_id:
+                del self._peer_socks[_sockaddr]
+                self.mk_peer_list()
+                shard.publish('PEER_DOWN', self._system, _peer_id)
+
+    # Another worker has logged a peer in. If it used to be ours, the kernel has moved it.
+    def remote_peer_up(self, _peer_id, _peer):
+        if _peer_id in self._peers and _peer_id not in self._remote_peers:
+            _sockaddr = self._peers[_peer_id]['SOCKADDR']
+            if self._peer_socks.get(_sockaddr) == _peer_id:
+                del self._peer_socks[_sockaddr]
+        self._peers[_peer_id] = _peer
+        self._remote_peers.add(_peer_id)
+        self.mk_peer_list()
+
+    # Another worker has dropped one of its peers
+    def remote_peer_down(self, _peer_id):
+        if _peer_id in self._remote_peers:
+            self._remote_peers.discard(_peer_id)
+            del self._peers[_peer_id]
+            self.mk_peer_list()
+
     def send_peers(self, _packet):
-        for _peer in self._peers:
-            self.send_peer(_peer, _packet)
-            #logger.debug('(%s) Packet sent to peer %s', self._system, self._peers[_peer]['RADIO_ID'])
+        if _packet[:4] == DMRD:
+            fanout(self.transport.write, _packet, self._peer_list)
+        else:
+            for _peer, _sockaddr in self._peer_list:
+                self.transport.write(_packet, _sockaddr)
+                #logger.debug('(%s) Packet sent to peer %s', self._system, self._peers[_peer]['RADIO_ID'])
 
     def send_peer(self, _peer, _packet):
         if _packet[:4] == DMRD:
@@ -315,8 +407,40 @@ class HBSYSTEM(DatagramProtocol):
     def dmrd_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data):
         pass
 
+    # Applications that would rather receive a parsed dmrd.dmrdFrame than the ten
+    # arguments of dmrd_received opt in by defining dmrd_frame_received(self, _frame)
+    dmrd_frame_received = None
+
+    acl_cached = acl_cached
+
+    # Run the global and system ACLs for a packet (see acl_cached)
+    def acl_verdict(self, _rf_src, _dst_id, _slot, _stream_id):
+        if self._CONFIG['GLOBAL']['USE_ACL']:
+            if not acl_check(_rf_src, self._CONFIG['GLOBAL']['SUB_ACL']):
+                logger.info('(%s) CALL DROPPED WITH STREAM ID %s FROM SUBSCRIBER %s BY GLOBAL ACL', self._system, int_id(_stream_id), int_id(_rf_src))
+                return False
+            if _slot == 1 and not acl_check(_dst_id, self._CONFIG['GLOBAL']['TG1_ACL']):
+                logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY GLOBAL TS1 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
+                return False
+            if _slot == 2 and not acl_check(_dst_id, self._CONFIG['GLOBAL']['TG2_ACL']):
+                logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY GLOBAL TS2 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
+                return False
+        if self._config['USE_ACL']:
+            if not acl_check(_rf_src, self._config['SUB_ACL']):
+                logger.info('(%s) CALL DROPPED WITH STREAM ID %s FROM SUBSCRIBER %s BY SYSTEM ACL', self._system, int_id(_stream_id), int_id(_rf_src))
+                return False
+            if _slot == 1 and not acl_check(_dst_id, self._config['TG1_ACL']):
+                logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY SYSTEM TS1 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
+                return False
+            if _slot == 2 and not acl_check(_dst_id, self._config['TG2_ACL']):
+                logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY SYSTEM TS2 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
+                return False
+        return True
+
     def master_dereg(self):
         for _peer in self._peers:
+            if _peer in self._remote_peers:
+                continue
             self.send_peer(_peer, MSTCL + _peer)
             logger.info('(%s) De-Registration sent to Peer: %s (%s)', self._system, self._peers[_peer]['CALLSIGN'], self._peers[_peer]['RADIO_ID'])
 
@@ -330,209 +454,180 @@ class HBSYSTEM(DatagramProtocol):
         # logger.debug('(%s) RX packet from %s -- %s', self._system, _sockaddr, ahex(_data))
 
         # Extract the command, which is various length, all but one 4 significant characters -- RPTCL
-        _command = _data[:4]
-
-        if _command == DMRD:    # DMRData -- encapsulated DMR data frame
-            _peer_id = _data[11:15]
-            if _peer_id in self._peers \
-                        and self._peers[_peer_id]['CONNECTION'] == 'YES' \
-                        and self._peers[_peer_id]['SOCKADDR'] == _sockaddr:
-                _seq = _data[4]
-                _rf_src = _data[5:8]
-                _dst_id = _data[8:11]
-                _bits = _data[15]
-                _slot = 2 if (_bits & 0x80) else 1
-                #_call_type = 'unit' if (_bits & 0x40) else 'group'
-                if _bits & 0x40:
-                    _call_type = 'unit'
-                elif (_bits & 0x23) == 0x23:
-                    _call_type = 'vcsbk'
-                else:
-                    _call_type = 'group'
-                _frame_type = (_bits & 0x30) >> 4
-                _dtype_vseq = (_bits & 0xF) # data, 1=voice header, 2=voice terminator; voice, 0=burst A ... 5=burst F
-                _stream_id = _data[16:20]
-                #logger.debug('(%s) DMRD - Seqence: %s, RF Source: %s, Destination ID: %s', self._system, _seq, int_id(_rf_src), int_id(_dst_id))
-                # ACL Processing
-                if self._CONFIG['GLOBAL']['USE_ACL']:
-                    if not acl_check(_rf_src, self._CONFIG['GLOBAL']['SUB_ACL']):
-                        if self._laststrid[_slot] != _stream_id:
-                            logger.info('(%s) CALL DROPPED WITH STREAM ID %s FROM SUBSCRIBER %s BY GLOBAL ACL', self._system, int_id(_stream_id), int_id(_rf_src))
-                            self._laststrid[_slot] = _stream_id
-                        return
-                    if _slot == 1 and not acl_check(_dst_id, self._CONFIG['GLOBAL']['TG1_ACL']):
-                        if self._laststrid[_slot] != _stream_id:
-                            logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY GLOBAL TS1 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
-                            self._laststrid[_slot] = _stream_id
-                        return
-                    if _slot == 2 and not acl_check(_dst_id, self._CONFIG['GLOBAL']['TG2_ACL']):
-                        if self._laststrid[_slot] != _stream_id:
-                            logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY GLOBAL TS2 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
-                            self._laststrid[_slot] = _stream_id
-                        return
-                if self._config['USE_ACL']:
-                    if not acl_check(_rf_src, self._config['SUB_ACL']):
-                        if self._laststrid[_slot] != _stream_id:
-                            logger.info('(%s) CALL DROPPED WITH STREAM ID %s FROM SUBSCRIBER %s BY SYSTEM ACL', self._system, int_id(_stream_id), int_id(_rf_src))
-                            self._laststrid[_slot] = _stream_id
-                        return
-                    if _slot == 1 and not acl_check(_dst_id, self._config['TG1_ACL']):
-                        if self._laststrid[_slot] != _stream_id:
-                            logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY SYSTEM TS1 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
-                            self._laststrid[_slot] = _stream_id
-                        return
-                    if _slot == 2 and not acl_check(_dst_id, self._config['TG2_ACL']):
-                        if self._laststrid[_slot]!= _stream_id:
-                            logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY SYSTEM TS2 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
-                            self._laststrid[_slot] = _stream_id
-                        return
-
-                # The basic purpose of a master is to repeat to the peers
-                if self._config['REPEAT'] == True:
-                    pkt = [_data[:11], '', _data[15:]]
-                    for _peer in self._peers:
-                        if _peer != _peer_id:
-                            pkt[1] = _peer
-                            self.transport.write(b''.join(pkt), self._peers[_peer]['SOCKADDR'])
-                            #logger.debug('(%s) Packet on TS%s from %s (%s) for destination ID %s repeated to peer: %s (%s) [Stream ID: %s]', self._system, _slot, self._peers[_peer_id]['CALLSIGN'], int_id(_peer_id), int_id(_dst_id), self._peers[_peer]['CALLSIGN'], int_id(_peer), int_id(_stream_id))
-
+        # (handled under RPTC), and hand the packet to its handler in the dispatch table
+        _handler = self._commands.get(_data[:4])
+        if _handler:
+            _handler(_data, _sockaddr)
+        else:
+            logger.error('(%s) Unrecognized command. Raw HBP PDU: %s', self._system, ahex(_data))
 
-                # Userland actions -- typically this is the function you subclass for an application
+    # DMRData -- encapsulated DMR data frame
+    def master_dmrd(self, _data, _sockaddr):
+        _peer_id = _data[11:15]
+        if self._peer_socks.get(_sockaddr) == _peer_id:
+            _seq = _data[4]
+            _rf_src = _data[5:8]
+            _dst_id = _data[8:11]
+            # data, 1=voice header, 2=voice terminator; voice, 0=burst A ... 5=burst F
+            _slot, _call_type, _frame_type, _dtype_vseq = HEADER_BITS[_data[15]]
+            _stream_id = _data[16:20]
+            #logger.debug('(%s) DMRD - Seqence: %s, RF Source: %s, Destination ID: %s', self._system, _seq, int_id(_rf_src), int_id(_dst_id))
+            # ACL Processing -- only the first packet of a stream runs the ACLs, the rest use the cached verdict
+            if not self.acl_cached(_rf_src, _dst_id, _slot, _stream_id):
+                return
+
+            # The basic purpose of a master is to repeat to the peers
+            if self._config['REPEAT'] == True:
+                fanout(self.transport.write, _data, self._peer_list, _peer_id)
+                #logger.debug('(%s) Packet on TS%s from %s (%s) for destination ID %s repeated to peer: %s (%s) [Stream ID: %s]', self._system, _slot, self._peers[_peer_id]['CALLSIGN'], int_id(_peer_id), int_id(_dst_id), self._peers[_peer]['CALLSIGN'], int_id(_peer), int_id(_stream_id))
+
+
+            # Userland actions -- typically this is the function you subclass for an application
+            if self.dmrd_frame_received:
+                self.dmrd_frame_received(dmrdFrame(_data))
+            else:
                 self.dmrd_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data)
 
-        elif _command == RPTL:    # RPTLogin -- a repeater wants to login
-            _peer_id = _data[4:8]
-            # Check to see if we've reached the maximum number of allowed peers
-            if len(self._peers) < self._config['MAX_PEERS']:
-                # Check for valid Radio ID
-                if acl_check(_peer_id, self._CONFIG['GLOBAL']['REG_ACL']) and acl_check(_peer_id, self._config['REG_ACL']):
-                    # Build the configuration data strcuture for the peer
-                    self._peers.update({_peer_id: {
-                        'CONNECTION': 'RPTL-RECEIVED',
-                        'CONNECTED': time(),
-                        'PINGS_RECEIVED': 0,
-                        'LAST_PING': time(),
-                        'SOCKADDR': _sockaddr,
-                        'IP': _sockaddr[0],
-                        'PORT': _sockaddr[1],
-                        'SALT': randint(0,0xFFFFFFFF),
-                        'RADIO_ID': str(int(ahex(_peer_id), 16)),
-                        'CALLSIGN': '',
-                        'RX_FREQ': '',
-                        'TX_FREQ': '',
-                        'TX_POWER': '',
-                        'COLORCODE': '',
-                        'LATITUDE': '',
-                        'LONGITUDE': '',
-                        'HEIGHT': '',
-                        'LOCATION': '',
-                        'DESCRIPTION': '',
-                        'SLOTS': '',
-                        'URL': '',
-                        'SOFTWARE_ID': '',
-                        'PACKAGE_ID': '',
-                    }})
-                    logger.info('(%s) Repeater Logging in with Radio ID: %s, %s:%s', self._system, int_id(_peer_id), _sockaddr[0], _sockaddr[1])
-                    _salt_str = bytes_4(self._peers[_peer_id]['SALT'])
-                    self.send_peer(_peer_id, b''.join([RPTACK, _salt_str]))
-                    self._peers[_peer_id]['CONNECTION'] = 'CHALLENGE_SENT'
-                    logger.info('(%s) Sent Challenge Response to %s for login: %s', self._system, int_id(_peer_id), self._peers[_peer_id]['SALT'])
-                else:
-                    self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
-                    logger.warning('(%s) Invalid Login from %s Radio ID: %s Denied by Registation ACL', self._system, _sockaddr[0], int_id(_peer_id))
+    # RPTLogin -- a repeater wants to login
+    def master_rptl(self, _data, _sockaddr):
+        _peer_id = _data[4:8]
+        # Check to see if we've reached the maximum number of allowed peers
+        if len(self._peers) < self._config['MAX_PEERS']:
+            # Check for valid Radio ID
+            if acl_check(_peer_id, self._CONFIG['GLOBAL']['REG_ACL']) and acl_check(_peer_id, self._config['REG_ACL']):
+                # Build the configuration data strcuture for the peer -- a peer logging in again starts over
+                self.peer_disconnected(_peer_id)
+                self._peers.update({_peer_id: {
+                    'CONNECTION': 'RPTL-RECEIVED',
+                    'CONNECTED': time(),
+                    'PINGS_RECEIVED': 0,
+                    'LAST_PING': time(),
+                    'SOCKADDR': _sockaddr,
+                    'IP': _sockaddr[0],
+                    'PORT': _sockaddr[1],
+                    'SALT': randint(0,0xFFFFFFFF),
+                    'RADIO_ID': str(int(ahex(_peer_id), 16)),
+                    'CALLSIGN': '',
+                    'RX_FREQ': '',
+                    'TX_FREQ': '',
+                    'TX_POWER': '',
+                    'COLORCODE': '',
+                    'LATITUDE': '',
+                    'LONGITUDE': '',
+                    'HEIGHT': '',
+                    'LOCATION': '',
+                    'DESCRIPTION': '',
+                    'SLOTS': '',
+                    'URL': '',
+                    'SOFTWARE_ID': '',
+                    'PACKAGE_ID': '',
+                }})
+                logger.info('(%s) Repeater Logging in with Radio ID: %s, %s:%s', self._system, int_id(_peer_id), _sockaddr[0], _sockaddr[1])
+                _salt_str = bytes_4(self._peers[_peer_id]['SALT'])
+                self.send_peer(_peer_id, b''.join([RPTACK, _salt_str]))
+                self._peers[_peer_id]['CONNECTION'] = 'CHALLENGE_SENT'
+                logger.info('(%s) Sent Challenge Response to %s for login: %s', self._system, int_id(_peer_id), self._peers[_peer_id]['SALT'])
             else:
                 self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
-                logger.warning('(%s) Registration denied from Radio ID: %s Maximum number of peers exceeded', self._system, int_id(_peer_id))
-
-        elif _command == RPTK:    # Repeater has answered our login challenge
-            _peer_id = _data[4:8]
-            if _peer_id in self._peers \
-                        and self._peers[_peer_id]['CONNECTION'] == 'CHALLENGE_SENT' \
-                        and self._peers[_peer_id]['SOCKADDR'] == _sockaddr:
-                _this_peer = self._peers[_peer_id]
-                _this_peer['LAST_PING'] = time()
-                _sent_hash = _data[8:]
-                _salt_str = bytes_4(_this_peer['SALT'])
-                _calc_hash = bhex(sha256(_salt_str+self._config['PASSPHRASE']).hexdigest())
-                if _sent_hash == _calc_hash:
-                    _this_peer['CONNECTION'] = 'WAITING_CONFIG'
-                    self.send_peer(_peer_id, b''.join([RPTACK, _peer_id]))
-                    logger.info('(%s) Peer %s has completed the login exchange successfully', self._system, _this_peer['RADIO_ID'])
-                else:
-                    logger.info('(%s) Peer %s has FAILED the login exchange successfully', self._system, _this_peer['RADIO_ID'])
-                    self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
-                    del self._peers[_peer_id]
+                logger.warning('(%s) Invalid Login from %s Radio ID: %s Denied by Registation ACL', self._system, _sockaddr[0], int_id(_peer_id))
+        else:
+            self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
+            logger.warning('(%s) Registration denied from Radio ID: %s Maximum number of peers exceeded', self._system, int_id(_peer_id))
+
+    # Repeater has answered our login challenge
+    def master_rptk(self, _data, _sockaddr):
+        _peer_id = _data[4:8]
+        if _peer_id in self._peers \
+                    and self._peers[_peer_id]['CONNECTION'] == 'CHALLENGE_SENT' \
+                    and self._peers[_peer_id]['SOCKADDR'] == _sockaddr:
+            _this_peer = self._peers[_peer_id]
+            _this_peer['LAST_PING'] = time()
+            _sent_hash = _data[8:]
+            _salt_str = bytes_4(_this_peer['SALT'])
+            _calc_hash = bhex(sha256(_salt_str+self._config['PASSPHRASE']).hexdigest())
+            if _sent_hash == _calc_hash:
+                _this_peer['CONNECTION'] = 'WAITING_CONFIG'
+                self.send_peer(_peer_id, b''.join([RPTACK, _peer_id]))
+                logger.info('(%s) Peer %s has completed the login exchange successfully', self._system, _this_peer['RADIO_ID'])
             else:
+                logger.info('(%s) Peer %s has FAILED the login exchange successfully', self._system, _this_peer['RADIO_ID'])
                 self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
-                logger.warning('(%s) Login challenge from Radio ID that has not logged in: %s', self._system, int_id(_peer_id))
-
-        elif _command == RPTC:    # Repeater is sending it's configuraiton OR disconnecting
-            if _data[:5] == RPTCL:    # Disconnect command
-                _peer_id = _data[5:9]
-                if _peer_id in self._peers \
-                            and self._peers[_peer_id]['CONNECTION'] == 'YES' \
-                            and self._peers[_peer_id]['SOCKADDR'] == _sockaddr:
-                    logger.info('(%s) Peer is closing down: %s (%s)', self._system, self._peers[_peer_id]['CALLSIGN'], int_id(_peer_id))
-                    self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
-                    del self._peers[_peer_id]
-
-            else:
-                _peer_id = _data[4:8]      # Configure Command
-                if _peer_id in self._peers \
-                            and self._peers[_peer_id]['CONNECTION'] == 'WAITING_CONFIG' \
-                            and self._peers[_peer_id]['SOCKADDR'] == _sockaddr:
-                    _this_peer = self._peers[_peer_id]
-                    _this_peer['CONNECTION'] = 'YES'
-                    _this_peer['CONNECTED'] = time()
-                    _this_peer['LAST_PING'] = time()
-                    _this_peer['CALLSIGN'] = _data[8:16]
-                    _this_peer['RX_FREQ'] = _data[16:25]
-                    _this_peer['TX_FREQ'] =  _data[25:34]
-                    _this_peer['TX_POWER'] = _data[34:36]
-                    _this_peer['COLORCODE'] = _data[36:38]
-                    _this_peer['LATITUDE'] = _data[38:46]
-                    _this_peer['LONGITUDE'] = _data[46:55]
-                    _this_peer['HEIGHT'] = _data[55:58]
-                    _this_peer['LOCATION'] = _data[58:78]
-                    _this_peer['DESCRIPTION'] = _data[78:97]
-                    _this_peer['SLOTS'] = _data[97:98]
-                    _this_peer['URL'] = _data[98:222]
-                    _this_peer['SOFTWARE_ID'] = _data[222:262]
-                    _this_peer['PACKAGE_ID'] = _data[262:302]
-
-                    self.send_peer(_peer_id, b''.join([RPTACK, _peer_id]))
-                    logger.info('(%s) Peer %s (%s) has sent repeater configuration', self._system, _this_peer['CALLSIGN'], _this_peer['RADIO_ID'])
-                else:
-                    self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
-                    logger.warning('(%s) Peer info from Radio ID that has not logged in: %s', self._system, int_id(_peer_id))
-
-        elif _command == RPTP:    # RPTPing -- peer is pinging us
-                _peer_id = _data[7:11]
-                if _peer_id in self._peers \
-                            and self._peers[_peer_id]['CONNECTION'] == "YES" \
-                            and self._peers[_peer_id]['SOCKADDR'] == _sockaddr:
-                    self._peers[_peer_id]['PINGS_RECEIVED'] += 1
-                    self._peers[_peer_id]['LAST_PING'] = time()
-                    self.send_peer(_peer_id, b''.join([MSTPONG, _peer_id]))
-                    logger.debug('(%s) Received and answered RPTPING from peer %s (%s)', self._system, self._peers[_peer_id]['CALLSIGN'], int_id(_peer_id))
-                else:
-                    self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
-                    logger.warning('(%s) Ping from Radio ID that is not logged in: %s', self._system, int_id(_peer_id))
-
-        elif _command == RPTO:
-            _peer_id = _data[4:8]
-            if _peer_id in self._peers \
-                        and self._peers[_peer_id]['CONNECTION'] == 'YES' \
-                        and self._peers[_peer_id]['SOCKADDR'] == _sockaddr:
-                logger.info('(%s) Peer %s (%s) has send options: %s', self._system, self._peers[_peer_id]['CALLSIGN'], int_id(_peer_id), _data[8:])
-                self.transport.write(b''.join([RPTACK, _peer_id]), _sockaddr)
-
-        elif _command == DMRA:
-            _peer_id = _data[4:8]
-            logger.info('(%s) Recieved DMR Talker Alias from peer %s, subscriber %s', self._system, self._peers[_peer_id]['CALLSIGN'], int_id(_rf_src))
-
+                self.peer_disconnected(_peer_id)
+                del self._peers[_peer_id]
         else:
-            logger.error('(%s) Unrecognized command. Raw HBP PDU: %s', self._system, ahex(_data))
+            self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
+            logger.warning('(%s) Login challenge from Radio ID that has not logged in: %s', self._system, int_id(_peer_id))
+
+    # Repeater is sending it's configuraiton OR disconnecting (RPTCL shares the first four bytes)
+    def master_rptc(self, _data, _sockaddr):
+        if _data[:5] == RPTCL:
+            self.master_rptcl(_data, _sockaddr)
+            return
+
+        _peer_id = _data[4:8]      # Configure Command
+        if _peer_id in self._peers \
+                    and self._peers[_peer_id]['CONNECTION'] == 'WAITING_CONFIG' \
+                    and self._peers[_peer_id]['SOCKADDR'] == _sockaddr:
+            _this_peer = self._peers[_peer_id]
+            _this_peer['CONNECTION'] = 'YES'
+            _this_peer['CONNECTED'] = time()
+            _this_peer['LAST_PING'] = time()
+            _this_peer['CALLSIGN'] = _data[8:16]
+            _this_peer['RX_FREQ'] = _data[16:25]
+            _this_peer['TX_FREQ'] =  _data[25:34]
+            _this_peer['TX_POWER'] = _data[34:36]
+            _this_peer['COLORCODE'] = _data[36:38]
+            _this_peer['LATITUDE'] = _data[38:46]
+            _this_peer['LONGITUDE'] = _data[46:55]
+            _this_peer['HEIGHT'] = _data[55:58]
+            _this_peer['LOCATION'] = _data[58:78]
+            _this_peer['DESCRIPTION'] = _data[78:97]
+            _this_peer['SLOTS'] = _data[97:98]
+            _this_peer['URL'] = _data[98:222]
+            _this_peer['SOFTWARE_ID'] = _data[222:262]
+            _this_peer['PACKAGE_ID'] = _data[262:302]
+
+            self.peer_connected(_peer_id)
+            self.send_peer(_peer_id, b''.join([RPTACK, _peer_id]))
+            logger.info('(%s) Peer %s (%s) has sent repeater configuration', self._system, _this_peer['CALLSIGN'], _this_peer['RADIO_ID'])
+        else:
+            self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
+            logger.warning('(%s) Peer info from Radio ID that has not logged in: %s', self._system, int_id(_peer_id))
+
+    # Disconnect command -- reached through master_rptc
+    def master_rptcl(self, _data, _sockaddr):
+        _peer_id = _data[5:9]
+        if self._peer_socks.get(_sockaddr) == _peer_id:
+            logger.info('(%s) Peer is closing down: %s (%s)', self._system, self._peers[_peer_id]['CALLSIGN'], int_id(_peer_id))
+            self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
+            self.peer_disconnected(_peer_id)
+            del self._peers[_peer_id]
+
+    # RPTPing -- peer is pinging us
+    def master_rptp(self, _data, _sockaddr):
+        _peer_id = _data[7:11]
+        if self._peer_socks.get(_sockaddr) == _peer_id:
+            self._peers[_peer_id]['PINGS_RECEIVED'] += 1
+            self._peers[_peer_id]['LAST_PING'] = time()
+            self.send_peer(_peer_id, b''.join([MSTPONG, _peer_id]))
+            logger.debug('(%s) Received and answered RPTPING from peer %s (%s)', self._system, self._peers[_peer_id]['CALLSIGN'], int_id(_peer_id))
+        else:
+            self.transport.write(b''.join([MSTNAK, _peer_id]), _sockaddr)
+            logger.warning('(%s) Ping from Radio ID that is not logged in: %s', self._system, int_id(_peer_id))
+
+    # RPTOptions -- peer is sending us its options
+    def master_rpto(self, _data, _sockaddr):
+        _peer_id = _data[4:8]
+        if self._peer_socks.get(_sockaddr) == _peer_id:
+            logger.info('(%s) Peer %s (%s) has send options: %s', self._system, self._peers[_peer_id]['CALLSIGN'], int_id(_peer_id), _data[8:])
+            self.transport.write(b''.join([RPTACK, _peer_id]), _sockaddr)
+
+    # DMR Talker Alias -- the subscriber is in the same place as in a DMRD packet
+    def master_dmra(self, _data, _sockaddr):
+        _peer_id = _data[4:8]
+        if self._peer_socks.get(_sockaddr) == _peer_id:
+            _rf_src = _data[8:11]
+            logger.info('(%s) Recieved DMR Talker Alias from peer %s, subscriber %s', self._system, self._peers[_peer_id]['CALLSIGN'], int_id(_rf_src))
 
     # Aliased in __init__ to datagramReceived if system is a peer
     def peer_datagramReceived(self, _data, _sockaddr):
@@ -541,162 +636,174 @@ class HBSYSTEM(DatagramProtocol):
 
         # Validate that we receveived this packet from the master - security check!
         if self._config['MASTER_SOCKADDR'] == _sockaddr:
-            # Extract the command, which is various length, but only 4 significant characters
-            _command = _data[:4]
-            if   _command == DMRD:    # DMRData -- encapsulated DMR data frame
+            # Extract the command, which is various length, but only 4 significant characters,
+            # and hand the packet to its handler in the dispatch table
+            _handler = self._commands.get(_data[:4])
+            if _handler:
+                _handler(_data, _sockaddr)
+            else:
+                logger.error('(%s) Received an invalid command in packet: %s', self._system, ahex(_data))
 
-                _peer_id = _data[11:15]
-                if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
-                    _seq = _data[4:5]
-                    _rf_src = _data[5:8]
-                    _dst_id = _data[8:11]
-                    _bits = _data[15]
-                    _slot = 2 if (_bits & 0x80) else 1
-                    #_call_type = 'unit' if (_bits & 0x40) else 'group'
-                    if _bits & 0x40:
-                        _call_type = 'unit'
-                    elif (_bits & 0x23) == 0x23:
-                        _call_type = 'vcsbk'
-                    else:
-                        _call_type = 'group'
-                    _frame_type = (_bits & 0x30) >> 4
-                    _dtype_vseq = (_bits & 0xF) # data, 1=voice header, 2=voice terminator; voice, 0=burst A ... 5=burst F
-                    _stream_id = _data[16:20]
-                    #logger.debug('(%s) DMRD - Sequence: %s, RF Source: %s, Destination ID: %s', self._system, int_id(_seq), int_id(_rf_src), int_id(_dst_id))
-
-                    # ACL Processing
-                    if self._CONFIG['GLOBAL']['USE_ACL']:
-                        if not acl_check(_rf_src, self._CONFIG['GLOBAL']['SUB_ACL']):
-                            if self._laststrid[_slot] != _stream_id:
-                                logger.info('(%s) CALL DROPPED WITH STREAM ID %s FROM SUBSCRIBER %s BY GLOBAL ACL', self._system, int_id(_stream_id), int_id(_rf_src))
-                                self._laststrid[_slot] = _stream_id
-                            return
-                        if _slot == 1 and not acl_check(_dst_id, self._CONFIG['GLOBAL']['TG1_ACL']):
-                            if self._laststrid[_slot] != _stream_id:
-                                logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY GLOBAL TS1 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
-                                self._laststrid[_slot] = _stream_id
-                            return
-                        if _slot == 2 and not acl_check(_dst_id, self._CONFIG['GLOBAL']['TG2_ACL']):
-                            if self._laststrid[_slot] != _stream_id:
-                                logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY GLOBAL TS2 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
-                                self._laststrid[_slot] = _stream_id
-                            return
-                    if self._config['USE_ACL']:
-                        if not acl_check(_rf_src, self._config['SUB_ACL']):
-                            if self._laststrid[_slot] != _stream_id:
-                                logger.info('(%s) CALL DROPPED WITH STREAM ID %s FROM SUBSCRIBER %s BY SYSTEM ACL', self._system, int_id(_stream_id), int_id(_rf_src))
-                                self._laststrid[_slot] = _stream_id
-                            return
-                        if _slot == 1 and not acl_check(_dst_id, self._config['TG1_ACL']):
-                            if self._laststrid[_slot] != _stream_id:
-                                logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY SYSTEM TS1 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
-                                self._laststrid[_slot] = _stream_id
-                            return
-                        if _slot == 2 and not acl_check(_dst_id, self._config['TG2_ACL']):
-                            if self._laststrid[_slot] != _stream_id:
-                                logger.info('(%s) CALL DROPPED WITH STREAM ID %s ON TGID %s BY SYSTEM TS2 ACL', self._system, int_id(_stream_id), int_id(_dst_id))
-                                self._laststrid[_slot] = _stream_id
-                            return
-
-
-                    # Userland actions -- typically this is the function you subclass for an application
-                    self.dmrd_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data)
+    # DMRData -- encapsulated DMR data frame
+    def peer_dmrd(self, _data, _sockaddr):
+        _peer_id = _data[11:15]
+        if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
+            _seq = _data[4]
+            _rf_src = _data[5:8]
+            _dst_id = _data[8:11]
+            # data, 1=voice header, 2=voice terminator; voice, 0=burst A ... 5=burst F
+            _slot, _call_type, _frame_type, _dtype_vseq = HEADER_BITS[_data[15]]
+            _stream_id = _data[16:20]
+            #logger.debug('(%s) DMRD - Sequence: %s, RF Source: %s, Destination ID: %s', self._system, int_id(_seq), int_id(_rf_src), int_id(_dst_id))
+
+            # ACL Processing -- only the first packet of a stream runs the ACLs, the rest use the cached verdict
+            if not self.acl_cached(_rf_src, _dst_id, _slot, _stream_id):
+                return
+
+            # Userland actions -- typically this is the function you subclass for an application
+            if self.dmrd_frame_received:
+                self.dmrd_frame_received(dmrdFrame(_data))
+            else:
+                self.dmrd_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data)
 
-            elif _command == MSTN:    # Actually MSTNAK -- a NACK from the master
-                _peer_id = _data[6:10]
-                if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
-                    logger.warning('(%s) MSTNAK Received. Resetting connection to the Master.', self._system)
-                    self._stats['CONNECTION'] = 'NO' # Disconnect ourselves and re-register
+    # MSTN is only ever MSTNAK -- a NACK from the master
+    def peer_mstn(self, _data, _sockaddr):
+        if _data[:6] == MSTNAK:
+            self.peer_mstnak(_data, _sockaddr)
+        else:
+            logger.error('(%s) Received an invalid command in packet: %s', self._system, ahex(_data))
+
+    # MSTNAK -- reached through peer_mstn
+    def peer_mstnak(self, _data, _sockaddr):
+        _peer_id = _data[6:10]
+        if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
+            logger.warning('(%s) MSTNAK Received. Resetting connection to the Master.', self._system)
+            self._stats['CONNECTION'] = 'NO' # Disconnect ourselves and re-register
+            self._stats['CONNECTED'] = time()
+
+    # Actually RPTACK -- an ACK from the master
+    def peer_rpta(self, _data, _sockaddr):
+        # Depending on the state, an RPTACK means different things, in each clause, we check and/or set the state
+        if self._stats['CONNECTION'] == 'RPTL_SENT': # If we've sent a login request...
+            _login_int32 = _data[6:10]
+            logger.info('(%s) Repeater Login ACK Received with 32bit ID: %s', self._system, int_id(_login_int32))
+            _pass_hash = sha256(b''.join([_login_int32, self._config['PASSPHRASE']])).hexdigest()
+            _pass_hash = bhex(_pass_hash)
+            self.send_master(b''.join([RPTK, self._config['RADIO_ID'], _pass_hash]))
+            self._stats['CONNECTION'] = 'AUTHENTICATED'
+
+        elif self._stats['CONNECTION'] == 'AUTHENTICATED': # If we've sent the login challenge...
+            _peer_id = _data[6:10]
+            if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
+                logger.info('(%s) Repeater Authentication Accepted', self._system)
+                _config_packet =  b''.join([\
+                                      self._config['RADIO_ID'],\
+                                      self._config['CALLSIGN'],\
+                                      self._config['RX_FREQ'],\
+                                      self._config['TX_FREQ'],\
+                                      self._config['TX_POWER'],\
+                                      self._config['COLORCODE'],\
+                                      self._config['LATITUDE'],\
+                                      self._config['LONGITUDE'],\
+                                      self._config['HEIGHT'],\
+                                      self._config['LOCATION'],\
+                                      self._config['DESCRIPTION'],\
+                                      self._config['SLOTS'],\
+                                      self._config['URL'],\
+                                      self._config['SOFTWARE_ID'],\
+                                      self._config['PACKAGE_ID']\
+                                  ])
+
+                self.send_master(b''.join([RPTC, _config_packet]))
+                self._stats['CONNECTION'] = 'CONFIG-SENT'
+                logger.info('(%s) Repeater Configuration Sent', self._system)
+            else:
+                self._stats['CONNECTION'] = 'NO'
+                logger.error('(%s) Master ACK Contained wrong ID - Connection Reset', self._system)
+
+        elif self._stats['CONNECTION'] == 'CONFIG-SENT': # If we've sent out configuration to the master
+            _peer_id = _data[6:10]
+            if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
+                logger.info('(%s) Repeater Configuration Accepted', self._system)
+                if self._config['OPTIONS']:
+                    self.send_master(b''.join([RPTO, self._config['RADIO_ID'], self._config['OPTIONS']]))
+                    self._stats['CONNECTION'] = 'OPTIONS-SENT'
+                    logger.info('(%s) Sent options: (%s)', self._system, self._config['OPTIONS'])
+                else:
+                    self._stats['CONNECTION'] = 'YES'
                     self._stats['CONNECTED'] = time()
+                    logger.info('(%s) Connection to Master Completed', self._system)
 
-            elif _command == RPTA:    # Actually RPTACK -- an ACK from the master
-                # Depending on the state, an RPTACK means different things, in each clause, we check and/or set the state
-                if self._stats['CONNECTION'] == 'RPTL_SENT': # If we've sent a login request...
-                    _login_int32 = _data[6:10]
-                    logger.info('(%s) Repeater Login ACK Received with 32bit ID: %s', self._system, int_id(_login_int32))
-                    _pass_hash = sha256(b''.join([_login_int32, self._config['PASSPHRASE']])).hexdigest()
-                    _pass_hash = bhex(_pass_hash)
-                    self.send_master(b''.join([RPTK, self._config['RADIO_ID'], _pass_hash]))
-                    self._stats['CONNECTION'] = 'AUTHENTICATED'
-
-                elif self._stats['CONNECTION'] == 'AUTHENTICATED': # If we've sent the login challenge...
-                    _peer_id = _data[6:10]
-                    if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
-                        logger.info('(%s) Repeater Authentication Accepted', self._system)
-                        _config_packet =  b''.join([\
-                                              self._config['RADIO_ID'],\
-                                              self._config['CALLSIGN'],\
-                                              self._config['RX_FREQ'],\
-                                              self._config['TX_FREQ'],\
-                                              self._config['TX_POWER'],\
-                                              self._config['COLORCODE'],\
-                                              self._config['LATITUDE'],\
-                                              self._config['LONGITUDE'],\
-                                              self._config['HEIGHT'],\
-                                              self._config['LOCATION'],\
-                                              self._config['DESCRIPTION'],\
-                                              self._config['SLOTS'],\
-                                              self._config['URL'],\
-                                              self._config['SOFTWARE_ID'],\
-                                              self._config['PACKAGE_ID']\
-                                          ])
-
-                        self.send_master(b''.join([RPTC, _config_packet]))
-                        self._stats['CONNECTION'] = 'CONFIG-SENT'
-                        logger.info('(%s) Repeater Configuration Sent', self._system)
-                    else:
-                        self._stats['CONNECTION'] = 'NO'
-                        logger.error('(%s) Master ACK Contained wrong ID - Connection Reset', self._system)
-
-                elif self._stats['CONNECTION'] == 'CONFIG-SENT': # If we've sent out configuration to the master
-                    _peer_id = _data[6:10]
-                    if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
-                        logger.info('(%s) Repeater Configuration Accepted', self._system)
-                        if self._config['OPTIONS']:
-                            self.send_master(b''.join([RPTO, self._config['RADIO_ID'], self._config['OPTIONS']]))
-                            self._stats['CONNECTION'] = 'OPTIONS-SENT'
-                            logger.info('(%s) Sent options: (%s)', self._system, self._config['OPTIONS'])
-                        else:
-                            self._stats['CONNECTION'] = 'YES'
-                            self._stats['CONNECTED'] = time()
-                            logger.info('(%s) Connection to Master Completed', self._system)
-
-                            # If we are an XLX, send the XLX module request here.
-                            if self._config['MODE'] == 'XLXPEER':
-                                self.send_xlxmaster(self._config['RADIO_ID'], int(4000), self._config['MASTER_SOCKADDR'])
-                                self.send_xlxmaster(self._config['RADIO_ID'], self._config['XLXMODULE'], self._config['MASTER_SOCKADDR'])
-                                logger.info('(%s) Sending XLX Module request', self._system)
-                    else:
-                        self._stats['CONNECTION'] = 'NO'
-                        logger.error('(%s) Master ACK Contained wrong ID - Connection Reset', self._system)
-
-                elif self._stats['CONNECTION'] == 'OPTIONS-SENT': # If we've sent out options to the master
-                    _peer_id = _data[6:10]
-                    if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
-                        logger.info('(%s) Repeater Options Accepted', self._system)
-                        self._stats['CONNECTION'] = 'YES'
-                        self._stats['CONNECTED'] = time()
-                        logger.info('(%s) Connection to Master Completed with options', self._system)
-                    else:
-                        self._stats['CONNECTION'] = 'NO'
-                        logger.error('(%s) Master ACK Contained wrong ID - Connection Reset', self._system)
-
-            elif _command == MSTP:    # Actually MSTPONG -- a reply to RPTPING (send by peer)
-                _peer_id = _data[7:11]
-                if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
-                    self._stats['PING_OUTSTANDING'] = False
-                    self._stats['NUM_OUTSTANDING'] = 0
-                    self._stats['PINGS_ACKD'] += 1
-                    logger.debug('(%s) MSTPONG Received. Pongs Since Connected: %s', self._system, self._stats['PINGS_ACKD'])
-
-            elif _command == MSTC:    # Actually MSTCL -- notify us the master is closing down
-                _peer_id = _data[5:9]
-                if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
-                    self._stats['CONNECTION'] = 'NO'
-                    logger.info('(%s) MSTCL Recieved', self._system)
-
+                    # If we are an XLX, send the XLX module request here.
+                    if self._config['MODE'] == 'XLXPEER':
+                        self.send_xlxmaster(self._config['RADIO_ID'], int(4000), self._config['MASTER_SOCKADDR'])
+                        self.send_xlxmaster(self._config['RADIO_ID'], self._config['XLXMODULE'], self._config['MASTER_SOCKADDR'])
+                        logger.info('(%s) Sending XLX Module request', self._system)
             else:
-                logger.error('(%s) Received an invalid command in packet: %s', self._system, ahex(_data))
+                self._stats['CONNECTION'] = 'NO'
+                logger.error('(%s) Master ACK Contained wrong ID - Connection Reset', self._system)
+
+        elif self._stats['CONNECTION'] == 'OPTIONS-SENT': # If we've sent out options to the master
+            _peer_id = _data[6:10]
+            if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
+                logger.info('(%s) Repeater Options Accepted', self._system)
+                self._stats['CONNECTION'] = 'YES'
+                self._stats['CONNECTED'] = time()
+                logger.info('(%s) Connection to Master Completed with options', self._system)
+            else:
+                self._stats['CONNECTION'] = 'NO'
+                logger.error('(%s) Master ACK Contained wrong ID - Connection Reset', self._system)
+
+    # Actually MSTPONG -- a reply to RPTPING (send by peer)
+    def peer_mstp(self, _data, _sockaddr):
+        _peer_id = _data[7:11]
+        if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
+            self._stats['PING_OUTSTANDING'] = False
+            self._stats['NUM_OUTSTANDING'] = 0
+            self._stats['PINGS_ACKD'] += 1
+            logger.debug('(%s) MSTPONG Received. Pongs Since Connected: %s', self._system, self._stats['PINGS_ACKD'])
+
+    # Actually MSTCL -- notify us the master is closing down
+    def peer_mstc(self, _data, _sockaddr):
+        _peer_id = _data[5:9]
+        if self._config['LOOSE'] or _peer_id == self._config['RADIO_ID']: # Validate the Radio_ID unless using loose validation
+            self._stats['CONNECTION'] = 'NO'
+            logger.info('(%s) MSTCL Recieved', self._system)
+
+# Start listening for a system. With GLOBAL RECV_BATCH set, the port reads that many
+# datagrams at most per wakeup and keeps its counters in the system's RX_STATS. When
+# sharded, MASTER ports are shared by all workers and other systems live in worker 0.
+def listen_system(_config, _system, _protocol):
+    _sys_config = _config['SYSTEMS'][_system]
+    if shard.WORKER is not None:
+        if _sys_config['MODE'] == 'MASTER':
+            return shard.listen_reuseport(_sys_config['PORT'], _protocol, _sys_config['IP'])
+        if shard.WORKER != 0:
+            _protocol.transport = shard.relayTransport(_system)
+            return None
+    if _config['GLOBAL']['RECV_BATCH'] > 0:
+        _sys_config['RX_STATS'] = rx_stats()
+        _port = batchPort(_sys_config['PORT'], _protocol, _sys_config['IP'], _config['GLOBAL']['RECV_BATCH'], _sys_config['RX_STATS'], reactor)
+        _port.startListening()
+        return _port
+    return reactor.listenUDP(_sys_config['PORT'], _protocol, interface=_sys_config['IP'])
+
+# What every worker does with messages from the other workers (see shard.py)
+def shard_handlers(_report_server):
+    def peer_up(_system, _peer_id, _peer):
+        systems[_system].remote_peer_up(_peer_id, _peer)
+
+    def peer_down(_system, _peer_id):
+        systems[_system].remote_peer_down(_peer_id)
+
+    def tx(_system, _datagram, _addr):
+        systems[_system].transport.write(_datagram, _addr)
+
+    def event(_data):
+        if _report_server:
+            _report_server.send_bridgeEvent(_data)
+
+    return {'PEER_UP': peer_up, 'PEER_DOWN': peer_down, 'TX': tx, 'EVENT': event}
 
 #
 # Socket-based reporting section
@@ -818,8 +925,14 @@ if __name__ == '__main__':
 
     peer_ids, subscriber_ids, talkgroup_ids = mk_aliases(CONFIG)
 
-    # INITIALIZE THE REPORTING LOOP
-    if CONFIG['REPORTS']['REPORT']:
+    # Start the other workers, if any, before anything listens
+    if CONFIG['GLOBAL']['WORKERS'] > 1:
+        shard.start_workers(CONFIG['GLOBAL']['WORKERS'])
+
+    # INITIALIZE THE REPORTING LOOP -- when sharded, worker 0 reports for all of them
+    if CONFIG['REPORTS']['REPORT'] and shard.WORKER:
+        report_server = shard.relayReport()
+    elif CONFIG['REPORTS']['REPORT']:
         report_server = config_reports(CONFIG, reportFactory)
     else:
         report_server = None
@@ -833,7 +946,10 @@ if __name__ == '__main__':
                 systems[system] = OPENBRIDGE(system, CONFIG, report_server)
             else:
                 systems[system] = HBSYSTEM(system, CONFIG, report_server)
-            reactor.listenUDP(CONFIG['SYSTEMS'][system]['PORT'], systems[system], interface=CONFIG['SYSTEMS'][system]['IP'])
+            listen_system(CONFIG, system, systems[system])
             logger.debug('(GLOBAL) %s instance created: %s, %s', CONFIG['SYSTEMS'][system]['MODE'], system, systems[system])
 
+    if shard.WORKER is not None:
+        shard.start_channel(shard_handlers(report_server))
+
     reactor.run()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016-2019 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+
+'''
+Encoded link control for bridged streams. Every stream a router sends to a
+target needs the BPTC encoded header and terminator LCs and the embedded LC
+fragments for its (options, TGID, source) LC, and the same few hundred LCs
+come round again and again as the same regulars key up on the same
+talkgroups. They are kept here, least recently used dropped first once
+LC_CACHE_SIZE are held, both as bitarrays (encode_lc) and as the lcsplice
+masks the routers rewrite bursts with (splice_lc).
+
+The bitarrays handed out are shared by everyone who asked for the same LC:
+slice or join them, never change them in place.
+'''
+
+from collections import OrderedDict
+
+from dmr_utils3 import bptc
+
+from const import LC_CACHE_SIZE
+from lcsplice import lc_masks
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016-2019 Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+# 9 byte LC: ((header LC, terminator LC, embedded LC), splice masks of the same), oldest use first
+_cache = OrderedDict()
+HITS = 0
+MISSES = 0
+
+
+def _entry(_lc):
+    global HITS, MISSES
+    _cached = _cache.get(_lc)
+    if _cached is None:
+        MISSES += 1
+        _lcs = (bptc.encode_header_lc(_lc), bptc.encode_terminator_lc(_lc), bptc.encode_emblc(_lc))
+        _cached = _cache[_lc] = (_lcs, lc_masks(*_lcs))
+        if len(_cache) > LC_CACHE_SIZE:
+            _cache.popitem(last=False)
+    else:
+        HITS += 1
+        _cache.move_to_end(_lc)
+    return _cached
+
+# Header, terminator and embedded LC bitarrays for a 9 byte LC, encoded only when not cached
+def encode_lc(_lc):
+    return _entry(_lc)[0]
+
+# The same as lcsplice masks: (header, terminator, {burst B-E as 1-4: embedded LC})
+def splice_lc(_lc):
+    return _entry(_lc)[1]
+
+# Counters for the reporting clients
+def lc_stats():
+    return {'SIZE': len(_cache), 'MAX_SIZE': LC_CACHE_SIZE, 'HITS': HITS, 'MISSES': MISSES}
+
+
+# Check cached LCs against fresh encodes and time a hit against encoding. Run this
+# file directly to use it.
+if __name__ == '__main__':
+    from os import urandom
+    from timeit import repeat
+
+    lcs = [b'\x00\x00\x20' + urandom(6) for i in range(LC_CACHE_SIZE + 10)]
+    for _lc in lcs:
+        encode_lc(_lc)
+    assert MISSES == len(lcs) and len(_cache) == LC_CACHE_SIZE
+    assert lcs[0] not in _cache and lcs[-1] in _cache
+    for _lc in lcs[-20:]:
+        _h_lc, _t_lc, _emb_lc = encode_lc(_lc)
+        assert _h_lc == bptc.encode_header_lc(_lc) and _t_lc == bptc.encode_terminator_lc(_lc) and _emb_lc == bptc.encode_emblc(_lc)
+        assert splice_lc(_lc) == lc_masks(_h_lc, _t_lc, _emb_lc)
+    assert HITS == 40
+    # A hit makes an LC the newest, so it outlives LCs used since it was cached
+    encode_lc(lcs[10])
+    encode_lc(urandom(9))
+    assert lcs[10] in _cache and lcs[11] not in _cache
+
+    lc = lcs[-1]
+    number = 20000
+    t_hit = min(repeat(lambda: encode_lc(lc), number=number, repeat=5)) / number
+    t_enc = min(repeat(lambda: (bptc.encode_header_lc(lc), bptc.encode_terminator_lc(lc), bptc.encode_emblc(lc)), number=number // 20, repeat=5)) / (number // 20)
+    print('encode: {:.2f} us   cached: {:.2f} us   {:.0f}x'.format(t_enc * 1e6, t_hit * 1e6, t_enc / t_hit))
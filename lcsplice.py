@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016-2019 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+
+'''
+Rewrite the link control in a 33 byte DMR burst without bitarrays. The payload
+is one 264 bit big-endian integer, so an encoded LC is kept as an integer with
+its bits already where they go, and a rewrite is a mask and an OR:
+
+    full LC (voice header, terminator)   bits 0:98 and 166:264, 98 each side
+                                         of the slot type and sync
+    embedded LC fragment (bursts B-E)    bits 116:148, between the EMB halves
+
+lc_masks() turns the bitarrays from bptc into those integers once per LC
+(lc_bitarrays() turns them back), splice_full() and splice_emb() put them into a payload. term_burst() makes a
+whole voice terminator burst out of a terminator LC.
+'''
+
+from bitarray import bitarray
+from dmr_utils3.const import SLOT_TYPE, BS_DATA_SYNC
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016-2019 Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+PAYLOAD_BYTES = 33
+PAYLOAD_BITS = PAYLOAD_BYTES * 8
+
+# Bit n of the payload (MSB of byte 0 is bit 0) is 1 << (PAYLOAD_BITS - 1 - n)
+def _bits(_start, _end):
+    return ((1 << (_end - _start)) - 1) << (PAYLOAD_BITS - _end)
+
+# What a rewrite keeps of the received payload
+KEEP_FULL = _bits(98, 166)
+KEEP_EMB = _bits(0, 116) | _bits(148, PAYLOAD_BITS)
+
+
+# Header, terminator and embedded LC bitarrays (as bptc encodes them) as splice masks:
+# (header, terminator, {burst: embedded LC fragment}) with burst 1-4 for B-E
+def lc_masks(_h_lc, _t_lc, _emb_lc):
+    _gap = bitarray(68, endian='big')
+    _gap.setall(0)
+    def full(_lc):
+        return int.from_bytes((_lc[0:98] + _gap + _lc[98:196]).tobytes(), 'big')
+    def emb(_fragment):
+        return int.from_bytes(_fragment.tobytes(), 'big') << (PAYLOAD_BITS - 148)
+    return full(_h_lc), full(_t_lc), {_burst: emb(_emb_lc[_burst]) for _burst in (1, 2, 3, 4)}
+
+# Splice masks back to the bitarrays lc_masks() was given
+def lc_bitarrays(_h_lc, _t_lc, _emb_lc):
+    def full(_lc):
+        _bits = bitarray(endian='big')
+        _bits.frombytes(_lc.to_bytes(PAYLOAD_BYTES, 'big'))
+        return _bits[0:98] + _bits[166:264]
+    def emb(_fragment):
+        _bits = bitarray(endian='big')
+        _bits.frombytes((_fragment >> (PAYLOAD_BITS - 148)).to_bytes(4, 'big'))
+        return _bits
+    return full(_h_lc), full(_t_lc), {_burst: emb(_emb_lc[_burst]) for _burst in (1, 2, 3, 4)}
+
+# Payload with a full LC (header or terminator mask) in place of the received one
+def splice_full(_payload, _lc):
+    return ((int.from_bytes(_payload, 'big') & KEEP_FULL) | _lc).to_bytes(PAYLOAD_BYTES, 'big')
+
+# Payload with an embedded LC fragment in place of the received one
+def splice_emb(_payload, _lc):
+    return ((int.from_bytes(_payload, 'big') & KEEP_EMB) | _lc).to_bytes(PAYLOAD_BYTES, 'big')
+
+# Slot type and (BS sourced) data sync of a voice terminator, in the bits a full LC leaves
+_TERM_SYNC = int((SLOT_TYPE['VOICE_LC_TERM'][:10] + BS_DATA_SYNC + SLOT_TYPE['VOICE_LC_TERM'][-10:]).to01(), 2) << (PAYLOAD_BITS - 166)
+
+# Voice terminator payload for a terminator LC mask
+def term_burst(_t_lc):
+    return (_t_lc | _TERM_SYNC).to_bytes(PAYLOAD_BYTES, 'big')
+
+
+# Check every splice against the bitarray rewrite bridge.py used to do, and time
+# both. Run this file directly to use it.
+if __name__ == '__main__':
+    from os import urandom
+    from timeit import repeat
+    from dmr_utils3 import bptc
+
+    def bitarray_full(_payload, _lc):
+        dmrbits = bitarray(endian='big')
+        dmrbits.frombytes(_payload)
+        return (_lc[0:98] + dmrbits[98:166] + _lc[98:197]).tobytes()
+
+    def bitarray_emb(_payload, _lc):
+        dmrbits = bitarray(endian='big')
+        dmrbits.frombytes(_payload)
+        return (dmrbits[0:116] + _lc + dmrbits[148:264]).tobytes()
+
+    for i in range(200):
+        lc = b'\x00\x00\x20' + urandom(6) if i % 2 else urandom(9)
+        h_lc, t_lc, emb_lc = bptc.encode_header_lc(lc), bptc.encode_terminator_lc(lc), bptc.encode_emblc(lc)
+        h_mask, t_mask, emb_masks = lc_masks(h_lc, t_lc, emb_lc)
+        assert lc_bitarrays(h_mask, t_mask, emb_masks) == (h_lc, t_lc, emb_lc)
+        payload = urandom(PAYLOAD_BYTES)
+        assert splice_full(payload, h_mask) == bitarray_full(payload, h_lc)
+        assert splice_full(payload, t_mask) == bitarray_full(payload, t_lc)
+        for burst in (1, 2, 3, 4):
+            assert splice_emb(payload, emb_masks[burst]) == bitarray_emb(payload, emb_lc[burst])
+        # The terminator mk_voice.py builds
+        assert term_burst(t_mask) == (t_lc[:98] + SLOT_TYPE['VOICE_LC_TERM'][:10] + BS_DATA_SYNC + SLOT_TYPE['VOICE_LC_TERM'][-10:] + t_lc[-98:]).tobytes()
+    print('200 LCs: splices match the bitarray rewrite, terminators match mk_voice.py')
+
+    number = 100000
+    print('{:>10} {:>14} {:>14} {:>9}'.format('', 'BITARRAY (us)', 'SPLICE (us)', 'SPEEDUP'))
+    for name, old, new, old_lc, new_lc in (('full LC', bitarray_full, splice_full, h_lc, h_mask), ('embedded', bitarray_emb, splice_emb, emb_lc[2], emb_masks[2])):
+        t_old = min(repeat(lambda: old(payload, old_lc), number=number, repeat=5)) / number
+        t_new = min(repeat(lambda: new(payload, new_lc), number=number, repeat=5)) / number
+        print('{:>10} {:>14.3f} {:>14.3f} {:>8.2f}x'.format(name, t_old * 1e6, t_new * 1e6, t_old / t_new))
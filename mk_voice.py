@@ -19,11 +19,12 @@
 ###############################################################################
 
 from bitarray import bitarray
-from dmr_utils3 import bptc, golay, qr
+from dmr_utils3 import golay, qr
 from dmr_utils3.utils import bytes_3, bytes_4
 from dmr_utils3.const import EMB, SLOT_TYPE, BS_VOICE_SYNC, BS_DATA_SYNC, LC_OPT
 from random import randint
 from voice_lib import words
+from lccache import encode_lc
 
 # Precalculated "dmrbits" (DMRD packet byte 15) -- just (slot << 7 | this value) and you're good to go!
 HEADBITS  = 0b00100001
@@ -46,14 +47,10 @@ def pkt_gen(_rf_src, _dst_id, _peer, _slot, _phrase):
     SDP = _rf_src + _dst_id + _peer
     LC = LC_OPT + _dst_id + _rf_src
     
-    HEAD_LC = bptc.encode_header_lc(LC)
+    HEAD_LC, TERM_LC, EMB_LC = encode_lc(LC)
     HEAD_LC = [HEAD_LC[:98], HEAD_LC[-98:]]
-    
-    TERM_LC = bptc.encode_terminator_lc(LC)
     TERM_LC = [TERM_LC[:98], TERM_LC[-98:]]
     
-    EMB_LC = bptc.encode_emblc(LC)
-    
     EMBED = []
     EMBED.append(                    BS_VOICE_SYNC                     )
     EMBED.append(EMB['BURST_B'][:8] +  EMB_LC[1]  + EMB['BURST_B'][-8:])
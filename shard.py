@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016-2019 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Multi-process MASTER sharding. With GLOBAL WORKERS greater than 1, hblink.py
+and bridge.py start that many copies of themselves. Every worker binds each
+MASTER port with SO_REUSEPORT, so the kernel hashes every peer's address to
+one worker, and that worker does the peer's login, pings and DMRD.
+
+Everything else has one home, worker 0: PEER, XLXPEER and OPENBRIDGE systems
+(a second login to an upstream master, or a second OpenBridge sender, would
+break them) and the reporting server. Other workers hand worker 0 whatever
+they transmit to those systems and whatever they report.
+
+Workers talk over UNIX datagram sockets in a private directory. A message is
+a pickled (TYPE, args) tuple, sent to all the other workers (publish) or to
+worker 0 (to_home). What is shared:
+
+    PEER_UP / PEER_DOWN   connected peers, so every worker can send to all of a
+                          master's peers and worker 0 can report them all
+    UNIT                  UNIT_MAP entries, sent when a unit starts a stream
+    BRIDGES               bridge ACTIVE/TIMER state after in-band signalling
+                          (timer expiry runs in every worker from that state)
+    TX / EVENT            transmits and report events relayed to worker 0
+
+Slot contention is still decided per worker: two calls arriving on different
+workers for the same target slot are not kept apart.
+'''
+
+import os
+import sys
+import pickle
+import socket
+import subprocess
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from twisted.internet.protocol import DatagramProtocol
+from twisted.internet import reactor
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016-2019 Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+# Configure the logging system
+import logging
+logger = logging.getLogger(__name__)
+
+# This process's worker number (None when not sharded), the number of workers, and
+# the directory holding the workers' channel sockets
+WORKER = None
+WORKERS = 1
+CHANNEL_DIR = None
+
+# Listening channel port of this worker
+_channel = None
+
+
+# Path of a worker's channel socket
+def channel_path(_worker):
+    return os.path.join(CHANNEL_DIR, 'worker-{}'.format(_worker))
+
+# True if systems of this mode run (listen, log in, maintain) in this process
+def is_home(_mode):
+    return WORKER is None or WORKER == 0 or _mode == 'MASTER'
+
+# Called once at start up, before anything listens. Worker 0 starts the others by
+# running the same command line with HBLINK_WORKER/HBLINK_CHANNEL set; they learn
+# who they are from those. Returns this process's worker number.
+def start_workers(_count):
+    global WORKER, WORKERS, CHANNEL_DIR
+    WORKERS = _count
+    if 'HBLINK_WORKER' in os.environ:
+        WORKER = int(os.environ['HBLINK_WORKER'])
+        CHANNEL_DIR = os.environ['HBLINK_CHANNEL']
+        return WORKER
+
+    WORKER = 0
+    CHANNEL_DIR = mkdtemp(prefix='hblink-')
+    reactor.addSystemEventTrigger('after', 'shutdown', rmtree, CHANNEL_DIR, True)
+    for _worker in range(1, _count):
+        _env = dict(os.environ, HBLINK_WORKER=str(_worker), HBLINK_CHANNEL=CHANNEL_DIR)
+        subprocess.Popen([sys.executable] + sys.argv, env=_env, preexec_fn=die_with_parent)
+        logger.info('(SHARD) Started worker %s of %s', _worker, _count)
+    return WORKER
+
+# Have the kernel send SIGTERM to a worker when worker 0 goes away (Linux)
+def die_with_parent():
+    try:
+        import ctypes, signal
+        ctypes.CDLL(None).prctl(1, signal.SIGTERM)     # PR_SET_PDEATHSIG
+    except (OSError, AttributeError):
+        pass
+
+# Bind a MASTER port shared with the other workers and hand it to Twisted
+def listen_reuseport(_port, _protocol, _interface):
+    _family = socket.AF_INET6 if ':' in _interface else socket.AF_INET
+    _sock = socket.socket(_family, socket.SOCK_DGRAM)
+    _sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    _sock.bind((_interface, _port))
+    _sock.setblocking(False)
+    _listener = reactor.adoptDatagramPort(_sock.fileno(), _family, _protocol)
+    _sock.close()
+    return _listener
+
+
+class channelProtocol(DatagramProtocol):
+    def __init__(self, _handlers):
+        self._handlers = _handlers
+
+    def datagramReceived(self, _data, _sockaddr):
+        _type, _args = pickle.loads(_data)
+        if _type in self._handlers:
+            self._handlers[_type](*_args)
+        else:
+            logger.error('(SHARD) Unknown message from another worker: %s', _type)
+
+# Start receiving messages from the other workers. _handlers maps a message TYPE to
+# the function called with its arguments.
+def start_channel(_handlers):
+    global _channel
+    _channel = reactor.listenUNIXDatagram(channel_path(WORKER), channelProtocol(_handlers), mode=0o600)
+
+def send(_worker, _message):
+    try:
+        _channel.write(_message, channel_path(_worker))
+    except OSError as err:
+        # The other worker isn't there (yet, or any more)
+        logger.debug('(SHARD) Message to worker %s not delivered: %s', _worker, err)
+
+# Send a message to every other worker. Does nothing when not sharded.
+def publish(_type, *_args):
+    if _channel:
+        _message = pickle.dumps((_type, _args), pickle.HIGHEST_PROTOCOL)
+        for _worker in range(WORKERS):
+            if _worker != WORKER:
+                send(_worker, _message)
+
+# Send a message to worker 0
+def to_home(_type, *_args):
+    send(0, pickle.dumps((_type, _args), pickle.HIGHEST_PROTOCOL))
+
+
+# Transport for a system whose home is worker 0: datagrams are relayed there
+class relayTransport:
+    def __init__(self, _system):
+        self._system = _system
+
+    def write(self, _datagram, _addr):
+        to_home('TX', self._system, bytes(_datagram), _addr)
+
+# Report server stand-in for workers other than 0: bridge events are relayed there.
+# Configuration, bridge and 'bridge updated' reports come from worker 0 itself.
+class relayReport:
+    def send_bridgeEvent(self, _data):
+        to_home('EVENT', _data)
+
+    def send_clients(self, _data):
+        pass
+
+    def send_config(self):
+        pass
+
+    def send_bridge(self):
+        pass
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016-2019 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+
+'''
+What a HomeBrew system's timeslot is receiving and sending: the STATUS of
+bridge.py's routerHBP and bridge_all.py's bridgeallSYSTEM, one per slot.
+It has the keys the dicts it replaces had, as attributes (STATUS[1].RX_TGID),
+and pickles as that dict so anything it is sent to does not need this
+module. The TX LCs are kept as lcsplice masks, and pickle as the bitarrays
+(or b'\x00' until a stream is bridged to the slot) the dict held.
+'''
+
+from time import time
+
+from const import HBPF_SLT_VTERM
+from lcsplice import lc_bitarrays
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016-2019 Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+# In TX_EMB_LC, 1-4 are burst B-E
+# The TX LCs are lcsplice masks, all zero bits until a stream is bridged to the slot
+# VERSION counts changes to the slot's RX state, which route plans use to know
+# a contention verdict against this slot still holds
+class slotState:
+    __slots__ = ('RX_START', 'TX_START', 'RX_LOSS', 'RX_SEQ', 'RX_RFS', 'TX_RFS', 'RX_PEER', 'TX_PEER',
+                 'RX_STREAM_ID', 'TX_STREAM_ID', 'RX_TGID', 'TX_TGID', 'RX_TIME', 'TX_TIME',
+                 'RX_TYPE', 'TX_TYPE', 'VERSION', 'RX_LC', 'RX_LC_HEAD', 'TX_H_LC', 'TX_T_LC', 'TX_EMB_LC')
+
+    def __init__(self):
+        _now = time()
+        self.RX_START = _now
+        self.TX_START = _now
+        self.RX_LOSS = 0
+        self.RX_SEQ = 0
+        self.RX_RFS = b'\x00'
+        self.TX_RFS = b'\x00'
+        self.RX_PEER = b'\x00'
+        self.TX_PEER = b'\x00'
+        self.RX_STREAM_ID = b'\x00'
+        self.TX_STREAM_ID = b'\x00'
+        self.RX_TGID = b'\x00\x00\x00'
+        self.TX_TGID = b'\x00\x00\x00'
+        self.RX_TIME = _now
+        self.TX_TIME = _now
+        self.RX_TYPE = HBPF_SLT_VTERM
+        self.TX_TYPE = HBPF_SLT_VTERM
+        self.VERSION = 0
+        self.RX_LC = b'\x00'
+        self.RX_LC_HEAD = False
+        self.TX_H_LC = 0
+        self.TX_T_LC = 0
+        self.TX_EMB_LC = {1: 0, 2: 0, 3: 0, 4: 0}
+
+    def as_dict(self):
+        return {_key: getattr(self, _key) for _key in self.__slots__}
+
+    # The dict, with the TX LCs as they were before they were masks
+    def __reduce__(self):
+        _dict = self.as_dict()
+        if self.TX_H_LC:
+            _dict['TX_H_LC'], _dict['TX_T_LC'], _dict['TX_EMB_LC'] = lc_bitarrays(self.TX_H_LC, self.TX_T_LC, self.TX_EMB_LC)
+        else:
+            _dict['TX_H_LC'] = _dict['TX_T_LC'] = b'\x00'
+            _dict['TX_EMB_LC'] = {1: b'\x00', 2: b'\x00', 3: b'\x00', 4: b'\x00'}
+        return (dict, (_dict,))
+
+
+# Both slots of a system
+def slot_status():
+    return {1: slotState(), 2: slotState()}
+
+
+# Check the pickle and compare the memory and access time of a slot with the dict
+# bridge.py used to keep. Run this file directly to use it.
+if __name__ == '__main__':
+    import pickle
+    import sys
+    from timeit import timeit
+
+    from dmr_utils3 import bptc
+    from lcsplice import lc_masks
+
+    status = slot_status()
+    status[2].TX_TGID = b'\x00\x00\x09'
+    _lc = b'\x00\x00\x20\x00\x00\x09\x00\x00\x01'
+    _lcs = bptc.encode_header_lc(_lc), bptc.encode_terminator_lc(_lc), bptc.encode_emblc(_lc)
+    status[2].TX_H_LC, status[2].TX_T_LC, status[2].TX_EMB_LC = lc_masks(*_lcs)
+    _copy = pickle.loads(pickle.dumps(status, protocol=2))
+    assert type(_copy[2]) is dict and _copy[2]['TX_TGID'] == b'\x00\x00\x09'
+    assert (_copy[2]['TX_H_LC'], _copy[2]['TX_T_LC'], _copy[2]['TX_EMB_LC']) == _lcs
+    assert _copy[1]['TX_H_LC'] == _copy[1]['TX_T_LC'] == b'\x00' and _copy[1]['TX_EMB_LC'] == {1: b'\x00', 2: b'\x00', 3: b'\x00', 4: b'\x00'}
+    assert set(_copy[1]) == set(slotState.__slots__)
+
+    _slot = status[1]
+    _old = _slot.as_dict()
+    _old['TX_EMB_LC'] = dict(_old['TX_EMB_LC'])
+    print('slot: dict {} bytes   slotState {} bytes'.format(sys.getsizeof(_old), sys.getsizeof(_slot)))
+    _n = 1000000
+    _dict = timeit("_old['TX_TGID'] == _old['RX_TGID'] and _old['TX_TIME']; _old['TX_TIME'] = 1.0", globals=globals(), number=_n)
+    _attr = timeit("_slot.TX_TGID == _slot.RX_TGID and _slot.TX_TIME; _slot.TX_TIME = 1.0", globals=globals(), number=_n)
+    print('3 reads and a write: dict {:.0f} ns   slotState {:.0f} ns'.format(_dict / _n * 1e9, _attr / _n * 1e9))
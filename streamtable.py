@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016-2019 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+
+'''
+The streams an OpenBridge system is receiving and sending, by stream ID. A
+stream stays in it until a few seconds after its last packet, so a flood of
+short or made up streams would otherwise grow it without limit: it holds
+OBP_STREAM_TABLE_SIZE at most, and the least recently heard is dropped to
+make room, with the system told so it can let go of whatever else it keeps
+for the stream. How full it has been and how many have been dropped are
+kept in the system's STREAM_STATS.
+'''
+
+from collections import OrderedDict
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016-2019 Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+# One stream. LC and LC_HEAD are only set for streams received (the LC the stream
+# carries, and whether it came from a voice header), H_LC, T_LC and EMB_LC for streams
+# sent (the target's lcsplice masks).
+class obpStream:
+    __slots__ = ('START', 'CONTENTION', 'RFS', 'TYPE', 'DST', 'ACTIVE', 'LAST', 'LC', 'LC_HEAD', 'H_LC', 'T_LC', 'EMB_LC')
+
+    def __init__(self, _start, _rfs, _type, _dst):
+        self.START = _start
+        self.CONTENTION = False
+        self.RFS = _rfs
+        self.TYPE = _type
+        self.DST = _dst
+        self.ACTIVE = True
+        self.LAST = _start
+
+
+# Least recently heard first. _evicted(stream ID, stream) is called with each stream
+# dropped to make room, once it is out of the table; _stats is the system's STREAM_STATS.
+class streamTable(OrderedDict):
+    def __init__(self, _size, _evicted, _stats):
+        OrderedDict.__init__(self)
+        self.size = _size
+        self._evicted = _evicted
+        self.stats = _stats
+        self.stats['MAX_SIZE'] = _size
+
+    def __setitem__(self, _stream_id, _stream):
+        OrderedDict.__setitem__(self, _stream_id, _stream)
+        if len(self) > self.size:
+            self.stats['EVICTIONS'] += 1
+            self._evicted(*self.popitem(last=False))
+        elif len(self) > self.stats['PEAK']:
+            self.stats['PEAK'] = len(self)
+
+    # A packet of the stream at _time: it is the most recently heard now
+    def seen(self, _stream_id, _time):
+        self[_stream_id].LAST = _time
+        self.move_to_end(_stream_id)
+
+
+def stream_stats():
+    return {'MAX_SIZE': 0, 'PEAK': 0, 'EVICTIONS': 0}
+
+
+# Check eviction order and the counters, and compare the memory a stream takes with
+# the dict bridge.py used to keep. Run this file directly to use it.
+if __name__ == '__main__':
+    import sys
+    from os import urandom
+
+    plans = {}
+    stats = stream_stats()
+    table = streamTable(100, lambda _stream_id, _stream: plans.pop(_stream_id, None), stats)
+    ids = [i.to_bytes(4, 'big') for i in range(150)]
+    for i, _stream_id in enumerate(ids[:100]):
+        table[_stream_id] = obpStream(i, b'\x00\x00\x01', 'GROUP', b'\x00\x00\x09')
+        plans[_stream_id] = 'plan'
+    assert stats == {'MAX_SIZE': 100, 'PEAK': 100, 'EVICTIONS': 0}
+    # Heard again, so the next newcomers push out ids[1] and ids[2] instead
+    table.seen(ids[0], 100)
+    table[ids[100]] = obpStream(101, b'\x00\x00\x01', 'GROUP', b'\x00\x00\x09')
+    table[ids[101]] = obpStream(102, b'\x00\x00\x01', 'GROUP', b'\x00\x00\x09')
+    assert ids[0] in table and table[ids[0]].LAST == 100
+    assert ids[1] not in table and ids[2] not in table and ids[1] not in plans and ids[3] in plans
+    assert stats == {'MAX_SIZE': 100, 'PEAK': 100, 'EVICTIONS': 2} and len(table) == 100
+    table.pop(ids[3])
+    assert len(table) == 99
+
+    _lcs = (1 << 200, 1 << 200, {1: 1, 2: 2, 3: 3, 4: 4})
+    old = {'START': 0.0, 'CONTENTION': False, 'RFS': urandom(3), 'TYPE': 'GROUP', 'DST': urandom(3), 'ACTIVE': True, 'LAST': 0.0}
+    old['H_LC'], old['T_LC'], old['EMB_LC'] = _lcs
+    new = obpStream(0.0, urandom(3), 'GROUP', urandom(3))
+    new.H_LC, new.T_LC, new.EMB_LC = _lcs
+    print('stream record: dict {} bytes   obpStream {} bytes'.format(sys.getsizeof(old), sys.getsizeof(new)))
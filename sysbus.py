@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016-2019 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Process-per-system routing for bridge.py. With GLOBAL SYSTEM_PROCESSES set to
+N, the process that was started becomes the router: it owns BRIDGES, UNIT_MAP,
+the routers' slot and stream state and the report server, but no sockets. It
+starts N system processes and deals the enabled systems out to them in config
+file order, so N equal to the number of systems gives each its own process.
+A system process runs the plain hblink protocol for its systems -- logins,
+pings, ACLs, REPEAT, OpenBridge HMAC -- and nothing else.
+
+Frames travel between them over shared memory, two rings per system: RX
+carries what the system received to the router, TX carries what the router
+routed to the system. A ring is single producer, single consumer:
+
+    0:8   head (next slot to read, written by the consumer only)
+    8:16  tail (next slot to write, written by the producer only)
+    16:   SLOTS fixed slots, a length byte then up to 55 bytes of DMRD frame
+
+Each side polls its rings every POLL_INTERVAL seconds. A full ring drops the
+frame rather than blocking; DMR voice can't wait anyway. Connected peers stay
+in the system processes, so the report server's view of them is empty.
+
+There is no lock or barrier between the two sides: a frame is published by
+the plain store to tail that follows the stores of its bytes, and the slot is
+handed back by the store to head that follows reading them. That only holds
+where the CPU makes stores visible to other cores in program order, which x86
+does and ARM, POWER and RISC-V do not -- a consumer there could see tail move
+before the frame's bytes arrive. So SYSTEM_PROCESSES is refused anywhere but
+x86 (ORDERED_STORES).
+'''
+
+import os
+import sys
+import platform
+import subprocess
+from struct import Struct
+from multiprocessing import shared_memory, resource_tracker
+
+from twisted.internet import reactor, task
+
+from hblink import HBSYSTEM, OPENBRIDGE, systems, listen_system
+from dmrd import dmrdFrame
+from shard import die_with_parent
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016-2019 Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+# Configure the logging system
+import logging
+logger = logging.getLogger(__name__)
+
+SLOTS = 512
+SLOT_SIZE = 56
+MAX_FRAME = SLOT_SIZE - 1
+POLL_INTERVAL = 0.005     # voice bursts are 60ms apart
+RING_HEADER = Struct('=QQ')
+
+# The rings are only safe where stores are seen by other cores in the order made (x86)
+ORDERED_STORES = platform.machine().lower() in ('x86_64', 'amd64', 'i386', 'i486', 'i586', 'i686', 'x86')
+
+# 'ROUTER', a system process number (1 .. PROCESSES), or None when not in use
+ROLE = None
+PROCESSES = 0
+BUS_ID = None
+
+# system: (RX ring, TX ring), for the systems this process deals with
+RINGS = {}
+
+
+class packetRing:
+    def __init__(self, _name, _create=False):
+        self.name = _name
+        if _create:
+            self._shm = shared_memory.SharedMemory(_name, create=True, size=RING_HEADER.size + SLOTS * SLOT_SIZE)
+        elif sys.version_info >= (3, 13):
+            # The router created the segment and cleans it up. Left to itself, Python hands
+            # every segment a process attaches to over to its resource tracker, which unlinks
+            # it when the process exits. track=False (3.13 on) opts out; before that, the only
+            # way out is to unregister it again.
+            self._shm = shared_memory.SharedMemory(_name, track=False)
+        else:
+            self._shm = shared_memory.SharedMemory(_name)
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._ptrs = self._shm.buf[:RING_HEADER.size].cast('Q')
+        self._slots = self._shm.buf[RING_HEADER.size:]
+        self._full = False
+        self.dropped = 0
+
+    # Producer side. Returns False if the frame was dropped.
+    def put(self, _packet):
+        _tail = self._ptrs[1]
+        if _tail - self._ptrs[0] >= SLOTS or len(_packet) > MAX_FRAME:
+            self.dropped += 1
+            if not self._full:
+                self._full = True
+                logger.warning('(BUS) Frame dropped on %s: ring full or frame longer than %s bytes', self.name, MAX_FRAME)
+            return False
+        _offset = (_tail % SLOTS) * SLOT_SIZE
+        self._slots[_offset] = len(_packet)
+        self._slots[_offset + 1:_offset + 1 + len(_packet)] = _packet
+        self._ptrs[1] = _tail + 1     # publish only once the slot is written
+        self._full = False
+        return True
+
+    # Consumer side: every frame waiting, oldest first
+    def get_all(self):
+        _head = self._ptrs[0]
+        _tail = self._ptrs[1]
+        _packets = []
+        while _head < _tail:
+            _offset = (_head % SLOTS) * SLOT_SIZE
+            _packets.append(bytes(self._slots[_offset + 1:_offset + 1 + self._slots[_offset]]))
+            _head += 1
+        self._ptrs[0] = _head
+        return _packets
+
+    def close(self, _unlink=False):
+        self._ptrs.release()
+        self._slots.release()
+        self._shm.close()
+        if _unlink:
+            self._shm.unlink()
+
+
+# Enabled systems in config file order, with the process that runs each
+def assign(_config):
+    _enabled = [_system for _system in _config['SYSTEMS'] if _config['SYSTEMS'][_system]['ENABLED']]
+    return [(_index, _system, _index % PROCESSES + 1) for _index, _system in enumerate(_enabled)]
+
+def ring_name(_index, _direction):
+    return '{}.{}.{}'.format(BUS_ID, _index, _direction)
+
+# Called once at start up, before anything listens. The router creates the rings and
+# starts the system processes by running the same command line with HBLINK_BUS set;
+# they learn who they are from it and attach to their own systems' rings.
+def start_processes(_config, _count):
+    global ROLE, PROCESSES, BUS_ID
+    if not ORDERED_STORES:
+        sys.exit('(GLOBAL) TERMINATING: SYSTEM_PROCESSES needs an x86 CPU, the rings between processes are not safe on {}'.format(platform.machine()))
+    PROCESSES = _count
+    if 'HBLINK_BUS' in os.environ:
+        BUS_ID, _role = os.environ['HBLINK_BUS'].rsplit(':', 1)
+        ROLE = int(_role)
+        for _index, _system, _process in assign(_config):
+            if _process == ROLE:
+                RINGS[_system] = (packetRing(ring_name(_index, 'rx')), packetRing(ring_name(_index, 'tx')))
+        return ROLE
+
+    ROLE = 'ROUTER'
+    BUS_ID = 'hblink-{}'.format(os.getpid())
+    for _index, _system, _process in assign(_config):
+        RINGS[_system] = (packetRing(ring_name(_index, 'rx'), True), packetRing(ring_name(_index, 'tx'), True))
+    reactor.addSystemEventTrigger('after', 'shutdown', close_rings, True)
+    for _process in range(1, _count + 1):
+        _env = dict(os.environ, HBLINK_BUS='{}:{}'.format(BUS_ID, _process))
+        subprocess.Popen([sys.executable] + sys.argv, env=_env, preexec_fn=die_with_parent)
+        logger.info('(BUS) Started system process %s of %s', _process, _count)
+    return ROLE
+
+def close_rings(_unlink=False):
+    for _rx, _tx in RINGS.values():
+        _rx.close(_unlink)
+        _tx.close(_unlink)
+
+def poll(_readers):
+    for _ring, _deliver in _readers:
+        for _packet in _ring.get_all():
+            _deliver(_packet)
+
+def start_polling(_readers):
+    _poll_task = task.LoopingCall(poll, _readers)
+    _poll_task.start(POLL_INTERVAL)
+    return _poll_task
+
+
+# What a system process runs in place of a router: everything the application
+# would have been handed goes on the system's RX ring
+class busOBP(OPENBRIDGE):
+    def dmrd_frame_received(self, _frame):
+        self._bus.put(_frame.data)
+
+class busHBP(HBSYSTEM):
+    def dmrd_frame_received(self, _frame):
+        self._bus.put(_frame.data)
+
+# System process: create, listen and start moving frames for this process's systems
+def start_systems(_config):
+    _readers = []
+    for _system, (_rx, _tx) in RINGS.items():
+        if _config['SYSTEMS'][_system]['MODE'] == 'OPENBRIDGE':
+            systems[_system] = busOBP(_system, _config, None)
+        else:
+            systems[_system] = busHBP(_system, _config, None)
+        systems[_system]._bus = _rx
+        listen_system(_config, _system, systems[_system])
+        _readers.append((_tx, systems[_system].send_system))
+        logger.debug('(BUS) %s instance created in system process %s: %s', _config['SYSTEMS'][_system]['MODE'], ROLE, _system)
+    reactor.addSystemEventTrigger('after', 'shutdown', close_rings)
+    return start_polling(_readers)
+
+# Router: whatever the routers send to a system goes on its TX ring, and frames on
+# the RX rings are routed as if they had come in on a socket here
+def start_router(_routers):
+    _readers = []
+    for _system, (_rx, _tx) in RINGS.items():
+        _router = _routers[_system]
+        _router.send_system = _tx.put
+        _readers.append((_rx, lambda _packet, _router=_router: _router.dmrd_frame_received(dmrdFrame(_packet))))
+    return start_polling(_readers)
+
+
+# Round trip a burst of frames through a ring and time put/get_all against the UNIX
+# datagram socket pair the processes could have used instead. Run this file directly.
+if __name__ == '__main__':
+    import socket
+    from os import urandom
+    from timeit import repeat
+
+    BUS_ID = 'hblink-bench-{}'.format(os.getpid())
+    ring = packetRing(ring_name(0, 'rx'), True)
+    peer = packetRing(ring_name(0, 'rx'))
+    if sys.version_info < (3, 13):
+        resource_tracker.register(peer._shm._name, 'shared_memory')     # both ends are in this process
+    frames = [b'DMRD' + urandom(49 + (i % 2) * 2) for i in range(64)]
+
+    # Lengths survive, order is kept, and a full ring drops instead of overwriting
+    for _frame in frames:
+        assert ring.put(_frame)
+    assert peer.get_all() == frames
+    for i in range(SLOTS):
+        assert ring.put(frames[i % len(frames)])
+    assert not ring.put(frames[0]) and ring.dropped == 1
+    assert len(peer.get_all()) == SLOTS and peer.get_all() == []
+
+    def through_ring():
+        for _frame in frames:
+            ring.put(_frame)
+        return peer.get_all()
+
+    tx, rx = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    rx.setblocking(False)
+    def through_socket():
+        for _frame in frames:
+            tx.send(_frame)
+        _packets = []
+        try:
+            while True:
+                _packets.append(rx.recv(MAX_FRAME))
+        except BlockingIOError:
+            return _packets
+
+    assert through_ring() == through_socket() == frames
+    number = 2000
+    t_ring = min(repeat(through_ring, number=number, repeat=5)) / (number * len(frames))
+    t_sock = min(repeat(through_socket, number=number, repeat=5)) / (number * len(frames))
+    print('ring: {:.3f} us/frame   unix socket: {:.3f} us/frame   {:.2f}x'.format(t_ring * 1e6, t_sock * 1e6, t_sock / t_ring))
+
+    peer.close()
+    ring.close(True)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016-2019 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+'''
+Batched UDP transmit and receive. One inbound DMRD packet can be bridged to dozens of
+systems and repeated to hundreds of peers, one sendto() system call each.
+With GLOBAL SENDMMSG enabled every system's transport is wrapped in a
+batchTransport: datagrams written while an inbound packet is being handled
+are queued, and once the handler returns each socket's queue goes out with a
+single Linux sendmmsg() call, made through ctypes.
+
+Writes made outside of packet handling (timers, maintenance loops) are sent
+straight away, as is everything on platforms without sendmmsg().
+
+On the receive side, Twisted's UDP port already drains the socket in a loop,
+but stops only after 256KB -- thousands of DMRD packets -- so a burst from one
+OpenBridge partner can hold up every other system. With GLOBAL RECV_BATCH set,
+systems listen on a batchPort, which hands at most that many datagrams to the
+protocol per readiness event, in order, and counts how full each read was.
+'''
+
+import ctypes
+import socket
+from errno import EINTR
+from struct import pack, Struct
+
+from twisted.internet.udp import Port, _sockErrReadIgnore, _sockErrReadRefuse
+from twisted.python import log
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016-2019 Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+# Configure the logging system
+import logging
+logger = logging.getLogger(__name__)
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(iovec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int)
+    ]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', msghdr), ('msg_len', ctypes.c_uint)]
+
+# Filling the arrays field by field through ctypes costs more than the system calls it
+# saves, so flush() packs msg_name/msg_namelen and iov_base/iov_len straight into them
+MMSGHDR_SIZE = ctypes.sizeof(mmsghdr)
+IOVEC_SIZE = ctypes.sizeof(iovec)
+MSG_NAME = Struct('@PI')
+IOVEC = Struct('@PN')
+
+# libc's sendmmsg, or None where there isn't one (anything but Linux)
+try:
+    SENDMMSG = ctypes.CDLL(None, use_errno=True).sendmmsg
+    SENDMMSG.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    SENDMMSG.restype = ctypes.c_int
+except (OSError, AttributeError):
+    SENDMMSG = None
+
+# Upper bound on the number of remembered socket addresses
+SOCKADDR_CACHE_SIZE = 4096
+
+# Transports with datagrams waiting for flush_pending(), and whether an inbound
+# packet is being handled (only then are writes queued)
+PENDING = []
+BATCHING = False
+
+
+# Pack a (host, port) tuple into a struct sockaddr_in or sockaddr_in6
+def mk_sockaddr(_addr):
+    try:
+        return pack('=H', socket.AF_INET) + pack('!H', _addr[1]) + socket.inet_pton(socket.AF_INET, _addr[0]) + bytes(8)
+    except OSError:
+        return pack('=H', socket.AF_INET6) + pack('!HI', _addr[1], 0) + socket.inet_pton(socket.AF_INET6, _addr[0]) + pack('=I', 0)
+
+
+# Stands in for a Twisted UDP port; anything but write() goes to the real one
+class batchTransport:
+    def __init__(self, _transport):
+        self._transport = _transport
+        self._fileno = _transport.fileno()
+        self._queue = []
+        self._sockaddrs = {}
+        self._capacity = 0
+
+    def __getattr__(self, _name):
+        return getattr(self._transport, _name)
+
+    def write(self, _datagram, _addr):
+        if not BATCHING:
+            return self._transport.write(_datagram, _addr)
+        if not self._queue:
+            PENDING.append(self)
+        # Copy -- callers like fanout() reuse their buffer as soon as write() returns
+        self._queue.append((bytes(_datagram), _addr))
+
+    # Grow the reusable message and iovec arrays to hold at least _count datagrams
+    def grow(self, _count):
+        self._capacity = max(_count, 2 * self._capacity)
+        self._msgs = (mmsghdr * self._capacity)()
+        self._iovs = (iovec * self._capacity)()
+        for i in range(self._capacity):
+            self._msgs[i].msg_hdr.msg_iov = ctypes.pointer(self._iovs[i])
+            self._msgs[i].msg_hdr.msg_iovlen = 1
+        self._msgs_view = memoryview(self._msgs).cast('B')
+        self._iovs_view = memoryview(self._iovs).cast('B')
+
+    def flush(self):
+        _queue, self._queue = self._queue, []
+        _count = len(_queue)
+        if _count == 1:
+            self._transport.write(*_queue[0])
+            return
+        if _count > self._capacity:
+            self.grow(_count)
+
+        # All of the datagrams go in one buffer; only the pointers and lengths are filled in per datagram
+        _buf = ctypes.create_string_buffer(b''.join([_datagram for _datagram, _addr in _queue]))
+        _base = ctypes.addressof(_buf)
+        _msgs_view, _iovs_view = self._msgs_view, self._iovs_view
+        # The messages point at the sockaddr buffers by address, so the batch holds on to
+        # them itself until it is sent -- clearing the cache must not free one in use
+        _names = []
+        for i, (_datagram, _addr) in enumerate(_queue):
+            _name = self._sockaddrs.get(_addr)
+            if _name is None:
+                if len(self._sockaddrs) >= SOCKADDR_CACHE_SIZE:
+                    self._sockaddrs.clear()
+                _sockaddr = ctypes.create_string_buffer(mk_sockaddr(_addr))
+                _name = self._sockaddrs[_addr] = (_sockaddr, ctypes.addressof(_sockaddr), len(_sockaddr) - 1)
+            _names.append(_name)
+            MSG_NAME.pack_into(_msgs_view, i * MMSGHDR_SIZE, _name[1], _name[2])
+            IOVEC.pack_into(_iovs_view, i * IOVEC_SIZE, _base, len(_datagram))
+            _base += len(_datagram)
+
+        _sent = 0
+        while _sent < _count:
+            _result = SENDMMSG(self._fileno, ctypes.addressof(self._msgs) + _sent * MMSGHDR_SIZE, _count - _sent, 0)
+            if _result > 0:
+                _sent += _result
+            elif ctypes.get_errno() != EINTR:
+                # The datagram at the head of the batch failed -- let Twisted send it and deal with the error
+                self._transport.write(*_queue[_sent])
+                _sent += 1
+
+
+# Send everything queued while the last inbound packet was being handled
+def flush_pending():
+    while PENDING:
+        PENDING.pop(0).flush()
+
+
+# Wrap a protocol's datagramReceived so its writes, and those of every system it
+# bridges to, are queued and flushed together once it returns
+def batch_receive(_receive):
+    def datagramReceived(_data, _sockaddr):
+        global BATCHING
+        if BATCHING:
+            return _receive(_data, _sockaddr)
+        BATCHING = True
+        try:
+            _receive(_data, _sockaddr)
+        finally:
+            BATCHING = False
+            flush_pending()
+    return datagramReceived
+
+
+# Called from startProtocol when GLOBAL SENDMMSG is enabled
+def batch_protocol(_protocol, _system):
+    if SENDMMSG is None:
+        logger.warning('(%s) sendmmsg() is not available on this platform, sending one datagram at a time', _system)
+        return
+    _protocol.transport = batchTransport(_protocol.transport)
+    _protocol.datagramReceived = batch_receive(_protocol.datagramReceived)
+
+
+# A Twisted UDP port that reads at most _max_batch datagrams each time the socket is
+# readable. The reactor comes straight back if there is more, after servicing the
+# other sockets. Counters are kept in _stats (see rx_stats) for tuning the batch size.
+class batchPort(Port):
+    def __init__(self, _port, _protocol, _interface, _max_batch, _stats, _reactor=None):
+        Port.__init__(self, _port, _protocol, _interface, reactor=_reactor)
+        self._max_batch = _max_batch
+        self._stats = _stats
+
+    def doRead(self):
+        _batch = 0
+        try:
+            while _batch < self._max_batch:
+                try:
+                    _data, _addr = self.socket.recvfrom(self.maxPacketSize)
+                except OSError as se:
+                    if se.args[0] in _sockErrReadIgnore:
+                        self._stats['DRAINED'] += 1
+                        return
+                    if se.args[0] in _sockErrReadRefuse:
+                        if self._connectedAddr:
+                            self.protocol.connectionRefused()
+                        return
+                    raise
+                _batch += 1
+                if self.addressFamily == socket.AF_INET6:
+                    _addr = _addr[:2]
+                try:
+                    self.protocol.datagramReceived(_data, _addr)
+                except BaseException:
+                    log.err()
+            self._stats['FULL'] += 1
+        finally:
+            self._stats['READS'] += 1
+            self._stats['DATAGRAMS'] += _batch
+            if _batch > self._stats['MAX_BATCH']:
+                self._stats['MAX_BATCH'] = _batch
+
+# Receive counters for one batchPort. READS is readiness events, DATAGRAMS the packets
+# handed on, MAX_BATCH the most in one read; a read either DRAINED the socket or was
+# FULL (hit the batch size). Lots of FULL reads mean the batch size could go up.
+def rx_stats():
+    return {'READS': 0, 'DATAGRAMS': 0, 'MAX_BATCH': 0, 'DRAINED': 0, 'FULL': 0}
+
+
+# Benchmark sending a burst to many destinations over loopback: one sendto() per
+# datagram against a batchTransport flush. Run this file directly to use it.
+if __name__ == '__main__':
+    from os import urandom
+    from timeit import repeat
+
+    class port:
+        def __init__(self):
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.bind(('127.0.0.1', 0))
+        def fileno(self):
+            return self.socket.fileno()
+        def write(self, _datagram, _addr):
+            self.socket.sendto(_datagram, _addr)
+
+    if SENDMMSG is None:
+        raise SystemExit('sendmmsg() is not available on this platform')
+
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    sink.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+    sink.setblocking(False)
+    def drain():
+        try:
+            while True:
+                sink.recv(2048)
+        except BlockingIOError:
+            pass
+
+    sender = port()
+    batch = batchTransport(sender)
+    packet = b'DMRD' + urandom(51)
+    addr = sink.getsockname()
+
+    # Every queued datagram must arrive intact
+    BATCHING = True
+    for i in range(10):
+        batch.write(packet[:11] + bytes([i]) * 4 + packet[15:], addr)
+    BATCHING = False
+    flush_pending()
+    assert sorted(sink.recv(2048) for i in range(10)) == [packet[:11] + bytes([i]) * 4 + packet[15:] for i in range(10)]
+
+    # Including when the sockaddr cache fills and is cleared partway through a batch
+    sinks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for i in range(6)]
+    for _sink in sinks:
+        _sink.bind(('127.0.0.1', 0))
+        _sink.settimeout(1)
+    SOCKADDR_CACHE_SIZE = 2
+    BATCHING = True
+    for i, _sink in enumerate(sinks):
+        batch.write(packet[:11] + bytes([i]) * 4 + packet[15:], _sink.getsockname())
+    BATCHING = False
+    flush_pending()
+    assert [_sink.recv(2048) for _sink in sinks] == [packet[:11] + bytes([i]) * 4 + packet[15:] for i in range(6)]
+    SOCKADDR_CACHE_SIZE = 4096
+
+    def send_single(size):
+        for i in range(size):
+            sender.write(packet, addr)
+        drain()
+
+    def send_batch(size):
+        global BATCHING
+        BATCHING = True
+        for i in range(size):
+            batch.write(packet, addr)
+        BATCHING = False
+        flush_pending()
+        drain()
+
+    print('{:>6} {:>14} {:>14} {:>9}'.format('DGRAMS', 'SENDTO (us)', 'SENDMMSG (us)', 'SPEEDUP'))
+    for size in (10, 100, 1000):
+        number = max(1, 20000 // size)
+        t_single = min(repeat(lambda: send_single(size), number=number, repeat=5)) / (number * size)
+        t_batch = min(repeat(lambda: send_batch(size), number=number, repeat=5)) / (number * size)
+        print('{:>6} {:>14.3f} {:>14.3f} {:>8.2f}x'.format(size, t_single * 1e6, t_batch * 1e6, t_single / t_batch))
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016-2019 Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+
+'''
+Where each unit (subscriber) was last heard, so unit to unit calls go to the
+one system the called unit is on instead of being flooded to every UNIT
+system. An entry is unit ID -> (system, time last heard), and one goes
+stale UNIT_TIME minutes after it was last heard.
+
+The units in the rules file's STATIC_UNIT never go stale. Everybody else
+sits in a timing wheel: one bucket per minute (_TICK) their entry goes
+stale in, as many buckets as it takes to cover UNIT_TIME. Hearing a unit
+again only moves it to another bucket when its minute changes, and
+expire() only looks at the buckets whose minute has come, so ageing out
+costs what it takes to drop what has gone stale, not a pass over every
+unit ever heard.
+
+save() writes everything learned (not the static units) to a file, and
+load() reads it back in when starting up, so unit calls don't go out to
+every UNIT system after a restart until all the units have been heard
+again. The file is a header, the system names, then a 13 byte record per
+unit: the unit ID, its system as an index into the names, and the time it
+was last heard.
+'''
+
+import os
+from struct import Struct, error as struct_error
+from time import time
+
+from dmr_utils3.utils import bytes_3
+
+# Does anybody read this stuff? There's a PEP somewhere that says I should do this.
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016-2019 Cortney T. Buffington, N0MJS and the K0USY Group'
+__credits__    = 'Colin Durbridge, G4EML, Steve Zingman, N4IRS; Mike Zingman, N4IRR; Jonathan Naylor, G4KLX; Hans Barthen, DL5DI; Torsten Shultze, DG1HT'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+# Seconds of timing wheel per bucket
+_TICK = 60
+
+# Snapshot file: magic, format version, number of system names; then each name as a
+# length byte and UTF-8; then (unit ID, system name index, time last heard) records
+_MAGIC = b'HBUM'
+_HEADER = Struct('>4sBH')
+_RECORD = Struct('>3sHd')
+
+
+# Use it like the dict it replaces: unit_map[_rf_src] = (system, time),
+# unit_map[_dst_id][0], _dst_id in unit_map. _static is the rules file's
+# STATIC_UNIT ([[unit ID, system], ...]), _unit_time its UNIT_TIME in minutes.
+class unitMap:
+    def __init__(self, _static, _unit_time):
+        self.ttl = 60 * _unit_time
+        self.static = {bytes_3(_unit[0]) for _unit in _static}
+        # unit ID -> (system, time last heard)
+        self._units = {}
+        # unit ID -> the minute (as time // _TICK) it goes stale in, for everybody not static
+        self._due = {}
+        self._wheel = [set() for i in range(int(self.ttl // _TICK) + 2)]
+        # The oldest minute expire() has not finished with
+        self._tick = int(time() // _TICK)
+        _now = time()
+        for _unit in _static:
+            self._units[bytes_3(_unit[0])] = (_unit[1], _now)
+
+    def __setitem__(self, _unit, _entry):
+        self._units[_unit] = _entry
+        if _unit in self.static:
+            return
+        # Anything already stale goes in the bucket expire() looks at next
+        _due = max(int((_entry[1] + self.ttl) // _TICK), self._tick)
+        _was = self._due.get(_unit)
+        if _was != _due:
+            if _was is not None:
+                self._wheel[_was % len(self._wheel)].discard(_unit)
+            self._wheel[_due % len(self._wheel)].add(_unit)
+            self._due[_unit] = _due
+
+    def __getitem__(self, _unit):
+        return self._units[_unit]
+
+    def __contains__(self, _unit):
+        return _unit in self._units
+
+    def __delitem__(self, _unit):
+        del self._units[_unit]
+        _due = self._due.pop(_unit, None)
+        if _due is not None:
+            self._wheel[_due % len(self._wheel)].discard(_unit)
+
+    def __len__(self):
+        return len(self._units)
+
+    def __iter__(self):
+        return iter(self._units)
+
+    def items(self):
+        return self._units.items()
+
+    # Drop every unit last heard more than UNIT_TIME before _now, and return their IDs.
+    # The bucket for _now's own minute can still hold units that are not stale yet: they
+    # stay in it, and it is looked at again next time.
+    def expire(self, _now):
+        _removed = []
+        _tick = int(_now // _TICK)
+        _then = _now - self.ttl
+        for _minute in range(max(self._tick, _tick - len(self._wheel) + 1), _tick + 1):
+            _bucket = self._wheel[_minute % len(self._wheel)]
+            for _unit in [_unit for _unit in _bucket if self._units[_unit][1] < _then]:
+                _bucket.discard(_unit)
+                del self._units[_unit]
+                del self._due[_unit]
+                _removed.append(_unit)
+        self._tick = _tick
+        return _removed
+
+    # Write every unit that is not static to _file. It is written to a temporary file
+    # first and renamed over _file, so _file is always a whole snapshot.
+    def save(self, _file):
+        _systems = {}
+        _records = []
+        for _unit, (_system, _time) in self._units.items():
+            if _unit not in self.static:
+                _records.append(_RECORD.pack(_unit, _systems.setdefault(_system, len(_systems)), _time))
+        _names = [_system.encode('utf-8') for _system in _systems]
+        _tmp = _file + '.tmp'
+        with open(_tmp, 'wb') as _f:
+            _f.write(b''.join([_HEADER.pack(_MAGIC, 1, len(_names))] + [bytes([len(_name)]) + _name for _name in _names] + _records))
+            _f.flush()
+            os.fsync(_f.fileno())
+        os.replace(_tmp, _file)
+        return len(_records)
+
+    # Read a snapshot written by save(), skipping static units, units on systems not
+    # in _systems and units last heard more than UNIT_TIME before _now. Returns how
+    # many were taken. A missing file is an empty one; a damaged one raises ValueError.
+    def load(self, _file, _systems, _now):
+        try:
+            with open(_file, 'rb') as _f:
+                _data = _f.read()
+        except FileNotFoundError:
+            return 0
+        try:
+            _magic, _version, _count = _HEADER.unpack_from(_data)
+            if _magic != _MAGIC or _version != 1:
+                raise ValueError('not a unit map snapshot')
+            _pos = _HEADER.size
+            _names = []
+            for i in range(_count):
+                _names.append(_data[_pos + 1:_pos + 1 + _data[_pos]].decode('utf-8'))
+                _pos += 1 + _data[_pos]
+            if (len(_data) - _pos) % _RECORD.size:
+                raise ValueError('truncated unit map snapshot')
+            _records = list(_RECORD.iter_unpack(memoryview(_data)[_pos:]))
+        except (IndexError, UnicodeDecodeError, struct_error) as _error:
+            raise ValueError('damaged unit map snapshot: {}'.format(_error))
+        _then = _now - self.ttl
+        _loaded = 0
+        for _unit, _index, _time in _records:
+            if _time >= _then and _unit not in self.static and _index < len(_names) and _names[_index] in _systems:
+                self[_unit] = (_names[_index], _time)
+                _loaded += 1
+        return _loaded
+
+
+# Check expiry against a plain dict aged out the way bridge.py used to, and time
+# ageing out a large map both ways. Run this file directly to use it.
+if __name__ == '__main__':
+    import random
+    from timeit import default_timer
+
+    _clock = [1700000000.0]
+    time = lambda: _clock[0]
+
+    random.seed(1)
+    for _unit_time in (1, 3, 15):
+        units = unitMap([[i, 'STATIC'] for i in range(1, 6)], _unit_time)
+        plain = {bytes_3(i): ('STATIC', time()) for i in range(1, 6)}
+        for _minute in range(200):
+            for i in range(random.randint(0, 200)):
+                _clock[0] += random.random() * 0.3
+                _unit = bytes_3(random.randint(1, 400))
+                units[_unit] = plain[_unit] = ('SYSTEM-{}'.format(random.randint(1, 3)), time())
+            if random.random() < 0.1:
+                _clock[0] += random.random() * 600
+            _then = time() - 60 * _unit_time
+            _stale = sorted(_unit for _unit in plain if _unit not in units.static and plain[_unit][1] < _then)
+            for _unit in _stale:
+                del plain[_unit]
+            assert sorted(units.expire(time())) == _stale
+            assert dict(units.items()) == plain
+        assert all(bytes_3(i) in units for i in range(1, 6))
+
+    # 200000 units heard in the last hour, 1000 of them have gone stale
+    _clock[0] = 1700000000.0
+    units = unitMap([], 60)
+    plain = {}
+    for i in range(200000):
+        _entry = ('SYSTEM', time() - (3600 + 30 if i < 1000 else random.random() * 3540))
+        units[bytes_3(i)] = plain[bytes_3(i)] = _entry
+    _start = default_timer()
+    _then = time() - 3600
+    _stale = [_unit for _unit in plain if plain[_unit][1] < _then]
+    for _unit in _stale:
+        del plain[_unit]
+    _scan = default_timer() - _start
+    _start = default_timer()
+    _removed = units.expire(time())
+    _wheel = default_timer() - _start
+    assert len(_removed) == len(_stale) == 1000
+    print('expire 1000 of 200000 units: scan {:.2f} ms   wheel {:.2f} ms'.format(_scan * 1e3, _wheel * 1e3))
+
+    # Snapshot the rest and read it back into a fresh map an hour later, when some
+    # have gone stale; static units and unknown systems are left out
+    import tempfile
+    units[bytes_3(5)] = ('GONE', time())
+    _static = [[i, 'STATIC'] for i in range(1000, 1010)]
+    with tempfile.TemporaryDirectory() as _dir:
+        _file = os.path.join(_dir, 'unit_map.bin')
+        _start = default_timer()
+        _saved = units.save(_file)
+        _save = default_timer() - _start
+        assert _saved == len(units) and os.path.getsize(_file) == _HEADER.size + 2 + len('SYSTEM') + len('GONE') + _saved * _RECORD.size
+        _clock[0] += 1800
+        restarted = unitMap(_static, 60)
+        _start = default_timer()
+        _loaded = restarted.load(_file, ['SYSTEM', 'STATIC'], time())
+        _load = default_timer() - _start
+        _then = time() - 3600
+        _kept = {_unit: _entry for _unit, _entry in units.items() if _entry[0] == 'SYSTEM' and _entry[1] >= _then and _unit not in restarted.static}
+        assert _loaded == len(_kept) and dict(restarted.items()) == {**_kept, **{bytes_3(i): ('STATIC', time()) for i in range(1000, 1010)}}
+        assert sorted(restarted.expire(time() + 1800)) == sorted(_kept)
+        with open(_file, 'r+b') as _f:
+            _f.truncate(os.path.getsize(_file) - 1)
+        try:
+            restarted.load(_file, ['SYSTEM'], time())
+            assert False
+        except ValueError:
+            pass
+        assert restarted.load(os.path.join(_dir, 'missing.bin'), ['SYSTEM'], time()) == 0
+    print('snapshot {} units: save {:.1f} ms   load {:.1f} ms ({} kept)'.format(_saved, _save * 1e3, _load * 1e3, _loaded))